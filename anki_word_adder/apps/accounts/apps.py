@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'anki_word_adder.apps.accounts'
+
+    def ready(self):
+        from . import signals  # noqa: F401 (connects the receivers)
+        from apis.providers import get_providers
+        # A misconfigured provider (e.g. one without 'get') fails at start-up, not on the first lookup
+        get_providers()
@@ -0,0 +1,191 @@
+"""Fill Word and Translation tables from a word list, so learners don't wait for the providers.
+
+Words are fetched with the same code as the word data views (single-flight, provider pool),
+CONCURRENCY words at a time and no more than RATE fetches per second.
+The position in the list is saved to a state file, so an interrupted run continues from it.
+Words that are already saved are skipped without calling the providers.
+
+Usage: python manage.py prewarm_words words.txt --languages ru de [--concurrency 8] [--rate 5]
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Set
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from anki_word_adder.apps.accounts.models import Translation, Word, language_registry
+from anki_word_adder.views import WordDataMixin
+
+SAVED = 'saved'
+SKIPPED = 'skipped'  # already saved
+NOT_FOUND = 'not found'
+FAILED = 'failed'
+
+
+class RateLimiter:
+    """Spaces calls evenly, so there are no more than 'rate' of them per second"""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_call = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            call_at = max(self._next_call, now)
+            self._next_call = call_at + self.interval
+        time.sleep(call_at - now)
+
+
+class Command(BaseCommand):
+    help = 'Fetch and save data of the words from a frequency-ordered list before learners look them up'
+
+    def add_arguments(self, parser):
+        parser.add_argument('word_list', help='file with one word per line, the most frequent first')
+        parser.add_argument('--languages', nargs='+', required=True, metavar='CODE', help='translation languages')
+        parser.add_argument('--concurrency', type=int, default=8, help='words fetched at the same time')
+        parser.add_argument('--rate', type=float, default=5, help='fetches per second, 0 for no limit')
+        parser.add_argument('--state-file', help='where the position is saved, <word_list>.prewarm.json by default')
+        parser.add_argument('--restart', action='store_true', help='ignore the saved position')
+        parser.add_argument('--progress-interval', type=float, default=10, help='seconds between progress reports')
+
+    def handle(self, *args, **options):
+        self.lang_codes = [code.lower() for code in options['languages']]
+        unknown = [code for code in self.lang_codes if language_registry.get(code) is None]
+        if unknown:
+            raise CommandError(f'Unknown languages: {", ".join(unknown)}')
+        if options['concurrency'] < 1:
+            raise CommandError('Concurrency must be at least 1')
+
+        words = self.read_words(options['word_list'])
+        state_path = options['state_file'] or f'{options["word_list"]}.prewarm.json'
+        state = {} if options['restart'] else self.read_state(state_path)
+        # A language that hasn't been prewarmed yet starts from the beginning
+        start = min(state.get(code, 0) for code in self.lang_codes)
+        if start:
+            self.stdout.write(f'Resuming from word {start + 1} of {len(words)}')
+
+        self.fetcher = WordDataMixin()
+        self.rate_limiter = RateLimiter(options['rate'])
+        self.counts = Counter()
+        self.started = time.monotonic()
+        self.prewarmed = 0
+        position = start
+        done: Set[int] = set()
+        # Words after a failed one are fetched, but the position stops at it, so it's retried on the next run
+        failed_at = None
+
+        executor = ThreadPoolExecutor(max_workers=options['concurrency'], thread_name_prefix='prewarm')
+        in_flight: Dict[Future, int] = {}
+        next_index = start
+        last_report = time.monotonic()
+        try:
+            while next_index < len(words) or in_flight:
+                # Only a few words are submitted ahead, so an interrupted run doesn't lose much
+                while next_index < len(words) and len(in_flight) < options['concurrency'] * 2:
+                    in_flight[executor.submit(self.prewarm, words[next_index])] = next_index
+                    next_index += 1
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = in_flight.pop(future)
+                    outcomes = future.result()
+                    self.counts.update(outcomes)
+                    self.prewarmed += 1
+                    if FAILED in outcomes and (failed_at is None or index < failed_at):
+                        failed_at = index
+                    done.add(index)
+                while position in done and position != failed_at:
+                    done.remove(position)
+                    position += 1
+
+                if time.monotonic() - last_report >= options['progress_interval']:
+                    self.report(position, len(words))
+                    self.write_state(state_path, state, position)
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            self.stdout.write('Interrupted, waiting for the words in flight')
+            executor.shutdown(cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown()
+            self.write_state(state_path, state, position)
+
+        self.report(position, len(words))
+        if self.counts[FAILED]:
+            self.stdout.write(self.style.WARNING(
+                f'{self.counts[FAILED]} fetches failed, run the command again to retry them'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Done'))
+
+    def prewarm(self, word: str) -> List[str]:
+        """Fetch the word for every language. Returns the outcome for each of them"""
+        try:
+            saved = set(Translation.objects
+                        .filter(word__name=word, language__code__in=self.lang_codes)
+                        .values_list('language__code', flat=True))
+            outcomes = []
+            # Languages are fetched one after another, so Collins is only called for the first one
+            for code in self.lang_codes:
+                if code in saved:
+                    outcomes.append(SKIPPED)
+                    continue
+                if NOT_FOUND in outcomes:
+                    # Google doesn't know the English word, the destination language doesn't matter
+                    outcomes.append(NOT_FOUND)
+                    continue
+                self.rate_limiter.wait()
+                translations, failed = self.fetcher.fetch_translations([word], code)
+                if word in failed:
+                    outcomes.append(FAILED)
+                elif word in translations:
+                    outcomes.append(SAVED)
+                else:
+                    outcomes.append(NOT_FOUND)
+            return outcomes
+        finally:
+            # Every thread has its own connection
+            connection.close()
+
+    @staticmethod
+    def read_words(path: str) -> List[str]:
+        max_length = Word._meta.get_field('name').max_length
+        try:
+            with open(path, encoding='utf-8') as word_list:
+                lines = [line.strip().lower() for line in word_list]
+        except OSError as e:
+            raise CommandError(f'Unable to read the word list: {e}')
+        words = []
+        seen = set()
+        for word in lines:
+            if word and not word.startswith('#') and len(word) <= max_length and word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    @staticmethod
+    def read_state(path: str) -> Dict[str, int]:
+        if not os.path.exists(path):
+            return {}
+        with open(path) as state_file:
+            return json.load(state_file)
+
+    def write_state(self, path: str, state: Dict[str, int], position: int) -> None:
+        state.update({code: position for code in self.lang_codes})
+        with open(path, 'w') as state_file:
+            json.dump(state, state_file)
+
+    def report(self, position: int, total: int) -> None:
+        elapsed = time.monotonic() - self.started
+        throughput = self.prewarmed / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{position}/{total} words: {self.counts[SAVED]} saved, {self.counts[SKIPPED]} already saved, '
+            f'{self.counts[NOT_FOUND]} not found, {self.counts[FAILED]} failed, {throughput:.1f} words/s')
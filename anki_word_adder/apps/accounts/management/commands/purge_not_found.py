@@ -0,0 +1,33 @@
+"""Forget the words remembered as unknown to the providers, so the next lookups ask the providers again.
+
+Useful after a provider outage that looked like "not found" or when a dictionary gets new words.
+Other processes keep their in-memory entries for up to WORD_DATA_CACHE['LOCAL_TTL'] seconds.
+
+Usage: python manage.py purge_not_found [--words WORD ...] [--languages CODE ...]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from anki_word_adder.apps.accounts.models import language_registry
+from anki_word_adder.word_cache import word_not_found_cache
+
+
+class Command(BaseCommand):
+    help = 'Forget words that the providers did not know (all of them by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--words', nargs='+', metavar='WORD', help='only these words')
+        parser.add_argument('--languages', nargs='+', metavar='CODE',
+                            help='only these languages (with --words), all by default')
+
+    def handle(self, *args, **options):
+        if not options['words']:
+            if options['languages']:
+                raise CommandError('--languages can only be used with --words')
+            generation = word_not_found_cache.purge()
+            self.stdout.write(self.style.SUCCESS(f'Every word is forgotten (generation {generation})'))
+            return
+
+        lang_codes = options['languages'] or [language.code for language in language_registry.all()]
+        for word in options['words']:
+            word_not_found_cache.delete(word.lower(), lang_codes)
+        self.stdout.write(self.style.SUCCESS(f'{len(options["words"])} words are forgotten'))
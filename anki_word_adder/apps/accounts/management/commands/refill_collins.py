@@ -0,0 +1,60 @@
+"""Request Collins data for the words saved without it because the Collins quota was spent.
+
+Run it when the budget is available again (e.g. daily, right after the quota is reset at midnight UTC).
+It stops as soon as the quota is spent again, the rest of the words are refilled by the next run.
+
+Usage: python manage.py refill_collins [--limit 500] [--status]
+"""
+import logging
+
+from django.core.management.base import BaseCommand
+
+from anki_word_adder.apps.accounts.models import Word
+from apis.collins import CollinsData, collins_quota
+from apis.providers import CollinsProvider
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Request Collins data for the words that were saved without it because of the quota'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='max words to refill')
+        parser.add_argument('--status', action='store_true', help='only show the quota usage and pending words')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.show_status()
+            return
+
+        refilled = 0
+        failed = 0
+        # The oldest words first, they have been waiting the longest
+        for word in Word.objects.filter(collins_pending=True).order_by('id')[:options['limit']]:
+            if not collins_quota.acquire():
+                self.stdout.write(self.style.WARNING('The quota is spent, the rest of the words are left pending'))
+                break
+            try:
+                collins_data = CollinsData.get(word.name)
+            except Exception:
+                logger.exception('Unable to fetch Collins data for "%s"', word.name)
+                failed += 1
+                continue
+            word.collins = CollinsProvider.collins_json(collins_data)
+            word.collins_pending = False
+            # Saving the word invalidates the cached word data (see signals.py).
+            # 'updated_at' is only set if it's listed, and the word data validators are made of it
+            word.save(update_fields=['collins', 'collins_pending', 'updated_at'])
+            refilled += 1
+
+        self.stdout.write(f'{refilled} words refilled, {failed} failed')
+        self.show_status()
+
+    def show_status(self) -> None:
+        stats = collins_quota.stats()
+        remaining = stats['remaining_today'] if stats['remaining_today'] is not None else 'no limit'
+        self.stdout.write(
+            f'Collins calls today: {stats["used_today"]} used, {remaining} remaining, '
+            f'{stats["skipped_today"]} skipped. '
+            f'Pending words: {Word.objects.filter(collins_pending=True).count()}')
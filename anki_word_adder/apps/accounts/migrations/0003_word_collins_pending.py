@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_request_date_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='word',
+            name='collins_pending',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.3 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_word_collins_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translation',
+            name='fetched_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='translation',
+            name='parser_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='word',
+            name='fetched_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='word',
+            name='parser_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.3 on 2026-10-18 01:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def delete_duplicate_translations(apps, schema_editor):
+    """Concurrent lookups could save the same translation twice, the last saved one is kept"""
+    Translation = apps.get_model('accounts', 'Translation')
+    duplicates = (Translation.objects
+                  .values('word_id', 'language_id')
+                  .annotate(count=models.Count('id'), last_id=models.Max('id'))
+                  .filter(count__gt=1))
+    for duplicate in duplicates:
+        (Translation.objects
+         .filter(word_id=duplicate['word_id'], language_id=duplicate['language_id'])
+         .exclude(id=duplicate['last_id'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_word_translation_fetched_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_translations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='translation',
+            constraint=models.UniqueConstraint(fields=('word', 'language'), name='translation_word_language_unique'),
+        ),
+        # The unique index covers lookups by the word, so its own index is dropped after the unique one exists
+        migrations.AlterField(
+            model_name='translation',
+            name='word',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, to='accounts.word'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.3 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_word_translation_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollinsUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=30, unique=True)),
+                ('day', models.DateField()),
+                ('calls', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
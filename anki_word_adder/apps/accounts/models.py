@@ -1,7 +1,12 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
 import googletrans
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import UserManager
 from django.db import models
+from django.utils import timezone
 
 
 class Language(models.Model):
@@ -13,26 +18,60 @@ class Language(models.Model):
 
     @staticmethod
     def get_by_code(code: str):
-        try:
-            return Language.objects.get(code=code.lower())
-        except Language.DoesNotExist:
-            if Language.objects.all().count() > 0:
-                return Language._get_default()
-
-            Language._fill_table()
-            try:
-                return Language.objects.get(code=code.lower())
-            except Language.DoesNotExist:
-                return Language._get_default()
+        """Returns language with the code or default language if there's no such code"""
+        return language_registry.get(code.lower()) or language_registry.default()
 
     @staticmethod
     def _fill_table():
         Language.objects.bulk_create([Language(code=code, name=name.title())
                                       for code, name in googletrans.LANGUAGES.items()])
 
-    @staticmethod
-    def _get_default():
-        return Language.objects.all().first()
+
+class LanguageRegistry:
+    """Languages loaded once per process. The table is tiny and almost never changes,
+    so there's no point in querying it on every request. Returned objects are shared, don't change them.
+    Changes made by this process clear it with a signal (see signals.py), changes made by others - after TTL"""
+
+    TTL = 60 * 60  # seconds
+
+    def __init__(self) -> None:
+        self._by_code: Dict[str, Language] = {}
+        self._by_id: Dict[int, Language] = {}
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def get(self, code: str) -> Optional[Language]:
+        return self._load()[0].get(code)
+
+    def by_id(self, language_id: int) -> Optional[Language]:
+        return self._load()[1].get(language_id)
+
+    def default(self) -> Optional[Language]:
+        languages = self.all()
+        return languages[0] if languages else None
+
+    def all(self) -> List[Language]:
+        """Languages ordered by id"""
+        return list(self._load()[1].values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _load(self) -> Tuple[Dict[str, Language], Dict[int, Language]]:
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.TTL:
+                languages = list(Language.objects.order_by('id'))
+                if not languages:
+                    Language._fill_table()
+                    languages = list(Language.objects.order_by('id'))
+                self._by_code = {language.code: language for language in languages}
+                self._by_id = {language.id: language for language in languages}
+                self._loaded_at = time.monotonic()
+            return self._by_code, self._by_id
+
+
+language_registry = LanguageRegistry()
 
 
 class Learner(AbstractUser):
@@ -60,6 +99,11 @@ class Settings(models.Model):
 
     show_message_on_card_addition = models.BooleanField(default=True)  # show success message when card is added if true
 
+    @property
+    def language_code(self) -> str:
+        """Same as 'language.code', but without a query"""
+        return language_registry.by_id(self.language_id).code
+
 
 class Word(models.Model):
     """Cache already searched words"""
@@ -67,6 +111,14 @@ class Word(models.Model):
     name = models.CharField(max_length=50, unique=True)
     google = models.JSONField(null=True)  # data from google translate (definitions and examples)
     collins = models.JSONField(null=True)  # data from collins american-learner dictionary
+    # Collins wasn't requested because its quota was spent, 'refill_collins' command requests it later
+    collins_pending = models.BooleanField(default=False, db_index=True)
+    # When 'google' and 'collins' were downloaded and what parsed them (see word_refresh.py).
+    # Rows saved before these fields were added have no time and version 0
+    fetched_at = models.DateTimeField(null=True)
+    parser_version = models.PositiveSmallIntegerField(default=0)
+    # Version of the row, the word data responses are validated with it (ETag and Last-Modified)
+    updated_at = models.DateTimeField(auto_now=True)
 
     @staticmethod
     def get_by_name(name: str):
@@ -77,10 +129,27 @@ class Word(models.Model):
 
 
 class Translation(models.Model):
-    """Another caching model. One word can have more than 1 translation"""
-    word = models.ForeignKey(Word, on_delete=models.DO_NOTHING)
+    """Another caching model. One word can have more than 1 translation, but only one per language"""
+    # The unique (word, language) index starts with the word, so the word doesn't need its own index
+    word = models.ForeignKey(Word, on_delete=models.DO_NOTHING, db_index=False)
     language = models.ForeignKey(Language, on_delete=models.DO_NOTHING)
     translation = models.JSONField()
+    fetched_at = models.DateTimeField(null=True)  # same as in Word
+    parser_version = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Lookups by (word, language) are a single index probe
+            models.UniqueConstraint(fields=['word', 'language'], name='translation_word_language_unique'),
+        ]
+
+
+class CollinsUsage(models.Model):
+    """Collins API calls counted by all workers (see apis/collins.py CollinsQuota)"""
+    key = models.CharField(max_length=30, unique=True)  # kind and period, e.g. 'day:20261018'
+    day = models.DateField()  # UTC day of the period, old rows are deleted by it
+    calls = models.PositiveIntegerField(default=0)
 
 
 class Feedback(models.Model):
@@ -101,4 +170,5 @@ class Feedback(models.Model):
 class Request(models.Model):
     learner = models.ForeignKey(Learner, on_delete=models.DO_NOTHING)
     word = models.ForeignKey(Word, on_delete=models.DO_NOTHING)
-    date = models.DateTimeField(auto_now_add=True)
+    # Not 'auto_now_add', because requests are saved in batches some time later (see request_log.py)
+    date = models.DateTimeField(default=timezone.now)
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Language, Translation, Word, language_registry
+from anki_word_adder.word_cache import word_data_cache, word_not_found_cache
+from anki_word_adder.word_index import word_index
+
+
+@receiver([post_save, post_delete], sender=Language)
+def clear_language_registry(sender, **kwargs):
+    language_registry.clear()
+
+
+@receiver([post_save, post_delete], sender=Word)
+def invalidate_word_data(sender, instance: Word, **kwargs):
+    """Word data is a part of the cached response for every language the word is translated to"""
+    lang_codes = Translation.objects.filter(word=instance).values_list('language__code', flat=True)
+    word_data_cache.invalidate(instance.name, lang_codes)
+
+
+@receiver([post_save, post_delete], sender=Translation)
+def invalidate_translation_data(sender, instance: Translation, **kwargs):
+    lang_codes = [language_registry.by_id(instance.language_id).code]
+    word_data_cache.invalidate(instance.word.name, lang_codes)
+    # The word might have been saved from somewhere else (e.g. an admin) after a lookup didn't find it
+    word_not_found_cache.delete(instance.word.name, lang_codes)
+
+
+@receiver(post_save, sender=Translation)
+def index_translated_word(sender, instance: Translation, created: bool, **kwargs):
+    if created:
+        word_index.add(instance.language_id, instance.word.name)
+
+
+@receiver(post_delete, sender=Translation)
+def unindex_translated_word(sender, instance: Translation, **kwargs):
+    word_index.remove(instance.language_id, instance.word.name)
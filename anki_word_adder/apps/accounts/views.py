@@ -13,7 +13,7 @@ from django.views.generic import CreateView, TemplateView
 from ipware import get_client_ip
 
 from .forms import LearnerCreationForm, LearnerAuthenticationForm
-from .models import Learner, Settings, Language
+from .models import Learner, Settings, Language, language_registry
 from apis.ip_registry import get_language_code_by_ip
 
 
@@ -90,8 +90,8 @@ class SettingsView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         settings: Settings = self.request.user.settings
         settings = {
-            'current_language_code': settings.language.code,
-            'language_list': [{'code': l.code, 'name': l.name} for l in Language.objects.all()],
+            'current_language_code': settings.language_code,
+            'language_list': [{'code': l.code, 'name': l.name} for l in language_registry.all()],
             'deck_id': settings.deck_id,
             'show_message_on_card_addition': settings.show_message_on_card_addition,
         }
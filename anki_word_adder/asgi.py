@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+
+To serve word data with the async view:
+ASYNC_WORD_DATA_VIEW=True [PROVIDER_WORKERS=64] gunicorn anki_word_adder.asgi -k uvicorn.workers.UvicornWorker
+
+A sync worker serves one lookup at a time, an async one serves many at once. Google has no async API,
+so every new word of those lookups holds a provider pool thread (see apis/utils.py) for up to its timeout.
+The pool is sized for that here, PROVIDER_WORKERS should be at least the expected concurrent new words per worker.
 """
 
 import os
@@ -12,5 +19,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'anki_word_adder.settings.production')
+# Read when apis/utils.py is imported, so it must be set before the application is
+os.environ.setdefault('PROVIDER_WORKERS', '64')
 
 application = get_asgi_application()
@@ -0,0 +1,195 @@
+"""Async versions of the views that mostly wait for the providers.
+
+Under an ASGI server (see asgi.py) a single process keeps hundreds of provider calls in flight,
+while a sync gunicorn worker is blocked by each of them. DB and cache are synchronous,
+so they are accessed through 'sync_to_async'.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpRequest, JsonResponse
+from django.urls import reverse_lazy
+from django.views.generic import View
+
+from anki_word_adder.apps.accounts.models import Language, Learner, Translation, Word, language_registry
+from anki_word_adder.request_log import request_recorder
+from anki_word_adder.single_flight import MISSING, PENDING, POLL_INTERVAL, WAIT_TIMEOUT, SingleFlight
+from anki_word_adder.views import Downloaded, WordDataMixin
+from anki_word_adder.word_cache import word_data_cache, word_not_found_cache
+from apis.providers import SKIPPED, Provider
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGetWordDataView(WordDataMixin, View):
+    """Same as GetWordDataView"""
+
+    login_url = reverse_lazy('accounts:login')
+
+    async def get(self, request: HttpRequest, word: str):
+        word = word.lower()
+
+        learner, language = await sync_to_async(self.get_learner)(request)
+        if learner is None:
+            return redirect_to_login(request.get_full_path(), self.login_url)
+        lang_code = language.code
+
+        prefetch = self.is_prefetch(request)
+        entry = await sync_to_async(word_data_cache.get)(word, lang_code)
+        if entry is None:
+            if await sync_to_async(word_not_found_cache.contains)(word, lang_code):
+                return JsonResponse({'errors': [self.word_not_found_error]})
+            try:
+                translation_model = await (Translation.objects.select_related('word')
+                                           .aget(word__name=word, language=language))
+            except Translation.DoesNotExist:
+                if prefetch:
+                    return JsonResponse({'errors': [self.not_stored_error]}, status=404)
+                translations, failed = await self.afetch_translations([word], lang_code)
+                if word in failed:
+                    return JsonResponse({'errors': [self.provider_error]})
+                if word not in translations:
+                    return JsonResponse({'errors': [self.word_not_found_error]})
+                translation_model = translations[word]
+            else:
+                response = self.not_modified_response(request, translation_model)
+                if response is not None:
+                    if not prefetch:
+                        await sync_to_async(request_recorder.record)(learner.id, [translation_model.word_id])
+                    return response
+            entry = await sync_to_async(self.cache_word_data)(word, lang_code, translation_model)
+        self.schedule_refresh(word, lang_code, entry)
+
+        if not prefetch:
+            await sync_to_async(request_recorder.record)(learner.id, [entry['word_id']])
+
+        return self.word_data_response(request, entry)
+
+    @staticmethod
+    def get_learner(request: HttpRequest) -> Tuple[Optional[Learner], Optional[Language]]:
+        """Returns authenticated learner and their language. Loading them may require queries"""
+        if not request.user.is_authenticated:
+            return None, None
+        return request.user, language_registry.by_id(request.user.settings.language_id)
+
+    async def afetch_translations(self, words: List[str], lang_code: str) -> Tuple[Dict[str, Translation], Set[str]]:
+        """Same as 'fetch_translations'"""
+        translations = {}
+        failed = set()
+        pending = words
+        for _ in range(2):
+            flights, leading = await sync_to_async(self._acquire_flights)(pending, lang_code)
+            try:
+                fetched, fetch_failed = await self._afetch_translations(leading, lang_code)
+                await sync_to_async(self._publish_flights)(flights, fetched, fetch_failed)
+            finally:
+                await sync_to_async(self._release_flights)(flights)
+            translations.update(fetched)
+            failed |= fetch_failed
+
+            waited, pending = await self._await_flights(flights)
+            translations.update(waited)
+            if not pending:
+                return translations, failed
+
+        fetched, fetch_failed = await self._afetch_translations(pending, lang_code)
+        translations.update(fetched)
+        return translations, failed | fetch_failed
+
+    @staticmethod
+    async def _await_flights(flights: Dict[str, SingleFlight]) -> Tuple[Dict[str, Translation], List[str]]:
+        """Same as '_wait_flights', but the event loop and the sync thread are free between the checks,
+        so other requests of the process go on while this one waits for another worker"""
+        waiting = {word: flight for word, flight in flights.items() if not flight.leading}
+        translations = {}
+        pending = []
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while waiting:
+            results = await sync_to_async(lambda: {word: flight.poll() for word, flight in waiting.items()})()
+            for word, result in results.items():
+                if result is PENDING:
+                    continue
+                del waiting[word]
+                if result is MISSING:
+                    pending.append(word)
+                elif result is not None:
+                    translations[word] = result
+            if waiting and time.monotonic() >= deadline:
+                # The leaders are too slow
+                pending.extend(waiting)
+                break
+            if waiting:
+                await asyncio.sleep(POLL_INTERVAL)
+        return translations, pending
+
+    async def _afetch_translations(self, words: List[str], lang_code: str) -> Tuple[Dict[str, Translation], Set[str]]:
+        if not words:
+            return {}, set()
+        translations, words, word_models = await sync_to_async(self._find_saved)(words, lang_code)
+        downloaded, failed = await self._adownload(words, lang_code, word_models)
+        translations.update(await sync_to_async(self._save_downloaded)(downloaded, lang_code, word_models))
+        await sync_to_async(self._remember_not_found)(words, lang_code, translations, failed)
+        return translations, failed
+
+    async def _adownload(self, words: List[str], lang_code: str,
+                         word_models: Dict[str, Word]) -> Tuple[Dict[str, Downloaded], Set[str]]:
+        calls, skipped, failed = await sync_to_async(self._plan_calls)(words, word_models)
+        words = list(calls)
+
+        async def download(word: str) -> Optional[Downloaded]:
+            tasks = {
+                provider: asyncio.ensure_future(asyncio.wait_for(provider.acall(word, lang_code), provider.timeout))
+                for provider in calls[word]
+            }
+            return await self._await_providers(word, tasks)
+
+        results = await asyncio.gather(*(download(word) for word in words), return_exceptions=True)
+
+        downloaded = {}
+        for word, result in zip(words, results):
+            if isinstance(result, Exception):
+                logger.error('Unable to fetch data for "%s"', word, exc_info=result)
+                failed.add(word)
+            elif result is not None:
+                downloaded[word] = {**skipped[word], **result}
+        return downloaded, failed
+
+    @staticmethod
+    async def _await_providers(word: str, tasks: Dict[Provider, asyncio.Future]) -> Optional[Downloaded]:
+        """Same as '_wait_providers'"""
+        results = {}
+        unsettled = dict(tasks)
+        try:
+            for provider, task in tasks.items():
+                del unsettled[provider]
+                try:
+                    data, seconds = await task
+                except Exception as e:
+                    await sync_to_async(provider.record)(failed=True)
+                    if provider.required:
+                        raise
+                    if isinstance(e, asyncio.TimeoutError):
+                        logger.warning('%s ran out of its time budget for "%s"', provider, word)
+                    else:
+                        logger.error('%s failed for "%s"', provider, word, exc_info=e)
+                    data = SKIPPED
+                else:
+                    await sync_to_async(provider.record)(failed=False, seconds=seconds)
+                if provider.required and data is None:
+                    return None
+                results[provider] = data
+            return results
+        finally:
+            # The optional providers aren't needed if the word doesn't exist, see '_wait_providers'
+            for provider, task in unsettled.items():
+                if not task.done() or task.cancelled():
+                    task.cancel()
+                    await sync_to_async(provider.release)()
+                elif task.exception() is not None:
+                    await sync_to_async(provider.record)(failed=True)
+                else:
+                    await sync_to_async(provider.record)(failed=False, seconds=task.result()[1])
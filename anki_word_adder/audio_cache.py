@@ -0,0 +1,118 @@
+"""Collins pronunciation files, downloaded once and served from our own origin.
+
+Anki used to get 'audio_url' as is, so every learner's Anki downloaded the same mp3 from Collins,
+and the cards broke when Collins moved a file. The word data points to '/audio/<token>' instead,
+where the token is the signed Collins URL, so only the URLs the server gave out can be fetched through it.
+
+The first request downloads the file and stores it in AUDIO_CACHE['DIR'] under the SHA-256 of its content
+(content-addressed, the same file is stored once), which is also its ETag. A small index file per source URL
+points to the content. Workers share the directory, and the first requests for a file from all of them
+are coalesced (see single_flight.py): one worker downloads it, the others wait for its digest.
+"""
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from anki_word_adder import metrics
+from anki_word_adder.single_flight import MISSING, SingleFlight
+from apis.clients import TIMEOUT, get_session
+
+logger = logging.getLogger(__name__)
+
+SALT = 'anki_word_adder.audio_cache'
+CHUNK_SIZE = 64 * 1024  # bytes
+
+
+class AudioCache:
+    @staticmethod
+    def local_url(source_url: str) -> str:
+        """Our URL of the file. The same for the same source URL, so clients can cache it"""
+        # Not 'signing.dumps': its timestamp would make a new URL every second
+        token = signing.Signer(salt=SALT).sign_object(source_url, compress=True)
+        return reverse('audio', kwargs={'token': token})
+
+    @staticmethod
+    def source_url(token: str) -> Optional[str]:
+        """Source URL of a token from 'local_url', None if the token wasn't made by the server"""
+        try:
+            return signing.Signer(salt=SALT).unsign_object(token)
+        except signing.BadSignature:
+            return None
+
+    def fetch(self, source_url: str) -> Optional[str]:
+        """Digest of the stored file, it's downloaded if needed. None if it can't be downloaded"""
+        digest = self.digest(source_url)
+        if digest is not None:
+            return digest
+        flight = SingleFlight(f'audio:{source_url}')
+        if not flight.acquire():
+            digest = flight.wait()
+            # The leader gave up, but it might have stored the file
+            return self.digest(source_url) if digest is MISSING else digest
+        try:
+            digest = self._download(source_url)
+            flight.publish(digest)
+            return digest
+        finally:
+            flight.release()
+
+    def digest(self, source_url: str) -> Optional[str]:
+        """Digest of the file if it's stored"""
+        try:
+            digest = self._index_path(source_url).read_text()
+        except FileNotFoundError:
+            return None
+        # The directory might have been cleaned
+        return digest if self.path(digest).exists() else None
+
+    @staticmethod
+    def path(digest: str) -> Path:
+        return Path(settings.AUDIO_CACHE['DIR']) / digest[:2] / digest
+
+    @staticmethod
+    def _index_path(source_url: str) -> Path:
+        digest = hashlib.sha1(source_url.encode('utf-8')).hexdigest()
+        return Path(settings.AUDIO_CACHE['DIR']) / 'sources' / digest[:2] / digest
+
+    def _download(self, source_url: str) -> Optional[str]:
+        max_size = settings.AUDIO_CACHE['MAX_SIZE']
+        try:
+            with metrics.timer(metrics.http_client_requests, 'http', host=urlsplit(source_url).hostname):
+                with get_session().get(source_url, timeout=TIMEOUT, stream=True) as response:
+                    response.raise_for_status()
+                    content = bytearray()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        content.extend(chunk)
+                        if len(content) > max_size:
+                            logger.warning('%s is larger than %d bytes, it is not stored', source_url, max_size)
+                            return None
+        except requests.RequestException:
+            logger.warning('Unable to download %s', source_url, exc_info=True)
+            return None
+
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            self._write(path, content)
+        self._write(self._index_path(source_url), digest.encode('ascii'))
+        return digest
+
+    @staticmethod
+    def _write(path: Path, content: bytes) -> None:
+        """Readers never see a partly written file: it's written to a temporary one and renamed"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}')
+        temporary.write_bytes(content)
+        os.replace(temporary, path)
+
+
+audio_cache = AudioCache()
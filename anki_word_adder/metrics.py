@@ -0,0 +1,331 @@
+"""Lightweight in-process metrics, exported in the Prometheus text format (see MetricsView).
+
+Histograms are kept in memory of every process, counters and gauges come from the 'stats()' of the components
+(caches, request log, refreshes, Collins quota). The instrumented code (MetricsMiddleware, provider calls,
+'get_json_data', database queries) also adds its time to the current request,
+which is sent back in the Server-Timing header for in-browser debugging.
+
+gunicorn workers don't share memory, so if METRICS['DIR'] is set, every process saves its metrics
+to '<DIR>/<pid>.json' every FLUSH_INTERVAL seconds and the metrics view adds up the files of all the workers.
+Files of exited workers are kept, so the totals don't go down when a worker is restarted;
+clear the directory before the server starts.
+"""
+import asyncio
+import atexit
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)  # bytes
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Time spent by the current request in every dependency, for the Server-Timing header.
+    Provider pool threads record into it too (see apis.utils.with_context)"""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def server_timing(self) -> str:
+        # Calls made at the same time are added up, so a dependency can take longer than the whole request
+        metrics = [f'{name};dur={seconds * 1000:.1f};desc="{self.counts[name]} calls"'
+                   for name, seconds in self.durations.items()]
+        metrics.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+class Histogram:
+    def __init__(self, registry: 'Registry', name: str, buckets: Tuple[float, ...]) -> None:
+        self.registry = registry
+        self.name = name
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels: str) -> None:
+        self.registry.add_to_histogram(self.name, _labels(labels), bisect_left(self.buckets, value), value)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.descriptions: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self.buckets: Dict[str, Tuple[float, ...]] = {}
+        # (name, labels) -> [count of every bucket and above the last one, sum, count]
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        # (prefix, help, collect, counter keys, whether the stats are the same in every process)
+        self._stats: List[Tuple[str, str, Callable[[], Dict], Tuple[str, ...], bool]] = []
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DURATION_BUCKETS) -> Histogram:
+        self.descriptions[name] = ('histogram', help_text)
+        self.buckets[name] = buckets
+        return Histogram(self, name, buckets)
+
+    def add_stats(self, prefix: str, help_text: str, collect: Callable[[], Dict], counters: Iterable[str] = (),
+                  shared: bool = False) -> None:
+        """Export the 'stats()' of a component: keys listed in 'counters' as '<prefix>_<key>_total',
+        the rest as gauges. Shared stats (kept in the shared cache) are only collected by the exporting process"""
+        self._stats.append((prefix, help_text, collect, tuple(counters), shared))
+
+    def add_to_histogram(self, name: str, labels: Labels, bucket: int, value: float) -> None:
+        with self._lock:
+            self._check_pid()
+            values = self._histograms.get((name, labels))
+            if values is None:
+                values = self._histograms[(name, labels)] = [0] * (len(self.buckets[name]) + 3)
+            values[bucket] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def snapshot(self, shared: bool = False) -> Dict:
+        """Metrics of this process in a JSON-serializable form. 'shared' adds the shared stats"""
+        with self._lock:
+            histograms = [[name, dict(labels), list(values)] for (name, labels), values in self._histograms.items()]
+        counters = []
+        gauges = []
+        descriptions = dict(self.descriptions)
+        for prefix, help_text, collect, counter_keys, is_shared in self._stats:
+            if is_shared and not shared:
+                continue
+            try:
+                stats = collect()
+            except Exception:
+                logger.exception('Unable to collect %s stats', prefix)
+                continue
+            for key, value in stats.items():
+                if value is None:
+                    continue
+                if key in counter_keys:
+                    name = f'{prefix}_{key}_total'
+                    counters.append([name, {}, value])
+                    descriptions[name] = ('counter', f'{help_text}: {key}')
+                else:
+                    name = f'{prefix}_{key}'
+                    gauges.append([name, {}, value])
+                    descriptions[name] = ('gauge', f'{help_text}: {key}')
+        return {'time': time.time(), 'descriptions': descriptions,
+                'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def export(self) -> str:
+        """All the metrics in the Prometheus text format, of every worker if METRICS['DIR'] is set"""
+        snapshots = [self.snapshot(shared=True)]
+        metrics_dir = settings.METRICS['DIR']
+        if metrics_dir:
+            snapshots.extend(self._read_snapshots(Path(metrics_dir)))
+        return self.render(self.merge(snapshots, stale_before=time.time() - 3 * settings.METRICS['FLUSH_INTERVAL']))
+
+    def flush(self) -> None:
+        """Save the metrics of this process for the other workers"""
+        metrics_dir = settings.METRICS['DIR']
+        if not metrics_dir:
+            return
+        path = Path(metrics_dir) / f'{os.getpid()}.json'
+        temporary_path = path.with_suffix('.tmp')
+        try:
+            with open(temporary_path, 'w') as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            # The exporting worker never reads a half-written file
+            os.replace(temporary_path, path)
+        except OSError:
+            logger.exception('Unable to save metrics to %s', path)
+
+    @staticmethod
+    def _read_snapshots(metrics_dir: Path) -> List[Dict]:
+        snapshots = []
+        for path in metrics_dir.glob('*.json'):
+            if path.stem == str(os.getpid()):
+                # This process is exported from memory, the file is older
+                continue
+            try:
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                logger.exception('Unable to read metrics from %s', path)
+        return snapshots
+
+    @staticmethod
+    def merge(snapshots: List[Dict], stale_before: float) -> Dict:
+        """Add up the metrics of several processes. Gauges of processes that stopped saving them are left out"""
+        merged = {'descriptions': {}, 'counters': {}, 'histograms': {}, 'gauges': {}}
+        for snapshot in snapshots:
+            merged['descriptions'].update(snapshot['descriptions'])
+            for name, labels, value in snapshot['counters']:
+                key = (name, _labels(labels))
+                merged['counters'][key] = merged['counters'].get(key, 0) + value
+            for name, labels, values in snapshot['histograms']:
+                key = (name, _labels(labels))
+                total = merged['histograms'].get(key)
+                merged['histograms'][key] = values if total is None else [a + b for a, b in zip(total, values)]
+            if snapshot['time'] < stale_before:
+                continue
+            for name, labels, value in snapshot['gauges']:
+                key = (name, _labels(labels))
+                merged['gauges'][key] = merged['gauges'].get(key, 0) + value
+        return merged
+
+    def render(self, merged: Dict) -> str:
+        series: Dict[str, List[str]] = {}
+        for (name, labels), value in merged['counters'].items():
+            series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for (name, labels), value in merged['gauges'].items():
+            series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for (name, labels), values in merged['histograms'].items():
+            lines = series.setdefault(name, [])
+            buckets = self.buckets.get(name, ())
+            cumulative = 0
+            for bucket, count in zip(buckets, values):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_value(bucket)),))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {_format_value(values[-1])}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {_format_value(values[-1])}')
+
+        output = []
+        for name in sorted(series):
+            metric_type, help_text = merged['descriptions'].get(name, ('untyped', ''))
+            output.append(f'# HELP {name} {help_text}')
+            output.append(f'# TYPE {name} {metric_type}')
+            output.extend(sorted(series[name]))
+        return '\n'.join(output) + '\n'
+
+    def _check_pid(self) -> None:
+        """Must be called with the lock held"""
+        if self._pid != os.getpid():
+            # A forked worker must not count its parent's metrics again
+            self._histograms.clear()
+            self._pid = os.getpid()
+            if settings.METRICS['DIR']:
+                threading.Thread(target=self._run_flusher, name='metrics-flusher', daemon=True).start()
+                # The last metrics are saved at exit. Only by the processes that save them at all:
+                # scripts that import this module without Django settings must not touch them.
+                # A forked worker inherits its parent's hook, so it's registered once
+                atexit.unregister(self.flush)
+                atexit.register(self.flush)
+
+    def _run_flusher(self) -> None:
+        while True:
+            time.sleep(settings.METRICS['FLUSH_INTERVAL'])
+            self.flush()
+
+
+registry = Registry()
+
+http_requests = registry.histogram(
+    'awa_http_request_duration_seconds', 'Time to respond, by view and status')
+http_response_size = registry.histogram(
+    'awa_http_response_size_bytes', 'Size of the response bodies (after compression), by view', SIZE_BUCKETS)
+http_request_queries = registry.histogram(
+    'awa_http_request_db_queries', 'Database queries made by a request, by view', COUNT_BUCKETS)
+db_queries = registry.histogram('awa_db_query_duration_seconds', 'Database queries')
+provider_calls = registry.histogram(
+    'awa_provider_call_duration_seconds', 'GoogleData.get and CollinsData.get calls, by provider and result')
+http_client_requests = registry.histogram(
+    'awa_http_client_request_duration_seconds', 'JSON API requests (get_json_data), by host and result')
+
+
+def start_request() -> RequestTimings:
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _request_timings.get()
+
+
+@contextmanager
+def timer(histogram: Histogram, timing_name: str, **labels: str):
+    """Time the block in the histogram (with 'result' label, 'ok' or 'error') and in the current request"""
+    started = time.perf_counter()
+    result = 'error'
+    try:
+        yield
+        result = 'ok'
+    finally:
+        seconds = time.perf_counter() - started
+        histogram.observe(seconds, result=result, **labels)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(timing_name, seconds)
+
+
+def timed_provider(provider: str):
+    """Decorator recording the calls of a provider function (sync or async) in 'provider_calls'"""
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(provider_calls, provider, provider=provider):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(provider_calls, provider, provider=provider):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper, every connection gets it (see 'instrument_connection')"""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        db_queries.observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add('db', seconds)
+
+
+def instrument_connection(connection, **kwargs) -> None:
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(instrument_connection)
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
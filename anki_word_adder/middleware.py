@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware as SyncWhiteNoiseMiddleware
+
+from anki_word_adder import metrics
+
+
+class WhiteNoiseMiddleware(SyncWhiteNoiseMiddleware):
+    """WhiteNoise is sync-only, and a single sync middleware makes Django run the whole request,
+    async views included, in a thread. This version can also be called from the event loop"""
+
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        # Same as django.utils.deprecation.MiddlewareMixin, tells Django that the middleware is async
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            response = await sync_to_async(self.process_request)(request)
+        else:
+            # Files are found in a dictionary built at startup, so there's nothing to wait for
+            response = self.process_request(request)
+        return response or await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Times every request (see metrics.py) and sends the time spent in the dependencies
+    in the Server-Timing header if METRICS['SERVER_TIMING'] is on"""
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timings = self.start()
+        response = self.get_response(request)
+        self.finish(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so the DB queries made in its threads are added to this request
+        timings = self.start()
+        response = await self.get_response(request)
+        self.finish(request, response, timings)
+        return response
+
+    @staticmethod
+    def start() -> metrics.RequestTimings:
+        # Connections created before the signal receiver was connected
+        metrics.instrument_connection(connection)
+        return metrics.start_request()
+
+    @staticmethod
+    def finish(request, response, timings: metrics.RequestTimings) -> None:
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else 'other'
+        metrics.http_requests.observe(time.perf_counter() - timings.started,
+                                      view=view, status=str(response.status_code))
+        metrics.http_request_queries.observe(timings.counts.get('db', 0), view=view)
+        if not response.streaming:
+            metrics.http_response_size.observe(len(response.content), view=view)
+        if settings.METRICS['SERVER_TIMING']:
+            response['Server-Timing'] = timings.server_timing()
@@ -0,0 +1,93 @@
+"""Write-behind recording of word requests (analytics).
+
+Saving a Request row used to be the only write on the cache-hit path of a lookup.
+Now requests are kept in memory of every worker and saved with one 'bulk_create'
+when there are FLUSH_SIZE of them, every FLUSH_INTERVAL seconds and when the worker exits.
+The buffer is bounded by MAX_SIZE, requests above it are dropped and counted.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from anki_word_adder import metrics
+from anki_word_adder.apps.accounts.models import Request
+
+logger = logging.getLogger(__name__)
+
+
+class RequestRecorder:
+    def __init__(self) -> None:
+        self.recorded = 0
+        self.dropped = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def record(self, learner_id: int, word_ids: Iterable[int]) -> None:
+        # The date is taken now, not when the row is saved
+        now = timezone.now()
+        requests = [Request(learner_id=learner_id, word_id=word_id, date=now) for word_id in word_ids]
+        config = settings.REQUEST_LOG
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start(config)
+            free = max(config['MAX_SIZE'] - len(self._buffer), 0)
+            if len(requests) > free:
+                self.dropped += len(requests) - free
+                requests = requests[:free]
+            self._buffer.extend(requests)
+            self.recorded += len(requests)
+            should_flush = len(self._buffer) >= config['FLUSH_SIZE']
+
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            requests, self._buffer = self._buffer, []
+        if not requests:
+            return
+        try:
+            Request.objects.bulk_create(requests)
+        except DatabaseError:
+            logger.exception('Unable to save %d requests', len(requests))
+            with self._lock:
+                self.dropped += len(requests)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'buffered': len(self._buffer),
+        }
+
+    def _start(self, config) -> None:
+        """Start recording in this process. Must be called with the lock held"""
+        # A forked worker must not save requests buffered by its parent
+        self._buffer = []
+        self._pid = os.getpid()
+        if config['FLUSH_SIZE'] > 1:
+            threading.Thread(target=self._run_flusher, name='request-log-flusher', daemon=True).start()
+
+    def _run_flusher(self) -> None:
+        while True:
+            time.sleep(settings.REQUEST_LOG['FLUSH_INTERVAL'])
+            try:
+                self.flush()
+            finally:
+                # Every thread has its own connection, don't keep this one open between flushes
+                connection.close()
+
+
+request_recorder = RequestRecorder()
+atexit.register(request_recorder.flush)
+metrics.registry.add_stats('awa_request_log', 'Word requests saved in batches', request_recorder.stats,
+                           counters=('recorded', 'dropped'))
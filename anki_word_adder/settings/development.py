@@ -43,7 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'anki_word_adder.middleware.WhiteNoiseMiddleware',
+    'anki_word_adder.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,6 +88,111 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Shared by all gunicorn workers (e.g. for single-flight leases), so it can't be in-process memory.
+# The tables are created by 'python manage.py createcachetable'.
+# DatabaseCache deletes a third of the entries (CULL_FREQUENCY) whenever there are more than MAX_ENTRIES,
+# so state that must survive (circuit breakers) has its own table that never gets that full
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'awa_cache',
+        'OPTIONS': {
+            # Mostly the shared tier of the word data (WORD_DATA_CACHE) and audio (AUDIO_CACHE)
+            'MAX_ENTRIES': 200000,
+        },
+    },
+    'state': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'awa_state',
+        'OPTIONS': {
+            # A few keys per host, expired ones are deleted before anything is culled
+            'MAX_ENTRIES': 1000000,
+        },
+    },
+}
+
+# Word data sent to learners is cached in memory of every process (LRU) and in the shared cache.
+# Sizes are numbers of entries, TTLs are in seconds.
+# Other processes don't know when a word is changed, so LOCAL_TTL is also the longest time they can serve stale data
+WORD_DATA_CACHE = {
+    'LOCAL_SIZE': 1000,
+    'LOCAL_TTL': 60,
+    'SHARED_TTL': 7 * 24 * 60 * 60,
+    # Words the providers don't know. Shorter, because dictionaries get new words
+    'NOT_FOUND_TTL': 24 * 60 * 60,
+}
+
+# Typeahead suggestions come from an index of the translated words in memory of every process (see word_index.py).
+# New words of other processes are picked up at most once per REFRESH_INTERVAL (seconds).
+# LIMIT is the most suggestions per prefix, prefixes shorter than MIN_PREFIX get none
+WORD_INDEX = {
+    'LIMIT': 8,
+    'MIN_PREFIX': 2,
+    'REFRESH_INTERVAL': 5,
+}
+
+# Collins pronunciation files are downloaded once, kept in DIR (shared by the workers) and served from '/audio/'
+# (see audio_cache.py). Files larger than MAX_SIZE (bytes) are left at Collins
+AUDIO_CACHE = {
+    'DIR': os.environ.get('AUDIO_CACHE_DIR', BASE_DIR / 'audio_cache'),
+    'MAX_SIZE': 2 * 1024 * 1024,
+}
+
+# Word requests are saved in batches (see request_log.py). MAX_SIZE and FLUSH_SIZE are numbers of requests,
+# FLUSH_INTERVAL is in seconds. FLUSH_SIZE 1 saves every request immediately
+REQUEST_LOG = {
+    'MAX_SIZE': 10000,
+    'FLUSH_SIZE': 100,
+    'FLUSH_INTERVAL': 10,
+}
+
+# Sources of the word data (see apis/providers.py), called at the same time for a new word.
+# TIMEOUT is the time budget (seconds) of a provider in a lookup: a required provider (Google) that runs out of it
+# fails the lookup, an optional one (Collins) is left out and the word is saved without its data
+WORD_PROVIDERS = {
+    'google': {'CLASS': 'apis.providers.GoogleProvider', 'TIMEOUT': 5},
+    'collins': {'CLASS': 'apis.providers.CollinsProvider', 'TIMEOUT': 2},
+}
+
+# Hedged requests (see apis/hedging.py): a call to one of HOSTS slower than its recent p95 (but not sooner than
+# MIN_DELAY seconds) is sent once more, and the first response wins. The second calls run in WORKERS threads.
+# Collins calls are counted by the API, so no host is hedged unless it's listed
+HEDGING = {
+    'HOSTS': {host for host in os.environ.get('HEDGE_HOSTS', '').split(',') if host},
+    'MIN_DELAY': 0.05,
+    'WORKERS': 16,
+}
+
+# Engine of the Collins entries (see apis/collins.py): 'stream' (single pass with the standard HTMLParser)
+# or 'bs4' (BeautifulSoup tree, the original parser)
+COLLINS_PARSER = os.environ.get('COLLINS_PARSER', 'stream')
+
+# Saved word data older than MAX_AGE (seconds) is downloaded again in the background, while the old one is served.
+# Every process runs no more than MAX_CONCURRENT refreshes (0 disables them).
+# Collins is only refreshed while more than COLLINS_RESERVE calls of today's quota are left for new words
+WORD_REFRESH = {
+    'MAX_AGE': 90 * 24 * 60 * 60,
+    'MAX_CONCURRENT': 2,
+    'COLLINS_RESERVE': 1000,
+}
+
+# Request, provider and DB timings (see metrics.py). With DIR set, every worker saves its metrics there
+# every FLUSH_INTERVAL seconds (clear it before the server starts), and '/metrics' adds them up.
+# '/metrics' needs 'Authorization: Bearer <TOKEN>' if TOKEN is set, a staff user otherwise.
+# SERVER_TIMING sends the time spent in the dependencies in the Server-Timing header
+METRICS = {
+    'DIR': os.environ.get('METRICS_DIR'),
+    'FLUSH_INTERVAL': 15,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING', str(DEBUG)) == 'True',
+}
+
+# Serve '/word-data/' with the async view. Only makes sense under an ASGI server (see asgi.py)
+ASYNC_WORD_DATA_VIEW = os.environ.get('ASYNC_WORD_DATA_VIEW') == 'True'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
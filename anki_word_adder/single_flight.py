@@ -0,0 +1,90 @@
+"""Coalescing of the same expensive work across gunicorn workers.
+
+The first worker that takes a lease for a key does the work and publishes the result,
+others wait for it instead of repeating the work. The lease is stored in the shared Django cache
+and expires, so if the leader dies, one of the waiting workers takes over.
+"""
+import hashlib
+import time
+import uuid
+from typing import Any
+
+from django.core.cache import cache
+
+LEASE_TIMEOUT = 15  # seconds. Must be longer than the slowest provider round trip
+WAIT_TIMEOUT = 20  # seconds. Longer than the lease, so a dead leader is noticed before giving up
+RESULT_TIMEOUT = 30  # seconds. Only needed until every waiting worker picks the result up
+POLL_INTERVAL = 0.05  # seconds
+
+# Returned by 'wait' when there's no result to share (leader failed, died or is too slow)
+MISSING = object()
+# Returned by 'poll' while the leader is still working
+PENDING = object()
+
+
+class SingleFlight:
+    """Lease for one unit of work. Usage:
+
+    flight = SingleFlight(key)
+    if flight.acquire():
+        try:
+            flight.publish(do_work())
+        finally:
+            flight.release()
+    else:
+        result = flight.wait()
+    """
+
+    def __init__(self, key: str, lease_timeout: int = LEASE_TIMEOUT) -> None:
+        # Keys may contain anything the learner typed, so hash them to be valid for every cache backend
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        self.lease_key = f'single-flight:lease:{digest}'
+        self.result_key = f'single-flight:result:{digest}'
+        self.lease_timeout = lease_timeout
+        self.token = uuid.uuid4().hex
+        self.leading = False
+        self.leader = None  # token of the worker we are waiting for
+
+    def acquire(self) -> bool:
+        """Try to become the leader. Returns False if another worker already does the work"""
+        if cache.add(self.lease_key, self.token, self.lease_timeout):
+            self.leading = True
+            return True
+        self.leader = cache.get(self.lease_key)
+        return False
+
+    def publish(self, result: Any) -> None:
+        """Share the result with the waiting workers. Must be called before 'release'"""
+        cache.set(self.result_key, (self.token, result), RESULT_TIMEOUT)
+
+    def release(self) -> None:
+        # The lease might have expired and been taken over by another worker, keep it then
+        if cache.get(self.lease_key) == self.token:
+            cache.delete(self.lease_key)
+
+    def wait(self, timeout: float = WAIT_TIMEOUT) -> Any:
+        """Wait for the leader's result. Returns MISSING if there's nothing to wait for"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            result = self.poll()
+            if result is not PENDING:
+                return result
+            time.sleep(POLL_INTERVAL)
+        return MISSING
+
+    def poll(self) -> Any:
+        """A single check of 'wait', for callers that can't block (async views).
+        Returns the result, MISSING if there's nothing to wait for or PENDING"""
+        result = self._get_result()
+        if result is not MISSING:
+            return result
+        if self.leader is None or cache.get(self.lease_key) != self.leader:
+            # The leader could publish and release between the two reads above
+            return self._get_result()
+        return PENDING
+
+    def _get_result(self) -> Any:
+        stored = cache.get(self.result_key)
+        if stored is not None and stored[0] == self.leader:
+            return stored[1]
+        return MISSING
@@ -13,10 +13,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
-from .views import MainPageView, GuidePageView, VersionsPageView, GetWordDataView, FeedbackView
+from .async_views import AsyncGetWordDataView
+from .views import (MainPageView, GuidePageView, VersionsPageView, GetWordDataView, GetWordsDataView, FeedbackView,
+                    SuggestionsView, AudioView, MetricsView)
+
+word_data_view = AsyncGetWordDataView if settings.ASYNC_WORD_DATA_VIEW else GetWordDataView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,7 +34,17 @@ urlpatterns = [
 
     path('versions/', VersionsPageView.as_view(), name='versions'),
 
-    path('word-data/<str:word>', GetWordDataView.as_view(), name='word_data'),
+    path('word-data/<str:word>', word_data_view.as_view(), name='word_data'),
+
+    path('word-data-async/<str:word>', AsyncGetWordDataView.as_view(), name='async_word_data'),
+
+    path('word-data/', GetWordsDataView.as_view(), name='words_data'),
+
+    path('suggestions/', SuggestionsView.as_view(), name='suggestions'),
 
     path('feedback/', FeedbackView.as_view(), name='feedback'),
+
+    path('audio/<str:token>', AudioView.as_view(), name='audio'),
+
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,14 +1,104 @@
+import hmac
 import json
-from typing import Any, Dict
+import logging
+import mimetypes
+import re
+import time
+from concurrent import futures
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django.views.generic import TemplateView, View
 from django.urls import reverse_lazy
 
-from anki_word_adder.apps.accounts.models import Language, Learner, Settings, Word, Translation, Request, Feedback
-from apis.collins import CollinsData
-from apis.google import GoogleData
+from anki_word_adder import metrics
+from anki_word_adder.apps.accounts.models import Learner, Settings, Word, Translation, Feedback, language_registry
+from anki_word_adder.audio_cache import audio_cache
+from anki_word_adder.request_log import request_recorder
+from anki_word_adder.single_flight import MISSING, SingleFlight
+from anki_word_adder.word_cache import ENTRY_VERSION, word_data_cache, word_not_found_cache
+from anki_word_adder.word_index import word_index
+from anki_word_adder.word_refresh import PARSER_VERSION, is_stale, refresh_at, word_refresher
+from apis.providers import SKIPPED, Provider, get_providers
+from apis.utils import provider_executor, with_context
+
+logger = logging.getLogger(__name__)
+
+# Data of every provider called for a word, SKIPPED for the ones that were left out
+Downloaded = Dict[Provider, Any]
+
+# Content encodings of the cached word data bodies, the preferred first
+CONTENT_ENCODINGS = ('br', 'gzip')
+
+# Words of a pasted text: letters with apostrophes and hyphens inside ("don't", "well-known")
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:['-][^\W\d_]+)*")
+
+# Learners of different languages get different word data under the same URL, and it may change,
+# so it's always revalidated (with the ETag, that's an empty 304 for an unchanged word)
+WORD_DATA_CACHE_CONTROL = 'private, no-cache'
+
+# New words show up in the suggestions a bit later, and a learner types the same prefixes again and again
+SUGGESTIONS_CACHE_CONTROL = 'private, max-age=60'
+
+# Content of an audio URL never changes (see audio_cache.py)
+AUDIO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """Encodings from an Accept-Encoding header, except the ones with zero quality"""
+    encodings = set()
+    for item in accept_encoding.split(','):
+        encoding, _, params = item.partition(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(encoding)
+    return encodings
+
+
+def tokenize(text: str) -> List[str]:
+    """Words of a text in their order, with duplicates"""
+    return WORD_PATTERN.findall(text.replace('\u2019', "'"))
+
+
+def byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte of a single range from a Range header, None for the whole content
+    (no header, a malformed one or several ranges). Raises ValueError if the range is outside the content"""
+    unit, _, spec = range_header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash:
+        return None
+    try:
+        first = int(first) if first else None
+        last = int(last) if last else None
+    except ValueError:
+        return None
+    if first is None:
+        if last is None:
+            return None
+        # The last 'last' bytes
+        if last == 0 or size == 0:
+            raise ValueError('Range outside the content')
+        return max(size - last, 0), size - 1
+    last = size - 1 if last is None else min(last, size - 1)
+    if first > last:
+        raise ValueError('Range outside the content')
+    return first, last
 
 
 class MainPageView(LoginRequiredMixin, TemplateView):
@@ -21,7 +111,7 @@ class MainPageView(LoginRequiredMixin, TemplateView):
         learner_settings = {
             'note_id': settings.note_id,
             'deck_id': settings.deck_id,
-            'translate_to': settings.language.code,
+            'translate_to': settings.language_code,
             'translation_filter': settings.translation_filter,
             'add_google_definitions': settings.add_google_definitions,
             'add_collins_definitions': settings.add_collins_definitions,
@@ -47,7 +137,349 @@ class FeedbackView(LoginRequiredMixin, View):
         return HttpResponse(status=204)
 
 
-class GetWordDataView(LoginRequiredMixin, View):
+class WordDataMixin:
+    """Lookup and fetching logic shared by the single and the batch word data views"""
+
+    word_not_found_error = 'The word not found. Check if you typed it correctly and try again'
+    provider_error = 'Unable to get the word data right now. Try again later'
+    not_stored_error = 'The word is not stored yet'
+
+    @staticmethod
+    def is_prefetch(request: HttpRequest) -> bool:
+        """Downloads of a suggested word before the learner looks it up (see main_data_manager.js suggestWords).
+        They aren't the learner's lookups, so they aren't recorded, and only stored words are sent"""
+        return request.headers.get('Purpose') == 'prefetch'
+
+    @staticmethod
+    def word_data(word: str, translation_model: Translation) -> Dict[str, Any]:
+        word_model = translation_model.word
+        collins = word_model.collins
+        if collins and collins.get('audio_url'):
+            collins = {**collins, 'audio_url': audio_cache.local_url(collins['audio_url'])}
+        return {
+            'word': word,
+            'translations': translation_model.translation['translations'],
+            'google': word_model.google,
+            'collins': collins,
+        }
+
+    def cache_word_data(self, word: str, lang_code: str, translation_model: Translation) -> Dict[str, Any]:
+        """Put the word data into the cache and return the cache entry"""
+        data = self.word_data(word, translation_model)
+        etag, last_modified = self.validators(translation_model)
+        return word_data_cache.set(word, lang_code, translation_model.word_id, data,
+                                   refresh_at(translation_model.word, translation_model), etag, last_modified)
+
+    @staticmethod
+    def validators(translation_model: Translation) -> Tuple[str, float]:
+        """ETag and Last-Modified (Unix time) of the word data, made of the versions of the rows it comes from.
+        The ETag is weak: the same data is sent in different content encodings"""
+        word_updated = translation_model.word.updated_at
+        translation_updated = translation_model.updated_at
+        etag = (f'W/"{ENTRY_VERSION}-{translation_model.id}'
+                f'-{int(word_updated.timestamp() * 1e6):x}-{int(translation_updated.timestamp() * 1e6):x}"')
+        return etag, max(word_updated, translation_updated).timestamp()
+
+    def not_modified_response(self, request: HttpRequest, translation_model: Translation) -> Optional[HttpResponse]:
+        """304 if the learner has this version of the word data already, so the data isn't even made"""
+        etag, last_modified = self.validators(translation_model)
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def word_data_response(self, request: HttpRequest, entry: Dict[str, Any]) -> HttpResponse:
+        """Sends the cached body as is, compressed if the client accepts it, or 304 if the client has it"""
+        etag = entry.get('etag')
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag, last_modified=int(entry['last_modified']))
+            if response is not None:
+                self.set_validators(response, etag, entry['last_modified'])
+                return response
+
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = next((e for e in CONTENT_ENCODINGS if e in accepted), 'identity')
+        response = HttpResponse(entry['bodies'][encoding], content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if etag is not None:
+            self.set_validators(response, etag, entry['last_modified'])
+        return response
+
+    @staticmethod
+    def set_validators(response: HttpResponse, etag: str, last_modified: float) -> None:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = WORD_DATA_CACHE_CONTROL
+
+    def schedule_refresh(self, word: str, lang_code: str, entry: Dict[str, Any]) -> None:
+        """The entry is served as is, but if it's outdated, the word is downloaded again in the background"""
+        if is_stale(entry):
+            word_refresher.schedule(word, lang_code, self.refresh_word)
+
+    @classmethod
+    def refresh_word(cls, word: str, lang_code: str) -> None:
+        """Download the data of a saved word again and rewrite it. Runs in the background (see word_refresh.py)"""
+        try:
+            translation_model = (Translation.objects.select_related('word')
+                                 .get(word__name=word, language=language_registry.get(lang_code)))
+        except Translation.DoesNotExist:
+            return
+        word_model = translation_model.word
+        if refresh_at(word_model, translation_model) > time.time():
+            # Another worker has already refreshed it
+            return
+
+        # Providers are called from this thread, so refreshes don't take the provider pool from lookups
+        for provider in get_providers():
+            if not provider.is_available(background=True):
+                continue
+            try:
+                data, seconds = provider.call(word, lang_code)
+            except Exception:
+                provider.record(failed=True)
+                raise
+            provider.record(failed=False, seconds=seconds)
+            if data is None:
+                # Words that stopped being found keep the old data
+                continue
+            for field, value in provider.word_fields(data).items():
+                setattr(word_model, field, value)
+            for field, value in provider.translation_fields(data).items():
+                setattr(translation_model, field, value)
+
+        # The time is updated even if nothing was found, to not retry the word
+        now = timezone.now()
+        word_model.fetched_at = translation_model.fetched_at = now
+        word_model.parser_version = translation_model.parser_version = PARSER_VERSION
+        # Saving invalidates the cached word data (see signals.py)
+        word_model.save()
+        translation_model.save()
+
+    def fetch_translations(self, words: List[str], lang_code: str) -> Tuple[Dict[str, Translation], Set[str]]:
+        """Download the missing data for the words and save it.
+        Returns translations of the words that exist and the words for which a provider failed.
+        If another worker is already fetching the same word, its result is awaited instead"""
+        translations = {}
+        failed = set()
+        pending = words
+        # The second attempt takes over the words whose leader died or gave up
+        for _ in range(2):
+            flights, leading = self._acquire_flights(pending, lang_code)
+            try:
+                fetched, fetch_failed = self._fetch_translations(leading, lang_code)
+                self._publish_flights(flights, fetched, fetch_failed)
+            finally:
+                self._release_flights(flights)
+            translations.update(fetched)
+            failed |= fetch_failed
+
+            waited, pending = self._wait_flights(flights)
+            translations.update(waited)
+            if not pending:
+                return translations, failed
+
+        # Leaders keep failing, so stop waiting for them
+        fetched, fetch_failed = self._fetch_translations(pending, lang_code)
+        translations.update(fetched)
+        return translations, failed | fetch_failed
+
+    def _fetch_translations(self, words: List[str], lang_code: str) -> Tuple[Dict[str, Translation], Set[str]]:
+        if not words:
+            return {}, set()
+        translations, words, word_models = self._find_saved(words, lang_code)
+        downloaded, failed = self._download(words, lang_code, word_models)
+        translations.update(self._save_downloaded(downloaded, lang_code, word_models))
+        self._remember_not_found(words, lang_code, translations, failed)
+        return translations, failed
+
+    @staticmethod
+    def _remember_not_found(words: List[str], lang_code: str, translations: Dict[str, Translation],
+                            failed: Set[str]) -> None:
+        """Words without data that didn't fail don't exist, there's no point in asking the providers again"""
+        not_found = [word for word in words if word not in translations and word not in failed]
+        if not_found:
+            word_not_found_cache.add_many(not_found, lang_code)
+
+    def _find_saved(self, words: List[str],
+                    lang_code: str) -> Tuple[Dict[str, Translation], List[str], Dict[str, Word]]:
+        """Returns saved translations, words without them and saved Words among the latter.
+        A previous leader might have saved the data between our lookup and taking the lease"""
+        translations = {t.word.name: t for t in Translation.objects
+                        .filter(word__name__in=words, language=language_registry.get(lang_code))
+                        .select_related('word')}
+        words = [word for word in words if word not in translations]
+        word_models = {w.name: w for w in Word.objects.filter(name__in=words)}
+        return translations, words, word_models
+
+    def _download(self, words: List[str], lang_code: str,
+                  word_models: Dict[str, Word]) -> Tuple[Dict[str, Downloaded], Set[str]]:
+        """All provider calls are started at the same time, so the words cost the slowest call, not the sum.
+        Words that don't exist are left out of the result"""
+        calls, skipped, failed = self._plan_calls(words, word_models)
+        executor = provider_executor()
+        started = time.monotonic()
+        word_futures = {word: {provider: executor.submit(with_context(provider.call), word, lang_code)
+                               for provider in providers}
+                        for word, providers in calls.items()}
+
+        downloaded = {}
+        for word, provider_futures in word_futures.items():
+            try:
+                results = self._wait_providers(word, provider_futures, started)
+            except Exception:
+                logger.exception('Unable to fetch data for "%s"', word)
+                failed.add(word)
+                continue
+            if results is not None:
+                downloaded[word] = {**skipped[word], **results}
+        return downloaded, failed
+
+    @staticmethod
+    def _plan_calls(words: List[str], word_models: Dict[str, Word]) -> Tuple[Dict[str, List[Provider]],
+                                                                              Dict[str, Downloaded], Set[str]]:
+        """Returns the providers to call for every word, the skipped ones (e.g. the Collins quota is spent)
+        and the words that fail right away, because a required provider is unavailable (e.g. its circuit is open).
+        Providers that aren't per language are only needed if there's no Word yet (a new translation language).
+        Availability is checked here, on the request thread, because it may need the DB"""
+        calls = {}
+        skipped = {}
+        failed = set()
+        for word in words:
+            calls[word] = []
+            skipped[word] = {}
+            for provider in get_providers():
+                if not provider.per_language and word in word_models:
+                    continue
+                if provider.is_available():
+                    calls[word].append(provider)
+                elif provider.required:
+                    logger.warning('%s is unavailable, "%s" is not fetched', provider, word)
+                    del calls[word], skipped[word]
+                    failed.add(word)
+                    break
+                else:
+                    skipped[word][provider] = SKIPPED
+        return calls, skipped, failed
+
+    @staticmethod
+    def _wait_providers(word: str, provider_futures: Dict[Provider, futures.Future],
+                        started: float) -> Optional[Downloaded]:
+        """Wait for every provider no longer than its time budget. Returns None if the word doesn't exist.
+        A required provider that fails or runs out of time fails the word, an optional one is left out"""
+        results = {}
+        unsettled = dict(provider_futures)
+        try:
+            # The required providers come first, so the optional ones aren't waited for if the word doesn't exist
+            for provider, future in provider_futures.items():
+                del unsettled[provider]
+                try:
+                    data, seconds = future.result(timeout=max(started + provider.timeout - time.monotonic(), 0))
+                except Exception as e:
+                    provider.record(failed=True)
+                    if provider.required:
+                        raise
+                    if isinstance(e, futures.TimeoutError):
+                        logger.warning('%s ran out of its time budget for "%s"', provider, word)
+                    else:
+                        logger.exception('%s failed for "%s"', provider, word)
+                    data = SKIPPED
+                else:
+                    provider.record(failed=False, seconds=seconds)
+                if provider.required and data is None:
+                    return None
+                results[provider] = data
+            return results
+        finally:
+            # The providers that weren't waited for aren't needed. Every one of them passed 'is_available',
+            # so their breakers get the outcome or are released (a half-open circuit waits for its trial call)
+            for provider, future in unsettled.items():
+                if future.cancel() or not future.done():
+                    provider.release()
+                elif future.exception() is not None:
+                    provider.record(failed=True)
+                else:
+                    provider.record(failed=False, seconds=future.result()[1])
+
+    def _save_downloaded(self, downloaded: Dict[str, Downloaded], lang_code: str,
+                         word_models: Dict[str, Word]) -> Dict[str, Translation]:
+        translations = {}
+        for word, results in downloaded.items():
+            word_model = word_models.get(word)
+            if word_model is None:
+                word_model = self.create_word(word, results)
+            translations[word] = self.create_translation(word_model, lang_code, results)
+        return translations
+
+    @staticmethod
+    def _acquire_flights(words: List[str], lang_code: str) -> Tuple[Dict[str, SingleFlight], List[str]]:
+        """Returns flights for all the words and the words this worker leads"""
+        flights = {word: SingleFlight(f'translation:{lang_code}:{word}') for word in words}
+        leading = [word for word, flight in flights.items() if flight.acquire()]
+        return flights, leading
+
+    @staticmethod
+    def _publish_flights(flights: Dict[str, SingleFlight], fetched: Dict[str, Translation], failed: Set[str]):
+        for word, flight in flights.items():
+            if flight.leading and word not in failed:
+                flight.publish(fetched.get(word))
+
+    @staticmethod
+    def _release_flights(flights: Dict[str, SingleFlight]):
+        for flight in flights.values():
+            if flight.leading:
+                flight.release()
+
+    @staticmethod
+    def _wait_flights(flights: Dict[str, SingleFlight]) -> Tuple[Dict[str, Translation], List[str]]:
+        """Wait for the results of the flights led by other workers.
+        Returns found translations and the words that have to be fetched again"""
+        translations = {}
+        pending = []
+        for word, flight in flights.items():
+            if flight.leading:
+                continue
+            result = flight.wait()
+            if result is MISSING:
+                pending.append(word)
+            elif result is not None:
+                translations[word] = result
+        return translations, pending
+
+    def create_translation(self, word_model: Word, lang_code: str, results: Downloaded):
+        fields = {}
+        for provider, data in results.items():
+            if provider.per_language and data is not SKIPPED:
+                fields.update(provider.translation_fields(data))
+        translation_model = Translation(word=word_model, language=language_registry.get(lang_code),
+                                        fetched_at=timezone.now(), parser_version=PARSER_VERSION, **fields)
+        try:
+            with transaction.atomic():
+                translation_model.save()
+        except IntegrityError:
+            # Another worker has saved the translation after we checked (words are unique per language)
+            translation_model = (Translation.objects.select_related('word')
+                                 .get(word=word_model, language=translation_model.language))
+        return translation_model
+
+    def create_word(self, word: str, results: Downloaded) -> Word:
+        """Skipped providers leave their mark (e.g. 'collins_pending', so the word is refilled later)"""
+        fields = {}
+        for provider, data in results.items():
+            fields.update(provider.skipped_word_fields() if data is SKIPPED else provider.word_fields(data))
+        word_model = Word(name=word, fetched_at=timezone.now(), parser_version=PARSER_VERSION, **fields)
+
+        try:
+            with transaction.atomic():
+                word_model.save()
+        except IntegrityError:
+            # Another worker has created the word after we checked (e.g. for another language)
+            word_model = Word.objects.get(name=word)
+        return word_model
+
+
+class GetWordDataView(LoginRequiredMixin, WordDataMixin, View):
     login_url = reverse_lazy('accounts:login')
 
     def get(self, request: HttpRequest, word: str):
@@ -55,63 +487,176 @@ class GetWordDataView(LoginRequiredMixin, View):
         word = word.lower()
 
         learner: Learner = request.user
-        lang_code = learner.settings.language.code
+        lang_code = learner.settings.language_code
 
-        # At some point there will be a lot of words in a the DB,
-        # so EAFP will be better than LBYL
-        try:
-            translation_model = Translation.objects.get(word__name=word, language__code=lang_code)
-        except Translation.DoesNotExist:
-            google_data = GoogleData.get(word, lang_code)
-            if google_data is None:
-                return JsonResponse({
-                    'errors': ['The word not found. Check if you typed it correctly and try again']
-                })
-            translation_model = self.create_translation(word, lang_code, google_data)
+        prefetch = self.is_prefetch(request)
+        entry = word_data_cache.get(word, lang_code)
+        if entry is None:
+            if word_not_found_cache.contains(word, lang_code):
+                return JsonResponse({'errors': [self.word_not_found_error]})
+            # At some point there will be a lot of words in a the DB,
+            # so EAFP will be better than LBYL
+            try:
+                # The word is joined here, so the word data doesn't need another query
+                translation_model = (Translation.objects.select_related('word')
+                                     .get(word__name=word, language=language_registry.get(lang_code)))
+            except Translation.DoesNotExist:
+                if prefetch:
+                    return JsonResponse({'errors': [self.not_stored_error]}, status=404)
+                translations, failed = self.fetch_translations([word], lang_code)
+                if word in failed:
+                    return JsonResponse({'errors': [self.provider_error]})
+                if word not in translations:
+                    return JsonResponse({'errors': [self.word_not_found_error]})
+                translation_model = translations[word]
+            else:
+                response = self.not_modified_response(request, translation_model)
+                if response is not None:
+                    if not prefetch:
+                        request_recorder.record(learner.id, [translation_model.word_id])
+                    return response
+            entry = self.cache_word_data(word, lang_code, translation_model)
+        self.schedule_refresh(word, lang_code, entry)
 
-        word_model = translation_model.word
-        Request(learner=learner, word=word_model).save()
+        if not prefetch:
+            request_recorder.record(learner.id, [entry['word_id']])
+
+        return self.word_data_response(request, entry)
 
-        return JsonResponse({
-            'word': word,
-            'translations': translation_model.translation['translations'],
-            'google': word_model.google,
-            'collins': word_model.collins,
-        })
 
-    def create_translation(self, word: str, lang_code: str, google_data: GoogleData):
+class GetWordsDataView(LoginRequiredMixin, WordDataMixin, View):
+    """Resolves a list of words in one request (learners paste whole vocabulary lists).
+    Expects JSON like {"words": ["one", "two"]} or {"text": "One, two."} (split into words here)
+    and returns a result for every unique word in the same order"""
+
+    login_url = reverse_lazy('accounts:login')
+    max_words = 100
+    max_word_length = Word._meta.get_field('name').max_length
+
+    def post(self, request: HttpRequest):
         try:
-            word_model = Word.objects.get(name=word)
-        except Word.DoesNotExist:
-            word_model = self.create_word(word, google_data)
-
-        translation_model = Translation(word=word_model)
-        translation_model.language = Language.get_by_code(lang_code)
-        translation_model.translation = {
-            'main_translation': google_data.main_translation,
-            'translations': google_data.translations,
-        }
-        translation_model.save()
-        return translation_model
+            body = json.loads(request.body)
+            words = tokenize(body['text']) if 'text' in body else body['words']
+            if not isinstance(words, list):
+                raise TypeError('words must be a list')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return JsonResponse({'errors': ['Expected a JSON object with a list of words or a text']}, status=400)
 
-    def create_word(self, word: str, google_data: GoogleData) -> Word:
-        word_model = Word(name=word)
+        # Preserve the order, but get rid of duplicates and blanks
+        words = list(dict.fromkeys(w.strip().lower() for w in words if isinstance(w, str) and w.strip()))
+        if len(words) > self.max_words:
+            return JsonResponse({'errors': [f'Too many words. The limit is {self.max_words}']}, status=400)
 
-        collins_data = CollinsData.get(word)
+        learner: Learner = request.user
+        lang_code = learner.settings.language_code
 
-        if collins_data is not None:
-            word_model.collins = {
-                "audio_url": collins_data.audio_url,
-                "frequency": collins_data.frequency,
-                "transcription": collins_data.transcription,
-                "definitions": collins_data.definitions,
-            }
+        errors = {w: 'The word is too long' for w in words if len(w) > self.max_word_length}
+        valid_words = [w for w in words if w not in errors]
 
-        word_model.google = {
-            "transcription": google_data.transcription,
-            "examples": google_data.examples,
-            "definitions": google_data.definitions,
-        }
+        entries = word_data_cache.get_many(valid_words, lang_code)
+        not_found = word_not_found_cache.find_many([w for w in valid_words if w not in entries], lang_code)
+        errors.update((w, self.word_not_found_error) for w in not_found)
+        uncached = [w for w in valid_words if w not in entries and w not in not_found]
 
-        word_model.save()
-        return word_model
+        translations = {t.word.name: t for t in Translation.objects
+                        .filter(word__name__in=uncached, language=language_registry.get(lang_code))
+                        .select_related('word')}
+
+        misses = [w for w in uncached if w not in translations]
+        if misses:
+            fetched, failed = self.fetch_translations(misses, lang_code)
+            translations.update(fetched)
+            errors.update((w, self.provider_error if w in failed else self.word_not_found_error)
+                          for w in misses if w not in fetched)
+
+        entries.update((w, self.cache_word_data(w, lang_code, t)) for w, t in translations.items())
+        for w, entry in entries.items():
+            self.schedule_refresh(w, lang_code, entry)
+
+        request_recorder.record(learner.id, [entries[w]['word_id'] for w in words if w in entries])
+
+        # Cached bodies are joined as they are instead of being decoded and encoded again
+        results = [entries[w]['bodies']['identity'] if w in entries
+                   else json.dumps({'word': w, 'errors': [errors[w]]}).encode('utf-8') for w in words]
+        return HttpResponse(b'{"results": [' + b', '.join(results) + b']}', content_type='application/json')
+
+
+class SuggestionsView(LoginRequiredMixin, View):
+    """Typeahead: translated words starting with the 'prefix' parameter, {"words": ["word", "wording"]}.
+    They are already translated to the learner's language, so their lookups are answered without the providers"""
+
+    login_url = reverse_lazy('accounts:login')
+
+    def get(self, request: HttpRequest):
+        prefix = request.GET.get('prefix', '').strip().lower()
+        config = settings.WORD_INDEX
+        words = []
+        if len(prefix) >= config['MIN_PREFIX']:
+            language = language_registry.get(request.user.settings.language_code)
+            words = word_index.suggest(language.id, prefix, config['LIMIT'])
+        response = JsonResponse({'words': words})
+        response['Cache-Control'] = SUGGESTIONS_CACHE_CONTROL
+        return response
+
+
+class AudioView(View):
+    """Pronunciation files of audio_cache.py. Anki downloads them without the learner's session, so they are public.
+    Players request parts of the file, so single byte ranges are supported"""
+
+    def get(self, request: HttpRequest, token: str):
+        source_url = audio_cache.source_url(token)
+        if source_url is None:
+            raise Http404
+        digest = audio_cache.fetch(source_url)
+        if digest is None:
+            # Not stored and can't be downloaded now, the client can try the source
+            return HttpResponseRedirect(source_url)
+
+        etag = f'"{digest}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.file_response(request, audio_cache.path(digest), etag,
+                                          mimetypes.guess_type(source_url)[0] or 'audio/mpeg')
+        response['ETag'] = etag
+        response['Cache-Control'] = AUDIO_CACHE_CONTROL
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    @staticmethod
+    def file_response(request: HttpRequest, path, etag: str, content_type: str) -> HttpResponse:
+        size = path.stat().st_size
+        range_header = request.headers.get('Range', '')
+        # A range of another version of the file can't be sent
+        if request.headers.get('If-Range', etag) != etag:
+            range_header = ''
+        try:
+            requested = byte_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if requested is None:
+            return FileResponse(open(path, 'rb'), content_type=content_type)
+        first, last = requested
+        with open(path, 'rb') as audio_file:
+            audio_file.seek(first)
+            response = HttpResponse(audio_file.read(last - first + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        return response
+
+
+class MetricsView(View):
+    """Metrics of all the workers in the Prometheus text format (see metrics.py)"""
+
+    def get(self, request: HttpRequest):
+        if not self.is_allowed(request):
+            return HttpResponse(status=403)
+        return HttpResponse(metrics.registry.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    @staticmethod
+    def is_allowed(request: HttpRequest) -> bool:
+        token = settings.METRICS['TOKEN']
+        if token:
+            # Scrapers can't log in, they send the token
+            return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        return request.user.is_staff
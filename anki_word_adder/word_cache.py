@@ -0,0 +1,256 @@
+"""Two-tier cache of word data that is sent to the learner.
+
+The first tier is a small LRU in the memory of every process (no queries at all for the most popular words),
+the second one is the shared Django cache. Both are keyed by (word, language code).
+Entries are invalidated when the underlying Word or Translation rows change (see accounts/signals.py).
+Other processes can't be notified about that, so their in-memory entries live until LOCAL_TTL expires.
+Words that the providers don't know are remembered in the same way by NotFoundCache.
+
+Word data is cached as ready-to-send response bodies: JSON encoding and compression are most of the CPU
+spent on a hit, so they are done once, when the entry is made.
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import brotli
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from anki_word_adder import metrics
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+# Bump when the entries or the word data in them change, so old entries and browser copies aren't used
+ENTRY_VERSION = 1
+
+
+def encode_body(data: Dict[str, Any]) -> Dict[str, bytes]:
+    """JSON response body in every content encoding ('identity', 'gzip' and 'br')"""
+    body = json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+    return {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+        'br': brotli.compress(body, quality=BROTLI_QUALITY),
+    }
+
+
+class LocalLRU:
+    """Thread-safe LRU with size and time-to-live bounds"""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_word(self, word: str) -> None:
+        """Delete entries of the word for every language"""
+        with self._lock:
+            for key in [k for k in self._data if k[0] == word]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class WordDataCache:
+    """Entries are dictionaries with 'word_id' (needed to record a Request),
+    'bodies' (the response, see 'encode_body') and 'refresh_at'"""
+
+    def __init__(self, local_size: int, local_ttl: float, shared_ttl: float) -> None:
+        self.local = LocalLRU(local_size, local_ttl)
+        self.shared_ttl = shared_ttl
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, word: str, lang_code: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([word], lang_code).get(word)
+
+    def get_many(self, words: Iterable[str], lang_code: str) -> Dict[str, Dict[str, Any]]:
+        entries = {}
+        shared_keys = {}
+        for word in words:
+            entry = self.local.get((word, lang_code))
+            if entry is None:
+                shared_keys[self._shared_key(word, lang_code)] = word
+            else:
+                entries[word] = entry
+        self.local_hits += len(entries)
+
+        if shared_keys:
+            found = cache.get_many(shared_keys)
+            for shared_key, entry in found.items():
+                word = shared_keys[shared_key]
+                self.local.set((word, lang_code), entry)
+                entries[word] = entry
+            self.shared_hits += len(found)
+            self.misses += len(shared_keys) - len(found)
+        return entries
+
+    def set(self, word: str, lang_code: str, word_id: int, data: Dict[str, Any],
+            refresh_at: Optional[float] = None, etag: Optional[str] = None,
+            last_modified: Optional[float] = None) -> Dict[str, Any]:
+        """'refresh_at' is Unix time when the data has to be downloaded again (see word_refresh.py).
+        'etag' and 'last_modified' (Unix time) validate the responses made of the entry"""
+        entry = {'word_id': word_id, 'bodies': encode_body(data)}
+        if refresh_at is not None:
+            entry['refresh_at'] = refresh_at
+        if etag is not None:
+            entry['etag'] = etag
+            entry['last_modified'] = last_modified
+        self.local.set((word, lang_code), entry)
+        cache.set(self._shared_key(word, lang_code), entry, self.shared_ttl)
+        return entry
+
+    def invalidate(self, word: str, lang_codes: Iterable[str]) -> None:
+        """Remove entries of the word for the given languages (local entries are removed for every language)"""
+        self.local.delete_word(word)
+        cache.delete_many([self._shared_key(word, lang_code) for lang_code in lang_codes])
+
+    def clear(self) -> None:
+        """Only the local tier, the shared one may contain entries of other caches"""
+        self.local.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'evictions': self.local.evictions,
+            'local_size': len(self.local),
+        }
+
+    @staticmethod
+    def _shared_key(word: str, lang_code: str) -> str:
+        return f'word-data:v{ENTRY_VERSION}:{lang_code}:{_digest(word)}'
+
+
+class NotFoundCache:
+    """Words the providers don't know (typos, nonsense), so repeated lookups don't call them again.
+
+    Shared keys contain a generation number. 'purge' increments it, so every entry is dropped at once
+    without scanning the cache. Other processes read the generation once per LOCAL_TTL,
+    so they notice the purge at the same time their in-memory entries expire.
+    """
+
+    GENERATION_KEY = 'word-not-found:generation'
+
+    def __init__(self, local_size: int, local_ttl: float, shared_ttl: float) -> None:
+        self.local = LocalLRU(local_size, local_ttl)
+        self.shared_ttl = shared_ttl
+        self.hits = 0
+        self.misses = 0
+        self._generation = None
+        self._generation_expires_at = 0.0
+
+    def contains(self, word: str, lang_code: str) -> bool:
+        return bool(self.find_many([word], lang_code))
+
+    def find_many(self, words: Iterable[str], lang_code: str) -> Set[str]:
+        """Returns the words that are known to be missing"""
+        words = list(words)
+        found = {word for word in words if self.local.get((word, lang_code))}
+        shared_keys = {self._shared_key(word, lang_code): word for word in words if word not in found}
+        if shared_keys:
+            for shared_key in cache.get_many(shared_keys):
+                word = shared_keys[shared_key]
+                self.local.set((word, lang_code), True)
+                found.add(word)
+        self.hits += len(found)
+        self.misses += len(words) - len(found)
+        return found
+
+    def add_many(self, words: List[str], lang_code: str) -> None:
+        for word in words:
+            self.local.set((word, lang_code), True)
+        cache.set_many({self._shared_key(word, lang_code): True for word in words}, self.shared_ttl)
+
+    def delete(self, word: str, lang_codes: Iterable[str]) -> None:
+        """Forget the word for the given languages (local entries are removed for every language)"""
+        self.local.delete_word(word)
+        cache.delete_many([self._shared_key(word, lang_code) for lang_code in lang_codes])
+
+    def purge(self) -> int:
+        """Forget every word. Returns the new generation"""
+        cache.add(self.GENERATION_KEY, 0, None)
+        generation = cache.incr(self.GENERATION_KEY)
+        self.local.clear()
+        self._generation_expires_at = 0.0
+        return generation
+
+    def clear(self) -> None:
+        """Only the local tier, like WordDataCache.clear"""
+        self.local.clear()
+        self._generation_expires_at = 0.0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'local_size': len(self.local),
+        }
+
+    def _shared_key(self, word: str, lang_code: str) -> str:
+        return f'word-not-found:{self._current_generation()}:{lang_code}:{_digest(word)}'
+
+    def _current_generation(self) -> int:
+        now = time.monotonic()
+        if now >= self._generation_expires_at:
+            self._generation = cache.get(self.GENERATION_KEY, 0)
+            self._generation_expires_at = now + self.local.ttl
+        return self._generation
+
+
+def _digest(word: str) -> str:
+    # Words may contain anything the learner typed, so hash them to be valid for every cache backend
+    return hashlib.sha1(word.encode('utf-8')).hexdigest()
+
+
+word_data_cache = WordDataCache(local_size=settings.WORD_DATA_CACHE['LOCAL_SIZE'],
+                                local_ttl=settings.WORD_DATA_CACHE['LOCAL_TTL'],
+                                shared_ttl=settings.WORD_DATA_CACHE['SHARED_TTL'])
+
+word_not_found_cache = NotFoundCache(local_size=settings.WORD_DATA_CACHE['LOCAL_SIZE'],
+                                     local_ttl=settings.WORD_DATA_CACHE['LOCAL_TTL'],
+                                     shared_ttl=settings.WORD_DATA_CACHE['NOT_FOUND_TTL'])
+
+metrics.registry.add_stats('awa_word_data_cache', 'Word data cache', word_data_cache.stats,
+                           counters=('local_hits', 'shared_hits', 'misses', 'evictions'))
+metrics.registry.add_stats('awa_word_not_found_cache', "Cache of the words the providers don't know",
+                           word_not_found_cache.stats, counters=('hits', 'misses'))
@@ -0,0 +1,141 @@
+"""Sorted in-memory index of the translated words for typeahead suggestions.
+
+Every process keeps, for every language, a sorted list of the names of the words translated to it,
+so a prefix is two binary searches and suggested words are the ones whose data is already stored
+(their lookups don't call the providers). The lists are loaded with the first suggestion and then
+kept up to date incrementally: translations made by this process are added by a signal (see accounts/signals.py),
+the ones made by other workers are read with a query for the rows newer than the last seen id,
+at most once per REFRESH_INTERVAL. Ids are taken before the rows are committed, so a row with a lower id
+can become visible after a higher one: the query starts RESCAN_IDS ids below the last seen one.
+Deleted translations are only removed from the process that deleted them,
+others suggest the word until they restart, and its lookup fetches it again.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Set, Tuple
+
+from django.conf import settings
+
+from anki_word_adder import metrics
+from anki_word_adder.apps.accounts.models import Translation
+
+# Every name in the index starts with the prefix and is smaller than prefix + this
+MAX_CHAR = chr(0x10ffff)
+LOAD_BATCH_SIZE = 10000
+# Translations committed later than the ones with higher ids are found if they are at most this many ids behind
+RESCAN_IDS = 1000
+
+
+class WordIndex:
+    def __init__(self) -> None:
+        self.queries = 0
+        self.refreshes = 0
+        self._words: Dict[int, List[str]] = {}
+        self._last_id = None  # The newest translation in the index, None if it isn't loaded
+        self._checked_at = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def suggest(self, language_id: int, prefix: str, limit: int) -> List[str]:
+        """Translated words starting with the prefix, in alphabetical order"""
+        self._refresh()
+        self.queries += 1
+        with self._lock:
+            words = self._words.get(language_id, [])
+            start = bisect.bisect_left(words, prefix)
+            end = bisect.bisect_left(words, prefix + MAX_CHAR, start, min(start + limit, len(words)))
+            return words[start:end]
+
+    def add(self, language_id: int, word: str) -> None:
+        with self._lock:
+            if self._last_id is not None:
+                self._insert(language_id, word)
+
+    def remove(self, language_id: int, word: str) -> None:
+        with self._lock:
+            words = self._words.get(language_id, [])
+            i = bisect.bisect_left(words, word)
+            if i < len(words) and words[i] == word:
+                del words[i]
+
+    def clear(self) -> None:
+        """The index is loaded again with the next suggestion"""
+        with self._lock:
+            self._words = {}
+            self._last_id = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queries': self.queries,
+            'refreshes': self.refreshes,
+            'words': sum(len(words) for words in self._words.values()),
+        }
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if (self._last_id is not None and self._pid == os.getpid()
+                and now - self._checked_at < settings.WORD_INDEX['REFRESH_INTERVAL']):
+            return
+        # Only one thread queries, the others use the index as it is. Unless it isn't loaded yet
+        if not self._refresh_lock.acquire(blocking=self._last_id is None):
+            return
+        try:
+            self._checked_at = now
+            self._pid = os.getpid()
+            if self._last_id is None:
+                self._load()
+            else:
+                self._load_new()
+            self.refreshes += 1
+        finally:
+            self._refresh_lock.release()
+
+    def _load(self) -> None:
+        """The whole index, sorted once: inserting the rows one by one is quadratic"""
+        names: Dict[int, Set[str]] = {}
+        last_id = 0
+        for rows in self._batches(last_id):
+            for _, language_id, word in rows:
+                names.setdefault(language_id, set()).add(word)
+            last_id = rows[-1][0]
+        words = {language_id: sorted(language_names) for language_id, language_names in names.items()}
+        with self._lock:
+            # Signals of the words saved during the load had nowhere to go, the next refresh picks them up
+            self._words = words
+            self._last_id = last_id
+
+    def _load_new(self) -> None:
+        """Translations made by other workers since the last refresh, there are few of them.
+        The rescanned ones are already in the index, inserting them again changes nothing"""
+        for rows in self._batches(max(self._last_id - RESCAN_IDS, 0)):
+            with self._lock:
+                for _, language_id, word in rows:
+                    self._insert(language_id, word)
+                self._last_id = max(self._last_id, rows[-1][0])
+
+    @staticmethod
+    def _batches(last_id: int) -> Iterator[List[Tuple[int, int, str]]]:
+        """(id, language id, word) of the translations newer than 'last_id', in batches ordered by id"""
+        while True:
+            rows = list(Translation.objects.filter(id__gt=last_id).order_by('id')
+                        .values_list('id', 'language_id', 'word__name')[:LOAD_BATCH_SIZE])
+            if rows:
+                yield rows
+                last_id = rows[-1][0]
+            if len(rows) < LOAD_BATCH_SIZE:
+                return
+
+    def _insert(self, language_id: int, word: str) -> None:
+        """Adds a single word (signals and the refreshes). Must be called with the lock held"""
+        words = self._words.setdefault(language_id, [])
+        i = bisect.bisect_left(words, word)
+        if i == len(words) or words[i] != word:
+            words.insert(i, word)
+
+
+word_index = WordIndex()
+metrics.registry.add_stats('awa_word_index', 'Typeahead suggestions and index refreshes', word_index.stats,
+                           counters=('queries', 'refreshes'))
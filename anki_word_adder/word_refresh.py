@@ -0,0 +1,118 @@
+"""Stale-while-revalidate refresh of saved word data.
+
+Word and Translation rows remember when they were fetched and which parser version produced them.
+Lookups always serve the saved data, and if it's older than WORD_REFRESH['MAX_AGE'] or comes from
+an older parser, the word is downloaded again in the background. Every process runs no more than
+MAX_CONCURRENT refreshes and drops the rest (the next lookup schedules them again),
+so refreshes never queue up behind each other or take threads from the request path.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from anki_word_adder import metrics
+from anki_word_adder.word_cache import LocalLRU
+
+logger = logging.getLogger(__name__)
+
+# Version of the data produced by GoogleData._parse and CollinsData._parse.
+# Increment it when their output changes, so the saved words are refreshed
+PARSER_VERSION = 1
+
+# A word is refreshed by one worker at a time and retried no sooner than this (seconds)
+LEASE_TIMEOUT = 10 * 60
+
+
+def refresh_at(*rows) -> float:
+    """Unix time when the rows (Word, Translation) have to be refreshed (0 - right away)"""
+    times = []
+    for row in rows:
+        if row.fetched_at is None or row.parser_version < PARSER_VERSION:
+            return 0.0
+        times.append(row.fetched_at.timestamp() + settings.WORD_REFRESH['MAX_AGE'])
+    return min(times)
+
+
+def is_stale(entry) -> bool:
+    """Entries cached before refresh times were added are never stale, they expire soon anyway"""
+    return entry.get('refresh_at', math.inf) <= time.time()
+
+
+class WordRefresher:
+    def __init__(self) -> None:
+        self.scheduled = 0
+        self.dropped = 0  # all the refresh slots were busy
+        self.failed = 0
+        self._in_flight = set()
+        # Words scheduled recently, so stale cache hits don't schedule them again and again
+        self._recent = LocalLRU(max_size=10000, ttl=LEASE_TIMEOUT)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    def schedule(self, word: str, lang_code: str, refresh: Callable[[str, str], None]) -> bool:
+        """Run 'refresh(word, lang_code)' in the background if there's a free slot.
+        Doesn't do any IO, so it's safe to call from the async views"""
+        max_concurrent = settings.WORD_REFRESH['MAX_CONCURRENT']
+        key = (word, lang_code)
+        if max_concurrent <= 0:
+            return False
+        with self._lock:
+            executor = self._get_executor(max_concurrent)
+            if key in self._in_flight or self._recent.get(key):
+                return False
+            if len(self._in_flight) >= max_concurrent:
+                self.dropped += 1
+                return False
+            self._in_flight.add(key)
+            self._recent.set(key, True)
+            self.scheduled += 1
+        executor.submit(self._run, word, lang_code, refresh)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'scheduled': self.scheduled,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'in_flight': len(self._in_flight),
+        }
+
+    def _run(self, word: str, lang_code: str, refresh: Callable[[str, str], None]) -> None:
+        try:
+            # Other workers see the same stale entry
+            digest = hashlib.sha1(word.encode('utf-8')).hexdigest()
+            if cache.add(f'word-refresh:{lang_code}:{digest}', True, LEASE_TIMEOUT):
+                refresh(word, lang_code)
+        except Exception:
+            logger.exception('Unable to refresh "%s" (%s)', word, lang_code)
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._in_flight.discard((word, lang_code))
+            # Every thread has its own connection
+            connection.close()
+
+    def _get_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        """Must be called with the lock held"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            # A forked worker gets its own threads, like the provider pool
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='word-refresh')
+            self._executor_pid = os.getpid()
+            self._in_flight.clear()
+        return self._executor
+
+
+word_refresher = WordRefresher()
+metrics.registry.add_stats('awa_word_refresh', 'Background refreshes of outdated words', word_refresher.stats,
+                           counters=('scheduled', 'dropped', 'failed'))
@@ -0,0 +1,137 @@
+"""Per-host circuit breakers shared by all workers through the 'state' Django cache.
+
+When a host keeps failing or timing out, every call to it still waits the whole timeout before it fails.
+After CIRCUIT_FAILURE_THRESHOLD failed or slow calls within CIRCUIT_WINDOW seconds the circuit opens:
+for CIRCUIT_OPEN_SECONDS 'allow' refuses the calls, so callers return degraded results right away
+(an optional provider is left out, ipregistry falls back to the default language).
+Then the circuit is half-open: a single trial call is let through for all the workers,
+its success closes the circuit and its failure opens it again.
+
+The cache may be the database, so like CollinsQuota the breakers are only used from request
+and background threads, never from the provider pool. The state is read from the cache
+at most once per CIRCUIT_CHECK_INTERVAL, so other workers notice an opened circuit a bit later.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+from anki_word_adder import metrics
+
+logger = logging.getLogger(__name__)
+# Not the default cache: its culling would close open circuits (see CACHES)
+cache = ConnectionProxy(caches, 'state')
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_WINDOW = int(os.environ.get('CIRCUIT_WINDOW', 30))  # seconds
+CIRCUIT_OPEN_SECONDS = int(os.environ.get('CIRCUIT_OPEN_SECONDS', 30))
+# Successful calls slower than this count as failures
+CIRCUIT_SLOW_CALL = float(os.environ.get('CIRCUIT_SLOW_CALL', 2))  # seconds
+CIRCUIT_CHECK_INTERVAL = float(os.environ.get('CIRCUIT_CHECK_INTERVAL', 1))  # seconds
+
+
+class CircuitBreaker:
+    def __init__(self, host: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, window: int = CIRCUIT_WINDOW,
+                 open_seconds: int = CIRCUIT_OPEN_SECONDS, slow_call: float = CIRCUIT_SLOW_CALL,
+                 check_interval: float = CIRCUIT_CHECK_INTERVAL) -> None:
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.open_seconds = open_seconds
+        self.slow_call = slow_call
+        self.check_interval = check_interval
+        self._key = f'circuit:{host}'
+        # Local copy of the shared state: the time the circuit is open until, None if it's closed
+        self._open_until = None
+        self._checked_at = None
+
+    def allow(self) -> bool:
+        """Whether a call to the host can be made now. Every allowed call must be followed by 'record'"""
+        open_until = self._state()
+        if open_until is None:
+            return True
+        if time.time() >= open_until and cache.add(f'{self._key}:trial', True, self.open_seconds):
+            return True
+        _stats['rejected'] += 1
+        return False
+
+    def record(self, failed: bool, seconds: float = 0) -> None:
+        """Outcome of an allowed call. Calls slower than 'slow_call' count as failed"""
+        failed = failed or seconds > self.slow_call
+        open_until = self._state()
+        if open_until is None:
+            if failed and self._count_failure() >= self.failure_threshold:
+                self._open()
+        elif time.time() >= open_until:
+            # The trial call of a half-open circuit
+            if failed:
+                self._open()
+            else:
+                self._close()
+        # Calls that were made before the circuit opened don't change it
+
+    def release(self) -> None:
+        """An allowed call ended without an outcome (e.g. it was cancelled). If it was the trial call
+        of a half-open circuit, the next call is let through instead of waiting for the trial to expire"""
+        open_until = self._state()
+        if open_until is not None and time.time() >= open_until:
+            cache.delete(f'{self._key}:trial')
+
+    def _state(self) -> Optional[float]:
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            self._open_until = cache.get(self._key)
+            self._checked_at = now
+        return self._open_until
+
+    def _count_failure(self) -> int:
+        key = f'{self._key}:failures:{int(time.time() // self.window)}'
+        cache.add(key, 0, 2 * self.window)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Expired between 'add' and 'incr'
+            cache.add(key, 1, 2 * self.window)
+            return 1
+
+    def _open(self) -> None:
+        open_until = time.time() + self.open_seconds
+        # Without calls the circuit closes by itself, if the host still fails it's opened again
+        cache.set(self._key, open_until, 2 * self.open_seconds)
+        cache.delete(f'{self._key}:trial')
+        self._open_until = open_until
+        self._checked_at = time.monotonic()
+        _stats['opened'] += 1
+        logger.warning('Circuit of %s is open for %d seconds, its calls are skipped', self.host, self.open_seconds)
+
+    def _close(self) -> None:
+        cache.delete_many([self._key, f'{self._key}:trial'])
+        self._open_until = None
+        self._checked_at = time.monotonic()
+        logger.info('Circuit of %s is closed', self.host)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_lock = threading.Lock()
+# Of this process, exported by the metrics
+_stats = {'rejected': 0, 'opened': 0}
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    with _lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def stats() -> Dict[str, int]:
+    return dict(_stats)
+
+
+metrics.registry.add_stats('awa_circuit_breaker', 'Calls refused by open circuits and openings', stats,
+                           counters=('rejected', 'opened'))
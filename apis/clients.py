@@ -0,0 +1,100 @@
+"""Pooled keep-alive HTTP clients for all outbound provider calls.
+
+Opening a new TCP+TLS connection for every call is a large part of the lookup latency,
+so every process keeps one client per library and reuses its connections.
+Clients are created lazily and remembered with the process id: gunicorn forks workers,
+and a forked worker must not share sockets with its parent.
+"""
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+import requests
+from googletrans import Translator, urls as googletrans_urls
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 2))  # seconds
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 3))  # seconds
+# Connections above this number are still opened, but they are closed after use instead of being kept alive
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get('HTTP_MAX_CONNECTIONS_PER_HOST', 10))
+MAX_HOSTS = 10  # number of hosts with pooled connections (collins, ipregistry, ...)
+# Can point to a local stand-in (see benchmarks/fake_providers.py)
+GOOGLE_TRANSLATE_URL = os.environ.get('GOOGLE_TRANSLATE_URL', googletrans_urls.BASE)
+
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+_clients = {}
+_clients_pid = None
+_async_clients = weakref.WeakKeyDictionary()  # async client can only be used in the event loop it was created in
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Session for JSON APIs (Collins, ipregistry)"""
+    return _get_client('session', _create_session)
+
+
+def get_translator() -> Translator:
+    """Google translator. It has its own httpx client, so it's pooled separately"""
+    return _get_client('translator', _create_translator)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Client for JSON APIs for the async views. Must be called from a running event loop"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _check_pid()
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = httpx.AsyncClient(
+                timeout=httpx.Timeout(READ_TIMEOUT, connect_timeout=CONNECT_TIMEOUT),
+                pool_limits=httpx.PoolLimits(max_keepalive=MAX_CONNECTIONS_PER_HOST),
+            )
+        return client
+
+
+def _get_client(name: str, create):
+    with _lock:
+        _check_pid()
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = create()
+        return client
+
+
+def _check_pid():
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        # Forked worker, the parent's clients (and their sockets) must not be used
+        _clients.clear()
+        _async_clients.clear()
+        _clients_pid = os.getpid()
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_HOSTS, pool_maxsize=MAX_CONNECTIONS_PER_HOST)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _create_translator() -> Translator:
+    translator = Translator()
+    # Translator doesn't accept connection limits, so its client is replaced with a configured one
+    client = httpx.Client(
+        http2=True,
+        headers=translator.client.headers,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect_timeout=CONNECT_TIMEOUT),
+        pool_limits=httpx.PoolLimits(max_keepalive=MAX_CONNECTIONS_PER_HOST,
+                                     max_connections=MAX_CONNECTIONS_PER_HOST),
+    )
+    translator.client.close()
+    translator.client = client
+    translator.token_acquirer.client = client
+    if GOOGLE_TRANSLATE_URL != googletrans_urls.BASE:
+        # googletrans only builds https URLs from a host, so its URL template is replaced
+        googletrans_urls.TRANSLATE_RPC = f'{GOOGLE_TRANSLATE_URL}/_/TranslateWebserverUi/data/batchexecute'
+    return translator
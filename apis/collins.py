@@ -1,13 +1,108 @@
 # Downloads data from collins dictionary API
 from __future__ import annotations
+import logging
 import os
-from urllib.error import HTTPError
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
 
 import bs4
+import httpx
+import requests
+from django.conf import settings
+from django.db.models import F
 
-from .utils import get_json_data
+from anki_word_adder import metrics
+
+from .utils import aget_json_data, get_json_data, is_not_found
+
+logger = logging.getLogger(__name__)
 
 collins_key = os.environ.get('COLLINS_KEY')
+# Can point to a local stand-in (see benchmarks/fake_providers.py)
+COLLINS_API_URL = os.environ.get('COLLINS_API_URL', 'https://api.collinsdictionary.com')
+# Budget of the API calls shared by all workers, 0 means no limit
+COLLINS_DAILY_QUOTA = int(os.environ.get('COLLINS_DAILY_QUOTA', 0))  # calls per UTC day
+COLLINS_REQUESTS_PER_MINUTE = int(os.environ.get('COLLINS_REQUESTS_PER_MINUTE', 0))
+
+
+class CollinsQuota:
+    """Collins calls counted in a table (CollinsUsage) shared by all workers, per UTC day and per minute.
+
+    Callers take a call from the budget with 'acquire' before calling 'CollinsData.get'.
+    When the budget is spent, calls are skipped instead of failing at the API,
+    so the words can be refilled later (see 'refill_collins' command).
+    A call is taken with a single conditional UPDATE, so concurrent workers never go over the budget.
+    It's a query, so don't acquire from the provider pool threads.
+    """
+
+    def __init__(self, daily: int = COLLINS_DAILY_QUOTA, per_minute: int = COLLINS_REQUESTS_PER_MINUTE) -> None:
+        self.daily = daily
+        self.per_minute = per_minute
+
+    def acquire(self) -> bool:
+        """Take one call from the budget. Returns False if there's no budget left"""
+        now = datetime.now(timezone.utc)
+        if self.per_minute and not self._take(f'minute:{now:%Y%m%d%H%M}', now, self.per_minute):
+            self._take(self._skipped_key(now), now)
+            return False
+        if self.daily and not self._take(self._day_key(now), now, self.daily):
+            if self._create(f'warned:{now:%Y%m%d}', now):
+                logger.warning('Collins daily quota (%d calls) is spent, new words are saved without Collins data',
+                               self.daily)
+            self._take(self._skipped_key(now), now)
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        """Usage of today's budget. 'remaining_today' is None if there's no daily limit"""
+        # Imported here, the parsers are used without Django (see benchmarks/parsers.py)
+        from anki_word_adder.apps.accounts.models import CollinsUsage
+
+        now = datetime.now(timezone.utc)
+        calls = dict(CollinsUsage.objects.filter(key__in=[self._day_key(now), self._skipped_key(now)])
+                     .values_list('key', 'calls'))
+        used = calls.get(self._day_key(now), 0)
+        return {
+            'daily_quota': self.daily,
+            'used_today': used,
+            'remaining_today': max(self.daily - used, 0) if self.daily else None,
+            'skipped_today': calls.get(self._skipped_key(now), 0),
+        }
+
+    @staticmethod
+    def _day_key(now: datetime) -> str:
+        return f'day:{now:%Y%m%d}'
+
+    @staticmethod
+    def _skipped_key(now: datetime) -> str:
+        return f'skipped:{now:%Y%m%d}'
+
+    @staticmethod
+    def _take(key: str, now: datetime, limit: Optional[int] = None) -> bool:
+        """Counts a call unless the period already has 'limit' calls"""
+        from anki_word_adder.apps.accounts.models import CollinsUsage
+
+        CollinsQuota._create(key, now)
+        rows = CollinsUsage.objects.filter(key=key)
+        if limit is not None:
+            rows = rows.filter(calls__lt=limit)
+        return rows.update(calls=F('calls') + 1) == 1
+
+    @staticmethod
+    def _create(key: str, now: datetime) -> bool:
+        """Adds the period's row if there's none yet, then the rows of the previous days are deleted"""
+        from anki_word_adder.apps.accounts.models import CollinsUsage
+
+        _, created = CollinsUsage.objects.get_or_create(key=key, defaults={'day': now.date()})
+        if created:
+            CollinsUsage.objects.filter(day__lt=now.date()).delete()
+        return created
+
+
+collins_quota = CollinsQuota()
+# The usage is counted in the database, it's the same in every worker
+metrics.registry.add_stats('awa_collins_quota', 'Collins calls today', collins_quota.stats, shared=True)
 
 
 class CollinsData:
@@ -18,25 +113,64 @@ class CollinsData:
         self.definitions = definitions
 
     @staticmethod
+    @metrics.timed_provider('collins')
     def get(word) -> CollinsData:
         try:
             html = CollinsData._download_american_learner(word)
             return CollinsData._parse(html['entryContent'])
-        except (HTTPError, KeyError):
+        except KeyError:
+            return None
+        except requests.HTTPError as e:
+            if is_not_found(e):
+                return None
+            raise
+
+    @staticmethod
+    @metrics.timed_provider('collins')
+    async def aget(word) -> CollinsData:
+        """Same as 'get', but doesn't block the event loop while waiting for the API"""
+        try:
+            url, headers = CollinsData._american_learner_request(word)
+            html = await aget_json_data(url, headers=headers)
+            return CollinsData._parse(html['entryContent'])
+        except KeyError:
             return None
+        except httpx.HTTPError as e:
+            if is_not_found(e):
+                return None
+            raise
 
     @staticmethod
     def _download_american_learner(word):
+        url, headers = CollinsData._american_learner_request(word)
+        return get_json_data(url, headers=headers)
+
+    @staticmethod
+    def _american_learner_request(word):
         # There are other dictionaries, like 'english', but 'american-learner' usually describes words better
-        url = f'https://api.collinsdictionary.com/api/v1/dictionaries/american-learner/search/first/?q={word}&format=html'
+        url = f'{COLLINS_API_URL}/api/v1/dictionaries/american-learner/search/first/?q={word}&format=html'
         headers = {
             'Accept': 'application/json',
             'accessKey': collins_key,
         }
-        return get_json_data(url, headers=headers)
+        return url, headers
 
     @staticmethod
     def _parse(html_markup) -> CollinsData:
+        if settings.COLLINS_PARSER == 'bs4':
+            return CollinsData._parse_bs4(html_markup)
+        return CollinsData._parse_stream(html_markup)
+
+    @staticmethod
+    def _parse_stream(html_markup) -> CollinsData:
+        """Same as '_parse_bs4', but doesn't build a tree, so it's several times faster"""
+        parser = _EntryParser()
+        parser.feed(html_markup)
+        parser.close()
+        return parser.result()
+
+    @staticmethod
+    def _parse_bs4(html_markup) -> CollinsData:
         soup = bs4.BeautifulSoup(html_markup, 'html.parser')
         # Top level div that contains all word information
         entry = soup.div.div
@@ -86,6 +220,255 @@ class CollinsData:
         return CollinsData(frequency, audio_url, transcription, definitions)
 
 
+class _Capture:
+    """Text of an element, collected until the element is closed"""
+
+    def __init__(self) -> None:
+        self.parts = []
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+
+class _Homonym:
+    def __init__(self) -> None:
+        self.part_of_speech = None  # type: Optional[_Capture]
+        self.sense_depth = None  # stack depth of the first 'sense' div, while it's open
+        self.has_sense = False
+        self.definition = None  # type: Optional[_Capture]
+        self.examples = []  # type: List[_Capture]
+        self.tags = []  # type: List[Optional[_Capture]]
+        self.valid = True
+
+    def to_definition(self) -> Optional[dict]:
+        if not self.valid or not self.has_sense or self.part_of_speech is None or self.definition is None:
+            return None
+        return {
+            'part_of_speech': self.part_of_speech.text,
+            'definition': self.definition.text,
+            'examples': [example.text for example in self.examples],
+            'tags': [tag.text for tag in self.tags],
+        }
+
+
+class _Label:
+    """Tag label, e.g. '<span class="lbl"><span>[</span>US<span>]</span></span>'. Its text is the second child"""
+
+    def __init__(self, depth: int, homonym: _Homonym) -> None:
+        self.depth = depth
+        self.homonym = homonym
+        self.children = 0
+        self.last_child_is_text = False
+        self.text = None  # type: Optional[_Capture]
+
+
+class _EntryParser(HTMLParser):
+    """Collects the same data as 'CollinsData._parse_bs4' in one pass over the markup.
+
+    Only the elements that are needed are tracked: their text is collected while they are open.
+    Element nesting is kept in 'stack' like html.parser tree builder of bs4 does it:
+    void elements are never open, an end tag closes every element opened after its start tag.
+    """
+
+    VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                     'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.stack = []  # names of the open elements
+        self.closers = {}  # stack depth -> callbacks to run when the element at this depth is closed
+        self.captures = []  # open captures, every text goes to all of them
+
+        self.container_found = False
+        self.container_depth = None
+        self.entry_depth = None
+        self.entry_found = False
+        self.top_info_depth = None
+        self.top_info_found = False
+        self.frequency = None  # type: Optional[_Capture]
+        self.pron = None  # type: Optional[_Capture]
+        self.pron_depth = None
+        self.audio_depth = None
+        self.audio_parts = None  # (start, end) indexes of the audio text in the 'pron' parts
+        self.audio_found = False
+        self.audio_url = None
+        self.homonyms = []  # type: List[_Homonym]
+        self.homonym_depth = None
+        self.labels = []  # type: List[_Label]
+
+    def result(self) -> CollinsData:
+        if not self.top_info_found:
+            raise ValueError('Unexpected markup of Collins entry')
+
+        frequency = self.frequency.text.count('●') if self.frequency is not None else None
+
+        transcription = None
+        if self.pron is not None:
+            parts = self.pron.parts
+            if self.audio_url is not None and self.audio_parts is not None:
+                # Audio is removed, so there are no additional symbols in the transcription
+                start, end = self.audio_parts
+                parts = parts[:start] + parts[end:]
+            transcription = ''.join(parts)
+
+        definitions = []
+        for homonym in self.homonyms:
+            definition = homonym.to_definition()
+            if definition is not None:
+                definitions.append(definition)
+
+        return CollinsData(frequency, self.audio_url, transcription, definitions)
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self._count_label_child(void=tag in self.VOID_ELEMENTS)
+        if tag in self.VOID_ELEMENTS:
+            if tag == 'source' and self.audio_depth is not None and self.audio_url is None:
+                self.audio_url = dict(attrs).get('src') or ''
+            return
+
+        self.stack.append(tag)
+        depth = len(self.stack)
+        classes = (dict(attrs).get('class') or '').split()
+
+        if tag == 'div':
+            if not self.container_found:
+                self.container_found = True
+                self.container_depth = depth
+                self._on_close(depth, self._close_container)
+            elif self.container_depth is not None and not self.entry_found:
+                self.entry_found = True
+                self.entry_depth = depth
+                self._on_close(depth, self._close_entry)
+            elif self.entry_depth is not None:
+                self._start_entry_div(depth, classes)
+        elif tag == 'span' and self.entry_depth is not None:
+            self._start_entry_span(depth, classes)
+        elif tag == 'audio' and self.pron_depth is not None and not self.audio_found:
+            self.audio_found = True
+            self.audio_depth = depth
+            start = len(self.pron.parts)
+            self._on_close(depth, lambda: self._close_audio(start))
+
+    def handle_endtag(self, tag) -> None:
+        if tag not in self.stack:
+            return
+        while self.stack:
+            depth = len(self.stack)
+            closed = self.stack.pop()
+            for callback in self.closers.pop(depth, ()):
+                callback()
+            if closed == tag:
+                break
+        self._count_label_child(closed=True)
+
+    def handle_data(self, data) -> None:
+        self._count_label_child(text=data)
+        for capture in self.captures:
+            capture.parts.append(data)
+
+    def handle_comment(self, data) -> None:
+        # Comments aren't text, but bs4 counts them as children
+        self._count_label_child(void=True)
+
+    def _start_entry_div(self, depth: int, classes: List[str]) -> None:
+        if 'hom' in classes and self.homonym_depth is None:
+            self.homonyms.append(_Homonym())
+            self.homonym_depth = depth
+            self._on_close(depth, self._close_homonym)
+        elif 'sense' in classes and self.homonym_depth is not None:
+            homonym = self.homonyms[-1]
+            if not homonym.has_sense:
+                homonym.has_sense = True
+                homonym.sense_depth = depth
+                self._on_close(depth, lambda: setattr(homonym, 'sense_depth', None))
+
+    def _start_entry_span(self, depth: int, classes: List[str]) -> None:
+        if not self.top_info_found:
+            self.top_info_found = True
+            self.top_info_depth = depth
+            self._on_close(depth, lambda: setattr(self, 'top_info_depth', None))
+            return
+
+        if self.top_info_depth is not None:
+            if 'lbfreq' in classes and self.frequency is None:
+                self.frequency = self._capture(depth)
+            if 'pron' in classes and self.pron is None:
+                self.pron = self._capture(depth)
+                self.pron_depth = depth
+                self._on_close(depth, lambda: setattr(self, 'pron_depth', None))
+
+        if self.homonym_depth is not None:
+            homonym = self.homonyms[-1]
+            if 'gramGrp' in classes and homonym.part_of_speech is None:
+                homonym.part_of_speech = self._capture(depth)
+            if homonym.sense_depth is not None:
+                if 'def' in classes and homonym.definition is None:
+                    homonym.definition = self._capture(depth)
+                if 'quote' in classes:
+                    homonym.examples.append(self._capture(depth))
+                if 'lbl' in classes:
+                    label = _Label(depth, homonym)
+                    self.labels.append(label)
+                    self._on_close(depth, lambda: self._close_label(label))
+
+    def _count_label_child(self, text: Optional[str] = None, closed: bool = False, void: bool = False) -> None:
+        """Count direct children of the open labels, start collecting the text of the second one"""
+        if not self.labels:
+            return
+        label = self.labels[-1]
+        if len(self.stack) != label.depth:
+            return
+        if closed:
+            # An element child has just ended, the next text is a new child
+            label.last_child_is_text = False
+            return
+        if text is not None and label.last_child_is_text:
+            # bs4 joins adjacent texts into one child
+            if label.children == 2:
+                label.text.parts.append(text)
+            return
+        label.children += 1
+        label.last_child_is_text = text is not None
+        if label.children == 2:
+            label.text = _Capture()
+            if text is not None:
+                label.text.parts.append(text)
+            elif not void:
+                # The child element is being opened, its text is collected until it's closed
+                self.captures.append(label.text)
+                self._on_close(label.depth + 1, lambda: self.captures.remove(label.text))
+
+    def _capture(self, depth: int) -> _Capture:
+        capture = _Capture()
+        self.captures.append(capture)
+        self._on_close(depth, lambda: self.captures.remove(capture))
+        return capture
+
+    def _on_close(self, depth: int, callback) -> None:
+        self.closers.setdefault(depth, []).append(callback)
+
+    def _close_container(self) -> None:
+        self.container_depth = None
+
+    def _close_entry(self) -> None:
+        self.entry_depth = None
+
+    def _close_homonym(self) -> None:
+        self.homonym_depth = None
+
+    def _close_audio(self, start: int) -> None:
+        self.audio_depth = None
+        self.audio_parts = (start, len(self.pron.parts))
+
+    def _close_label(self, label: _Label) -> None:
+        self.labels.remove(label)
+        if label.text is None:
+            label.homonym.valid = False
+        else:
+            label.homonym.tags.append(label.text)
+
+
 class CollinsDataCached(CollinsData):
     """API calls are limited, so it's better to use cached html in tests"""
     data = {
@@ -3,12 +3,17 @@
 # This module's responsibility are the three sections below the main one:
 # 1) definitions 2) examples 3)translations
 from __future__ import annotations
+import asyncio
 import re
 from typing import List
 
-from googletrans import Translator
 from googletrans.models import Translated
 
+from anki_word_adder import metrics
+
+from .clients import get_translator
+from .utils import provider_executor, with_context
+
 
 b_tag_pattern = re.compile('<b>|</b>')
 
@@ -30,10 +35,18 @@ class GoogleData:
         self.translations = translations
 
     @staticmethod
+    @metrics.timed_provider('google')
     def get(word: str, destination_language: str) -> GoogleData:
-        data = Translator().translate(word, src='en', dest=destination_language)
+        data = get_translator().translate(word, src='en', dest=destination_language)
         return GoogleData._parse(data)
 
+    @staticmethod
+    async def aget(word: str, destination_language: str) -> GoogleData:
+        """Same as 'get', but doesn't block the event loop.
+        googletrans has no async API, so the call is made in the provider pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(provider_executor(), with_context(GoogleData.get), word, destination_language)
+
     @staticmethod
     def _parse(data: Translated):
         useful = data.extra_data['parsed']
@@ -0,0 +1,141 @@
+"""Hedged requests for idempotent lookups.
+
+A call to a host in settings.HEDGING['HOSTS'] that takes longer than the p95 latency of its recent calls
+is sent once more, and the first successful response wins. The tail latency of a host that sometimes
+stalls drops to about p95 plus a typical call, for the price of about 5% more calls.
+Collins calls are counted by the API, so hosts are hedged only when they're listed.
+Until a host has MIN_SAMPLES calls, its calls aren't hedged.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from django.conf import settings
+
+from anki_word_adder import metrics
+
+SAMPLES = 200  # latencies per host the p95 is taken from
+MIN_SAMPLES = 20
+
+_executor = None
+_executor_pid = None
+# Of this process, exported by the metrics
+_stats = {'hedged': 0, 'hedge_wins': 0}
+
+
+class Latencies:
+    def __init__(self) -> None:
+        self._samples = deque(maxlen=SAMPLES)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        return samples[int(len(samples) * 0.95)]
+
+
+_latencies: Dict[str, Latencies] = {}
+_lock = threading.Lock()
+
+
+def call_hedged(host: str, call: Callable[[], Any]) -> Any:
+    """Result of 'call', which must be safe to make twice at the same time"""
+    if host not in settings.HEDGING['HOSTS']:
+        return call()
+    latencies = _get_latencies(host)
+    delay = latencies.p95()
+    started = time.monotonic()
+    if delay is None:
+        result = call()
+        latencies.add(time.monotonic() - started)
+        return result
+
+    executor = _hedge_executor()
+    calls = [executor.submit(call)]
+    if not futures.wait(calls, timeout=max(delay, settings.HEDGING['MIN_DELAY'])).done:
+        calls.append(executor.submit(call))
+        _stats['hedged'] += 1
+    # An error only counts if the other call fails too. The slower call can't be interrupted, it ends in the pool
+    error = None
+    pending = set(calls)
+    while pending:
+        done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return _won(host, latencies, started, future is not calls[0], future.result())
+            error = future.exception()
+    raise error
+
+
+async def acall_hedged(host: str, call: Callable[[], Awaitable]) -> Any:
+    """Same as 'call_hedged', but the calls are coroutines. The slower one is cancelled"""
+    if host not in settings.HEDGING['HOSTS']:
+        return await call()
+    latencies = _get_latencies(host)
+    delay = latencies.p95()
+    started = time.monotonic()
+    if delay is None:
+        result = await call()
+        latencies.add(time.monotonic() - started)
+        return result
+
+    calls = [asyncio.ensure_future(call())]
+    try:
+        if not (await asyncio.wait(calls, timeout=max(delay, settings.HEDGING['MIN_DELAY'])))[0]:
+            calls.append(asyncio.ensure_future(call()))
+            _stats['hedged'] += 1
+        error = None
+        pending = set(calls)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return _won(host, latencies, started, task is not calls[0], task.result())
+                error = task.exception()
+        raise error
+    finally:
+        for task in calls:
+            task.cancel()
+
+
+def stats() -> Dict[str, int]:
+    return dict(_stats)
+
+
+def _won(host: str, latencies: Latencies, started: float, hedge: bool, result: Any) -> Any:
+    latencies.add(time.monotonic() - started)
+    if hedge:
+        _stats['hedge_wins'] += 1
+    return result
+
+
+def _get_latencies(host: str) -> Latencies:
+    with _lock:
+        latencies = _latencies.get(host)
+        if latencies is None:
+            latencies = _latencies[host] = Latencies()
+        return latencies
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    """The calls are made from the provider pool, so they get a pool of their own to not wait for it"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=settings.HEDGING['WORKERS'], thread_name_prefix='hedge')
+        _executor_pid = os.getpid()
+    return _executor
+
+
+metrics.registry.add_stats('awa_http_hedging', 'Hedged calls and the ones the hedge won', stats,
+                           counters=('hedged', 'hedge_wins'))
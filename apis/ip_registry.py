@@ -1,18 +1,28 @@
 import os
-from urllib.error import HTTPError
+import time
 
+import requests
+
+from .circuit_breaker import get_breaker
 from .utils import get_json_data
 from anki_word_adder.apps.accounts.models import Language
 
 IP_REGISTRY_KEY = os.environ.get('IP_REGISTRY_KEY')
+IP_REGISTRY_HOST = 'api.ipregistry.co'
 
 
 def get_language_code_by_ip(ip: str) -> str:
     """Use ipregistry to identify the language code of the user or return default language code"""
 
-    url = f'https://api.ipregistry.co/{ip}?key={IP_REGISTRY_KEY}'
+    url = f'https://{IP_REGISTRY_HOST}/{ip}?key={IP_REGISTRY_KEY}'
+    breaker = get_breaker(IP_REGISTRY_HOST)
+    if not breaker.allow():
+        return Language.default_code
+    started = time.monotonic()
     try:
         data = get_json_data(url)
-    except HTTPError:
+    except requests.RequestException:
+        breaker.record(failed=True)
         return Language.default_code
+    breaker.record(failed=False, seconds=time.monotonic() - started)
     return data['location']['language']['code']
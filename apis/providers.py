@@ -0,0 +1,176 @@
+"""Dictionaries the word data is made of, behind one interface.
+
+A provider downloads and parses its source for a word ('get', or 'aget' in the async views)
+and turns the result into fields of the saved Word and Translation. Providers are enabled and configured
+by settings.WORD_PROVIDERS, and the views call all of them at the same time for a new word.
+Every provider has a time budget (TIMEOUT): a required provider that runs out of it fails the lookup,
+an optional one is left out and the word is saved with its 'skipped_word_fields'.
+Calls are guarded by the circuit breaker of the provider's host (see circuit_breaker.py):
+failures and calls that ran out of the budget are recorded, and while the circuit is open
+the provider is unavailable, so lookups don't wait for a host that is down.
+"""
+from __future__ import annotations
+
+import abc
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .circuit_breaker import get_breaker
+from .clients import GOOGLE_TRANSLATE_URL
+from .collins import COLLINS_API_URL, CollinsData, collins_quota
+from .google import GoogleData
+from .utils import provider_executor, with_context
+
+# Result of a provider that wasn't called (e.g. its quota is spent) or ran out of its time budget
+SKIPPED = object()
+
+
+class Provider(abc.ABC):
+    # The word doesn't exist without this provider's data
+    required = False
+    # Translation fields depend on the language, so the provider is called for every new language of a word.
+    # Other providers are only called when the Word is created
+    per_language = False
+    # Host the provider calls, None if its calls aren't guarded by a circuit breaker
+    host: Optional[str] = None
+
+    def __init__(self, name: str, timeout: float) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.breaker = get_breaker(self.host) if self.host else None
+
+    def __repr__(self) -> str:
+        return f'<{type(self).__name__} {self.name}>'
+
+    def is_available(self, background: bool = False) -> bool:
+        """Called right before the provider is, 'background' for refreshes. Unavailable providers are skipped.
+        Every call of an available provider must be followed by 'record'"""
+        return self.breaker is None or self.breaker.allow()
+
+    def record(self, failed: bool, seconds: float = 0) -> None:
+        """Outcome of a call and how long it took, running out of the time budget is a failure"""
+        if self.breaker is not None:
+            self.breaker.record(failed, seconds)
+
+    def release(self) -> None:
+        """An available provider that was called, but its outcome won't be recorded (e.g. it was cancelled,
+        because the word doesn't exist). Instead of 'record'"""
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def call(self, word: str, lang_code: str) -> Tuple[Optional[Any], float]:
+        """'get' and how long it took, for 'record'"""
+        started = time.monotonic()
+        return self.get(word, lang_code), time.monotonic() - started
+
+    async def acall(self, word: str, lang_code: str) -> Tuple[Optional[Any], float]:
+        """Same as 'call'"""
+        started = time.monotonic()
+        return await self.aget(word, lang_code), time.monotonic() - started
+
+    @abc.abstractmethod
+    def get(self, word: str, lang_code: str) -> Optional[Any]:
+        """Downloaded and parsed data of the word, None if the provider doesn't know it"""
+
+    async def aget(self, word: str, lang_code: str) -> Optional[Any]:
+        """Same as 'get', but doesn't block the event loop. Providers without an async API run in the provider pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(provider_executor(), with_context(self.get), word, lang_code)
+
+    def word_fields(self, data: Optional[Any]) -> Dict[str, Any]:
+        return {}
+
+    def translation_fields(self, data: Any) -> Dict[str, Any]:
+        return {}
+
+    def skipped_word_fields(self) -> Dict[str, Any]:
+        return {}
+
+
+class GoogleProvider(Provider):
+    required = True
+    per_language = True
+    host = urlsplit(GOOGLE_TRANSLATE_URL).hostname
+
+    def get(self, word: str, lang_code: str) -> Optional[GoogleData]:
+        return GoogleData.get(word, lang_code)
+
+    async def aget(self, word: str, lang_code: str) -> Optional[GoogleData]:
+        return await GoogleData.aget(word, lang_code)
+
+    def word_fields(self, data: GoogleData) -> Dict[str, Any]:
+        return {
+            'google': {
+                "transcription": data.transcription,
+                "examples": data.examples,
+                "definitions": data.definitions,
+            },
+        }
+
+    def translation_fields(self, data: GoogleData) -> Dict[str, Any]:
+        return {
+            'translation': {
+                'main_translation': data.main_translation,
+                'translations': data.translations,
+            },
+        }
+
+
+class CollinsProvider(Provider):
+    host = urlsplit(COLLINS_API_URL).hostname
+
+    def is_available(self, background: bool = False) -> bool:
+        # The quota isn't spent on calls the open circuit would refuse
+        if not super().is_available(background):
+            return False
+        if background:
+            # New words need Collins more, so refreshes leave them COLLINS_RESERVE calls of the quota
+            remaining = collins_quota.stats()['remaining_today']
+            if remaining is not None and remaining <= settings.WORD_REFRESH['COLLINS_RESERVE']:
+                return False
+        return collins_quota.acquire()
+
+    def get(self, word: str, lang_code: str) -> Optional[CollinsData]:
+        return CollinsData.get(word)
+
+    async def aget(self, word: str, lang_code: str) -> Optional[CollinsData]:
+        return await CollinsData.aget(word)
+
+    def word_fields(self, data: Optional[CollinsData]) -> Dict[str, Any]:
+        return {'collins': self.collins_json(data), 'collins_pending': False}
+
+    def skipped_word_fields(self) -> Dict[str, Any]:
+        # 'refill_collins' command requests it later
+        return {'collins': None, 'collins_pending': True}
+
+    @staticmethod
+    def collins_json(data: Optional[CollinsData]) -> Optional[Dict[str, Any]]:
+        if data is None:
+            return None
+        return {
+            "audio_url": data.audio_url,
+            "frequency": data.frequency,
+            "transcription": data.transcription,
+            "definitions": data.definitions,
+        }
+
+
+_providers = None
+_providers_config = None
+
+
+def get_providers() -> List[Provider]:
+    """Providers of settings.WORD_PROVIDERS in its order, the required ones first.
+    A provider class that doesn't implement 'get' raises TypeError here"""
+    global _providers, _providers_config
+    config = settings.WORD_PROVIDERS
+    if config is not _providers_config:
+        providers = [import_string(options['CLASS'])(name, options['TIMEOUT']) for name, options in config.items()]
+        _providers = sorted(providers, key=lambda provider: not provider.required)
+        _providers_config = config
+    return _providers
@@ -1,7 +1,64 @@
-import requests
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from urllib.parse import urlsplit
+
+from anki_word_adder import metrics
+
+from .clients import TIMEOUT, get_async_client, get_session
+from .hedging import acall_hedged, call_hedged
+
+PROVIDER_WORKERS = int(os.environ.get('PROVIDER_WORKERS', 8))
+
+_executor = None
+_executor_pid = None
 
 
 def get_json_data(url: str, **options):
-    r = requests.get(url, timeout=3, **options)
+    """Raises requests.RequestException if the request fails"""
+    host = urlsplit(url).hostname
+    with metrics.timer(metrics.http_client_requests, 'http', host=host):
+        return call_hedged(host, functools.partial(_get_json_data, url, options))
+
+
+async def aget_json_data(url: str, **options):
+    """Raises httpx.HTTPError if the request fails"""
+    host = urlsplit(url).hostname
+    with metrics.timer(metrics.http_client_requests, 'http', host=host):
+        return await acall_hedged(host, functools.partial(_aget_json_data, url, options))
+
+
+def is_not_found(error: Exception) -> bool:
+    """Whether the error of 'get_json_data' or 'aget_json_data' is a 404 response"""
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code == 404
+
+
+def _get_json_data(url: str, options):
+    r = get_session().get(url, timeout=TIMEOUT, **options)
+    r.raise_for_status()
+    return r.json()
+
+
+async def _aget_json_data(url: str, options):
+    r = await get_async_client().get(url, **options)
     r.raise_for_status()
     return r.json()
+
+
+def with_context(func: Callable) -> Callable:
+    """'func' that runs in a copy of the current context. Pool threads don't inherit the context,
+    so provider calls submitted this way are added to the timings of the request that made them"""
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def provider_executor() -> ThreadPoolExecutor:
+    """Bounded pool for running provider calls concurrently.
+    It's created lazily and per process, so every forked gunicorn worker gets its own threads"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=PROVIDER_WORKERS, thread_name_prefix='provider')
+        _executor_pid = os.getpid()
+    return _executor
@@ -0,0 +1,117 @@
+"""Compares the sync and the async word data views under a mostly-miss workload.
+
+Providers are replaced with stubs that only wait (LATENCY), so the result shows how many lookups
+one process can keep in flight, not how fast Google or Collins are. The sync view is called from
+WORKERS threads (like sync gunicorn workers), the async one from CONCURRENCY tasks in one event loop.
+Google has no async API, so PROVIDER_WORKERS should be at least CONCURRENCY for the async view.
+
+Usage: python -m benchmarks.async_view [--requests 200] [--hit-ratio 0.1] [--latency 0.2] ...
+"""
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from unittest import mock
+
+from benchmarks.utils import create_learner, percentiles, setup_django
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='requests per view')
+    parser.add_argument('--hit-ratio', type=float, default=0.1, help='share of words that are already saved')
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds every provider call takes')
+    parser.add_argument('--workers', type=int, default=4, help='threads calling the sync view')
+    parser.add_argument('--concurrency', type=int, default=100, help='tasks calling the async view')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('PROVIDER_WORKERS', str(args.concurrency * 2))
+    setup_django()
+
+    from asgiref.sync import ThreadSensitiveContext
+    from django.test import AsyncClient, Client
+    from django.urls import reverse
+    from anki_word_adder.apps.accounts.models import Language, Translation, Word
+    from anki_word_adder.word_cache import word_data_cache
+    from apis.collins import CollinsData
+    from apis.google import GoogleData
+
+    learner = create_learner()
+    language = Language.objects.get(code='ru')
+
+    def make_words(prefix: str) -> List[str]:
+        words = [f'{prefix}{i}' for i in range(args.requests)]
+        for word in random.sample(words, int(len(words) * args.hit_ratio)):
+            word_model = Word.objects.create(name=word, google={}, collins={})
+            Translation.objects.create(word=word_model, language=language, translation={'translations': []})
+        return words
+
+    def google(word, lang_code):
+        time.sleep(args.latency)
+        translations = [{'part_of_speech': '', 'translation': word, 'reverse_translations': [], 'frequency': 3}]
+        return GoogleData('', word, [], [], translations)
+
+    def collins(word):
+        time.sleep(args.latency)
+        return CollinsData(3, '', '', [])
+
+    async def acollins(word):
+        await asyncio.sleep(args.latency)
+        return CollinsData(3, '', '', [])
+
+    def run_sync(words: List[str]):
+        local = threading.local()
+
+        def request(word):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(learner)
+            started = time.perf_counter()
+            local.client.get(reverse('word_data', kwargs={'word': word}))
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            return list(executor.map(request, words))
+
+    def run_async(words: List[str]):
+        client = AsyncClient()
+        client.force_login(learner)
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def request(word):
+            # ASGIHandler gives every request its own thread for sync code, the test client doesn't
+            async with semaphore, ThreadSensitiveContext():
+                started = time.perf_counter()
+                await client.get(reverse('async_word_data', kwargs={'word': word}))
+                return time.perf_counter() - started
+
+        async def run():
+            return await asyncio.gather(*(request(word) for word in words))
+
+        return asyncio.run(run())
+
+    print(f'{args.requests} requests per view, hit ratio {args.hit_ratio}, '
+          f'provider latency {args.latency * 1000:.0f} ms')
+    with mock.patch.object(GoogleData, 'get', side_effect=google), \
+            mock.patch.object(CollinsData, 'get', side_effect=collins), \
+            mock.patch.object(CollinsData, 'aget', side_effect=acollins):
+        for name, run, prefix in (('sync', run_sync, 's'), ('async', run_async, 'a')):
+            words = make_words(prefix)
+            word_data_cache.clear()
+            started = time.perf_counter()
+            latencies = run(words)
+            elapsed = time.perf_counter() - started
+            stats = percentiles(latencies)
+            print(f'{name:>5}: {len(words) / elapsed:8.1f} req/s  '
+                  f'p50 {stats["p50"]:7.1f} ms  p95 {stats["p95"]:7.1f} ms  p99 {stats["p99"]:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Compares the Collins parse engines (COLLINS_PARSER) on the cached entries of CollinsDataCached.
+
+Only parsing is measured, nothing is downloaded. Both engines must return the same data,
+the benchmark stops if they don't.
+
+Usage: python -m benchmarks.collins_parser [--iterations 500]
+"""
+import argparse
+import time
+
+from apis.collins import CollinsData, CollinsDataCached
+
+ENGINES = {
+    'bs4': CollinsData._parse_bs4,
+    'stream': CollinsData._parse_stream,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=500, help='times every entry is parsed')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    entries = list(CollinsDataCached.data.values())
+
+    for html_markup in entries:
+        results = [vars(parse(html_markup)) for parse in ENGINES.values()]
+        if any(result != results[0] for result in results):
+            raise SystemExit('Engines return different data')
+
+    print(f'{len(entries)} entries, {args.iterations} iterations')
+    timings = {}
+    for name, parse in ENGINES.items():
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            for html_markup in entries:
+                parse(html_markup)
+        timings[name] = (time.perf_counter() - started) / (args.iterations * len(entries))
+        print(f'{name:>6}: {timings[name] * 1_000_000:8.1f} us per entry')
+    print(f'stream is {timings["bs4"] / timings["stream"]:.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
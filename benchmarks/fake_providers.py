@@ -0,0 +1,183 @@
+"""Local stand-ins for Google Translate and the Collins API, for load tests without the network.
+
+Both answer with recorded payloads (the Google responses committed to benchmarks/fixtures/google, which
+'python -m benchmarks.parsers --record' adds to, and the entries of CollinsDataCached), so they work offline,
+picked by the hash of the requested word, so every word gets the same data every time.
+Every response takes LATENCY seconds (plus up to JITTER), and ERROR_RATE of them fail with 500.
+Words in NOT_FOUND_WORDS get the response of a word that doesn't exist.
+
+The app is pointed to them with GOOGLE_TRANSLATE_URL and COLLINS_API_URL, which are read at import,
+so start the servers before the app is imported:
+
+    python -m benchmarks.fake_providers [--latency 0.1] [--error-rate 0.01]
+    GOOGLE_TRANSLATE_URL=http://127.0.0.1:8701 COLLINS_API_URL=http://127.0.0.1:8702 gunicorn anki_word_adder.wsgi
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Set
+from urllib.parse import parse_qs, urlsplit
+
+GOOGLE_FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures' / 'google'
+GOOGLE_RPC_ID = 'MkEWBc'
+
+
+@dataclass
+class Behaviour:
+    latency: float = 0.1  # seconds
+    jitter: float = 0.0  # seconds, added at random to the latency
+    error_rate: float = 0.0
+    not_found_words: Set[str] = field(default_factory=set)
+
+    def wait(self) -> None:
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, handler, behaviour: Behaviour) -> None:
+        super().__init__(('127.0.0.1', port), handler)
+        self.behaviour = behaviour
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, error: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += error
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name=self.RequestHandlerClass.__name__, daemon=True).start()
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    server: FakeProviderServer
+
+    def respond(self, word: str) -> None:
+        behaviour = self.server.behaviour
+        behaviour.wait()
+        error = behaviour.fails()
+        self.server.count(error)
+        if error:
+            self.send_body(500, b'Internal Server Error', 'text/plain')
+        else:
+            self.send_body(200, *self.payload(word, word in behaviour.not_found_words))
+
+    def payload(self, word: str, not_found: bool):
+        raise NotImplementedError
+
+    def send_body(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # Thousands of requests per second, the output would be slower than the servers
+        pass
+
+
+class FakeGoogleHandler(FakeProviderHandler):
+    """Answers googletrans RPC requests ('batchexecute') with the payloads of benchmarks/fixtures/google"""
+
+    fixtures: List[Dict] = []
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        # [[[RPC_ID, '[[word, src, dest, true], [null]]', null, 'generic']]]
+        word = json.loads(json.loads(form['f.req'][0])[0][0][1])[0][0]
+        self.respond(word)
+
+    def payload(self, word: str, not_found: bool):
+        fixture = pick(self.fixtures, word)
+        # The translation parts are what googletrans makes the main translation ('text') of
+        parsed = [fixture['parsed'][0], [[[None, None, None, True, None, [[fixture['text'], []]]]]],
+                  *fixture['parsed'][2:]]
+        if not_found:
+            # GoogleData._parse skips the words without definitions, examples and translations
+            parsed = parsed[:3]
+        line = json.dumps([['wrb.fr', GOOGLE_RPC_ID, json.dumps(parsed), None, None, None, 'generic']])
+        return f")]}}'\n\n{len(line)}\n{line}\n".encode('utf-8'), 'application/json; charset=utf-8'
+
+
+class FakeCollinsHandler(FakeProviderHandler):
+    """Answers 'search/first' requests with the entries of CollinsDataCached"""
+
+    entries: List[str] = []
+
+    def do_GET(self) -> None:
+        self.respond(parse_qs(urlsplit(self.path).query).get('q', [''])[0])
+
+    def payload(self, word: str, not_found: bool):
+        if not_found:
+            return json.dumps({'errorCode': 'NoResult'}).encode('utf-8'), 'application/json'
+        return json.dumps({'entryContent': pick(self.entries, word)}).encode('utf-8'), 'application/json'
+
+
+def pick(payloads: List, word: str):
+    digest = hashlib.sha1(word.encode('utf-8')).digest()
+    return payloads[int.from_bytes(digest[:4], 'big') % len(payloads)]
+
+
+def create_servers(google_port: int = 0, collins_port: int = 0, behaviour: Behaviour = None):
+    """Bind the servers (port 0 - any free one) without serving yet.
+    Their URLs can be put into the environment before the app is imported"""
+    behaviour = behaviour or Behaviour()
+    return (FakeProviderServer(google_port, FakeGoogleHandler, behaviour),
+            FakeProviderServer(collins_port, FakeCollinsHandler, behaviour))
+
+
+def load_payloads() -> None:
+    """Must be called after the environment is set, it imports the app"""
+    from apis.collins import CollinsDataCached
+    for path in sorted(GOOGLE_FIXTURES_DIR.glob('*.json')):
+        with open(path, encoding='utf-8') as fixture:
+            FakeGoogleHandler.fixtures.append(json.load(fixture))
+    if not FakeGoogleHandler.fixtures:
+        raise SystemExit(f'No recorded Google responses in {GOOGLE_FIXTURES_DIR}, '
+                         f'record some with: python -m benchmarks.parsers --record WORD [WORD ...]')
+    FakeCollinsHandler.entries.extend(CollinsDataCached.data[word] for word in sorted(CollinsDataCached.data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--google-port', type=int, default=8701)
+    parser.add_argument('--collins-port', type=int, default=8702)
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds every response takes')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many seconds are added at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of responses that fail with 500')
+    args = parser.parse_args()
+
+    servers = create_servers(args.google_port, args.collins_port,
+                             Behaviour(args.latency, args.jitter, args.error_rate))
+    load_payloads()
+    for server in servers:
+        server.start()
+    google, collins = servers
+    print(f'GOOGLE_TRANSLATE_URL={google.url} COLLINS_API_URL={collins.url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
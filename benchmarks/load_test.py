@@ -0,0 +1,150 @@
+"""End-to-end load test of the word data view with local stand-ins of the providers (see fake_providers.py).
+
+Nothing is mocked in the app: googletrans and the Collins client send real HTTP requests to the local servers,
+which answer with recorded payloads after LATENCY seconds. WORKERS threads (like sync gunicorn workers)
+send REQUESTS lookups through the Django test client. HIT_RATIO of them are for words that are already saved
+(they are served from the database the first time and from the word data cache after that),
+the rest are for new words, NOT_FOUND_RATIO of which the providers don't know.
+Every combination of --hit-ratios and --workers is a separate run with empty caches and new words.
+For every run it reports requests per second, latency percentiles, database queries per request
+(from the Server-Timing header, see metrics.py) and the outcomes.
+
+Usage: python -m benchmarks.load_test [--requests 500] [--hit-ratios 0.5 0.9] [--workers 1 4 8]
+       [--latency 0.1] [--jitter 0.05] [--error-rate 0.01] [--not-found-ratio 0.05]
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.fake_providers import Behaviour, create_servers, load_payloads
+from benchmarks.utils import create_learner, percentiles, setup_django
+
+DB_TIMING = re.compile(r'db;dur=[\d.]+;desc="(\d+) calls"')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help='lookups per run')
+    parser.add_argument('--hit-ratios', type=float, nargs='+', default=[0.5, 0.9],
+                        help='shares of lookups for saved words')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8], help='threads sending the lookups')
+    parser.add_argument('--saved-words', type=int, default=200, help='saved words the hits are spread over')
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds every provider response takes')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many seconds added to the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of provider responses that fail')
+    parser.add_argument('--not-found-ratio', type=float, default=0.0,
+                        help='share of new words the providers don\'t know')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    behaviour = Behaviour(args.latency, args.jitter, args.error_rate)
+    servers = create_servers(behaviour=behaviour)
+    google_server, collins_server = servers
+    # Read when the app is imported
+    os.environ['GOOGLE_TRANSLATE_URL'] = google_server.url
+    os.environ['COLLINS_API_URL'] = collins_server.url
+    os.environ.setdefault('PROVIDER_WORKERS', str(max(args.workers) * 2))
+    setup_django()
+    load_payloads()
+    for server in servers:
+        server.start()
+
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+    from anki_word_adder.apps.accounts.models import Language, Translation, Word
+    from anki_word_adder.views import WordDataMixin
+    from anki_word_adder.word_cache import word_data_cache, word_not_found_cache
+
+    error_outcomes = {WordDataMixin.word_not_found_error: 'not found', WordDataMixin.provider_error: 'provider error'}
+
+    # Provider errors are counted in the outcomes, their tracebacks would bury the report
+    logging.getLogger('anki_word_adder').setLevel(logging.CRITICAL)
+    # The query counts come from the Server-Timing header
+    settings.METRICS = {**settings.METRICS, 'SERVER_TIMING': True}
+    learner = create_learner()
+    language = Language.objects.get(code='ru')
+    saved_words = [f'saved{i}' for i in range(args.saved_words)]
+    for word in saved_words:
+        word_model = Word.objects.create(name=word, google={}, collins={})
+        Translation.objects.create(word=word_model, language=language, translation={'translations': []})
+
+    def make_words(run: int, hit_ratio: float) -> List[str]:
+        words = []
+        for i in range(args.requests):
+            if random.random() < hit_ratio:
+                words.append(random.choice(saved_words))
+                continue
+            word = f'new{run}x{i}'
+            if random.random() < args.not_found_ratio:
+                behaviour.not_found_words.add(word)
+            words.append(word)
+        return words
+
+    def run_lookups(words: List[str], workers: int) -> Dict:
+        local = threading.local()
+        latencies = []
+        queries = []
+        outcomes = Counter()
+        lock = threading.Lock()
+
+        def request(word):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(learner)
+            started = time.perf_counter()
+            response = local.client.get(reverse('word_data', kwargs={'word': word}))
+            latency = time.perf_counter() - started
+            db_timing = DB_TIMING.search(response.get('Server-Timing', ''))
+            if response.status_code != 200:
+                outcome = f'status {response.status_code}'
+            else:
+                errors = response.json().get('errors')
+                outcome = error_outcomes.get(errors[0], errors[0]) if errors else 'ok'
+            with lock:
+                latencies.append(latency)
+                queries.append(int(db_timing.group(1)) if db_timing else 0)
+                outcomes[outcome] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(request, words))
+        elapsed = time.perf_counter() - started
+        return {'elapsed': elapsed, 'latencies': latencies, 'queries': queries, 'outcomes': outcomes}
+
+    print(f'{args.requests} lookups per run, provider latency {args.latency * 1000:.0f} ms '
+          f'(+{args.jitter * 1000:.0f} ms jitter), {args.error_rate:.0%} provider errors, '
+          f'{args.not_found_ratio:.0%} of new words not found')
+    print(f'{"hits":>5} {"workers":>7} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+          f'{"queries":>8} {"q p95":>6}  outcomes')
+    for run, (hit_ratio, workers) in enumerate(itertools.product(args.hit_ratios, args.workers)):
+        word_data_cache.clear()
+        word_not_found_cache.clear()
+        provider_requests = google_server.requests + collins_server.requests
+        cache_stats = word_data_cache.stats()
+        result = run_lookups(make_words(run, hit_ratio), workers)
+        latency = percentiles(result['latencies'])
+        query_p95 = statistics.quantiles(result['queries'], n=20)[-1] if len(result['queries']) > 1 else 0
+        outcomes = ', '.join(f'{count} {outcome}' for outcome, count in result['outcomes'].most_common())
+        print(f'{hit_ratio:5.0%} {workers:7d} {args.requests / result["elapsed"]:8.1f} '
+              f'{latency["p50"]:8.1f} {latency["p95"]:8.1f} {latency["p99"]:8.1f} '
+              f'{statistics.mean(result["queries"]):8.2f} {query_p95:6.0f}  {outcomes}')
+        cache_stats = {key: value - cache_stats[key] for key, value in word_data_cache.stats().items()}
+        print(f'{"":>14}provider requests: {google_server.requests + collins_server.requests - provider_requests}, '
+              f'word data cache: {cache_stats["local_hits"]} local hits, {cache_stats["shared_hits"]} shared hits, '
+              f'{cache_stats["misses"]} misses')
+
+
+if __name__ == '__main__':
+    main()
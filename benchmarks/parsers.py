@@ -0,0 +1,185 @@
+"""Micro-benchmarks of the provider parsers, fully offline.
+
+GoogleData._parse is run on the googletrans responses recorded with --record into benchmarks/fixtures/google
+('extra_data["parsed"]' and the main translation), CollinsData._parse on the cached entries of CollinsDataCached.
+The committed responses with "recorded": null were written in the recorded format without network access,
+recording the same words again replaces them.
+For every case it reports per-call latency percentiles (of the fastest of ROUNDS rounds) and the memory allocated
+by one call (tracemalloc), then compares them with the baseline and exits with 1 if a case is slower
+or allocates more than the baseline allows.
+
+Latency depends on the machine, so it's compared in units of a calibration loop (a fixed pure-Python workload)
+measured in the same rounds: a machine twice as slow runs the parsers and the loop twice as long.
+The baseline is committed (benchmarks/fixtures/parsers_baseline.json), --save-baseline replaces it
+after an intended change or new fixtures. Without a baseline the run fails instead of passing.
+
+Usage: python -m benchmarks.parsers [--iterations 200] [--tolerance 0.5] [--save-baseline]
+       python -m benchmarks.parsers --record WORD [WORD ...] [--dest ru]  (needs network)
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import googletrans
+from googletrans.models import Translated
+
+from apis.collins import CollinsData, CollinsDataCached
+from apis.google import GoogleData
+from benchmarks.utils import percentiles
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+GOOGLE_FIXTURES_DIR = FIXTURES_DIR / 'google'
+BASELINE_PATH = FIXTURES_DIR / 'parsers_baseline.json'
+
+ROUNDS = 5
+# Memory doesn't depend on the machine as much as latency does
+MEMORY_TOLERANCE = 0.1
+CALIBRATION_DATA = json.dumps([{'word': f'word{i}', 'tags': ['noun', 'rare'], 'count': i} for i in range(100)])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200, help='measured calls per case and round')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed p50 slowdown relative to the calibration loop, 0.5 means 50%%')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--record', nargs='+', metavar='WORD', help='record Google responses for the words')
+    parser.add_argument('--dest', default='ru', help='destination language of the recorded words')
+    return parser.parse_args()
+
+
+def load_google_fixture(path: Path) -> Translated:
+    with open(path, encoding='utf-8') as fixture:
+        data = json.load(fixture)
+    return Translated(src='en', dest=data['dest'], origin=data['word'], text=data['text'],
+                      pronunciation=None, parts=[], extra_data={'parsed': data['parsed']})
+
+
+def record_google_fixtures(words: List[str], dest: str) -> None:
+    from apis.clients import get_translator
+    GOOGLE_FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    for word in words:
+        translated = get_translator().translate(word, src='en', dest=dest)
+        path = GOOGLE_FIXTURES_DIR / f'{word}.json'
+        with open(path, 'w', encoding='utf-8') as fixture:
+            json.dump({'word': word, 'dest': dest, 'text': translated.text,
+                       'parsed': translated.extra_data['parsed'],
+                       'recorded': {'date': datetime.date.today().isoformat(), 'googletrans': googletrans.__version__}},
+                      fixture, ensure_ascii=False, indent=1)
+            fixture.write('\n')
+        print(f'Recorded {path}')
+
+
+def get_cases() -> Dict[str, Tuple[Callable, object]]:
+    cases = {}
+    google_fixtures = sorted(GOOGLE_FIXTURES_DIR.glob('*.json'))
+    if not google_fixtures:
+        print(f'No recorded Google responses in {GOOGLE_FIXTURES_DIR}, only Collins is measured. '
+              f'Record them with --record WORD [WORD ...]')
+    for path in google_fixtures:
+        cases[f'google:{path.stem}'] = (GoogleData._parse, load_google_fixture(path))
+    for word, html_markup in sorted(CollinsDataCached.data.items()):
+        cases[f'collins:{word}'] = (CollinsData._parse, html_markup)
+    return cases
+
+
+def measure(parse: Callable, data, iterations: int) -> Dict[str, float]:
+    for _ in range(min(iterations, 10)):
+        parse(data)
+
+    # Other processes slow single rounds down, the fastest round is the most stable number.
+    # Every round also times the calibration loop, so the case and its unit run under the same load
+    result = None
+    unit = None
+    for _ in range(ROUNDS):
+        round_unit = time_calls(calibration_workload, CALIBRATION_DATA, iterations)['p50']
+        round_result = time_calls(parse, data, iterations)
+        if unit is None or round_unit < unit:
+            unit = round_unit
+        if result is None or round_result['p50'] < result['p50']:
+            result = round_result
+    result['relative'] = result['p50'] / unit
+
+    tracemalloc.start()
+    try:
+        parse(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result['peak_kib'] = peak / 1024
+    return result
+
+
+def time_calls(function: Callable, data, iterations: int) -> Dict[str, float]:
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function(data)
+        latencies.append(time.perf_counter() - started)
+    return percentiles(latencies)
+
+
+def calibration_workload(data: str) -> List[str]:
+    return sorted(item['word'].upper() for item in json.loads(data) if item['count'] % 3)
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict, tolerance: float) -> List[str]:
+    """Latencies are compared as multiples of the calibration loop ('relative')"""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['relative'] > expected['relative'] * (1 + tolerance):
+            regressions.append(f'{name}: p50 {result["relative"]:.2f} calibration loops, '
+                               f'baseline {expected["relative"]:.2f}')
+        if result['peak_kib'] > expected['peak_kib'] * (1 + MEMORY_TOLERANCE):
+            regressions.append(f'{name}: peak {result["peak_kib"]:.1f} KiB, baseline {expected["peak_kib"]:.1f} KiB')
+    return regressions
+
+
+def main():
+    args = parse_args()
+    # The Collins engine is chosen by settings.COLLINS_PARSER
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    if args.record:
+        record_google_fixtures(args.record, args.dest)
+        return
+
+    results = {}
+    print(f'{"case":<22} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"loops":>8} {"peak KiB":>9}')
+    for name, (parse, data) in get_cases().items():
+        results[name] = result = measure(parse, data, args.iterations)
+        print(f'{name:<22} {result["p50"]:8.3f} {result["p95"]:8.3f} {result["p99"]:8.3f} '
+              f'{result["relative"]:8.2f} {result["peak_kib"]:9.1f}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=1, sort_keys=True)
+            baseline_file.write('\n')
+        print(f'Saved baseline to {args.baseline}')
+        return
+    if not args.baseline.exists():
+        print(f'No baseline in {args.baseline}, save one with --save-baseline')
+        sys.exit(1)
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('Regressions against the baseline:')
+        for regression in regressions:
+            print(f'  {regression}')
+        sys.exit(1)
+    print('No regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
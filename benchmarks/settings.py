@@ -0,0 +1,26 @@
+"""Settings for running benchmarks locally: production settings with a throwaway SQLite database.
+SQLite serializes writes, so set DATABASE_URL to a Postgres database for numbers close to production"""
+import os
+import tempfile
+from pathlib import Path
+
+from anki_word_adder.settings.production import *  # noqa: F401,F403
+
+SECRET_KEY = 'benchmark'
+DEBUG = False
+
+if 'DATABASE_URL' not in os.environ:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': Path(tempfile.gettempdir()) / 'awa_benchmark.sqlite3',
+            # Concurrent requests write at the same time, wait for the lock instead of failing
+            'OPTIONS': {'timeout': 30},
+        }
+    }
+
+# Host of django.test.Client
+ALLOWED_HOSTS = ALLOWED_HOSTS + ['testserver']  # noqa: F405
+
+# Benchmark words are saved without fetch times, don't refresh them while they are measured
+WORD_REFRESH = {**WORD_REFRESH, 'MAX_CONCURRENT': 0}  # noqa: F405
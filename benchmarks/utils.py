@@ -0,0 +1,40 @@
+"""Helpers shared by the benchmarks"""
+import os
+import statistics
+from typing import Dict, List
+
+
+def setup_django() -> None:
+    """Configure Django with benchmarks/settings.py and create a fresh database"""
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    database = settings.DATABASES['default']
+    if database['ENGINE'].endswith('sqlite3'):
+        if os.path.exists(database['NAME']):
+            os.remove(database['NAME'])
+        call_command('migrate', verbosity=0)
+    else:
+        call_command('migrate', verbosity=0)
+        call_command('flush', interactive=False, verbosity=0)
+    call_command('createcachetable', verbosity=0)
+
+
+def create_learner(username: str = 'benchmark', lang_code: str = 'ru'):
+    from anki_word_adder.apps.accounts.models import Language, Learner, Settings
+    language, _ = Language.objects.get_or_create(code=lang_code, defaults={'name': lang_code})
+    learner = Learner.objects.create(username=username)
+    Settings.objects.create(learner=learner, language=language)
+    return learner
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 in milliseconds for samples in seconds"""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {'p50': value, 'p95': value, 'p99': value}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50': cuts[49] * 1000, 'p95': cuts[94] * 1000, 'p99': cuts[98] * 1000}
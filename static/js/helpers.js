@@ -74,7 +74,8 @@ export async function getJson(url) {
     }
 }
 
-/** Transforms data into JSON and posts it to a given URL */
+/** Transforms data into JSON and posts it to a given URL
+ * @returns {Promise<Response>} the response, its body hasn't been read */
 export async function postJson(url, data) {
     const result = await fetch(url, {
         method: 'POST',
@@ -87,6 +88,7 @@ export async function postJson(url, data) {
     if (!result.ok) {
         throw new Error(`${result.statusText} (${result.status})`);
     }
+    return result;
 }
 
 /**
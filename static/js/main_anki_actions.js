@@ -11,6 +11,9 @@ const ankiConnectVersion = 6;
 // Don't forget to change AnkiAppearance if changing these fields
 const noteFields = ['Word', 'Transcription', 'Sound', 'Context', 'TranslateTo', 'TranslationString', 'TranslationTable', 'DefinitionTable'];
 const ankiConnectAddr = 'http://127.0.0.1:8765';
+// Ids of the notes that have all the fields, for the set of notes they were found for
+const suitableNotesStorageKey = 'awa-suitable-notes';
+let suitableNotes = null;
 
 /** By default, AnkiConnect only allows actions coming from localhost.
  * This function requests permission to perform actions from other urls
@@ -20,10 +23,12 @@ export async function requestAnkiPermission() {
     return await invoke('requestPermission');
 }
 
-/** @returns {Promise<Object<number, string>>} dictionary with note names as keys and ids as values */
-export async function getNoteNamesAndIds() {
+/** Note types and decks in one request
+ * @returns {Promise<Array<Object<string, number>>>} dictionaries with note names and deck names as keys and ids as values
+ */
+export async function getNoteAndDeckNamesAndIds() {
     // Anki's term 'Note type' corresponds to AnkiConnect's 'Model'
-    return await invoke('modelNamesAndIds');
+    return await invokeMulti([['modelNamesAndIds'], ['deckNamesAndIds']]);
 }
 
 /** Returns note name if there is a note with a given noteId and this note has all required fields
@@ -42,18 +47,13 @@ export async function getExistingNoteNameById(noteId, noteNamesAndIds) {
     if (!nameIdPair) {
         return null;
     }
-    const noteName = nameIdPair[0];
-
-    return hasAllRequiredFields(noteName) ? noteName : null;
+    const suitableIds = await getSuitableNoteIds(noteNamesAndIds);
+    return suitableIds.has(noteId) ? nameIdPair[0] : null;
 }
 
 export async function getExistingNoteByFields(noteNamesAndIds) {
-    for (const nameAndId of Object.entries(noteNamesAndIds)) {
-        if (await hasAllRequiredFields(nameAndId[0])) {
-            return nameAndId;
-        }
-    }
-    return null;
+    const suitableIds = await getSuitableNoteIds(noteNamesAndIds);
+    return Object.entries(noteNamesAndIds).find(nameAndId => suitableIds.has(nameAndId[1])) || null;
 }
 
 /** Creates new note and returns information about it (including id and name) */
@@ -73,7 +73,9 @@ export async function createNote() {
             }
         ]
     };
-    return await invoke('createModel', params);
+    const note = await invoke('createModel', params);
+    rememberSuitableNote(note['id']);
+    return note;
 }
 
 /** @returns {Promise<Object<string, number>>} dictionary with deck names as keys and ids as values */
@@ -82,58 +84,130 @@ export async function getDeckNamesAndIds() {
 }
 
 export async function createCard(deckName, noteName, wordData, settings, context) {
-    const params = {
-        'note': {
-            'deckName': deckName,
-            'modelName': noteName,
-            'fields': {
-                'Word': wordData['word'],
-                'Transcription': wordData['collins']['transcription'],
-                'Context': context,
-                'TranslateTo': settings['translate_to'],
-                'TranslationString': getTranslationString(wordData, settings),
-                'TranslationTable': getTranslationTable(wordData, settings),
-                'DefinitionTable': getDefinitionTable(wordData, settings),
-            },
-            'options': {
-                'allowDuplicate': false,
-            },
-            'audio': [{
-                'url': wordData['collins']['audio_url'],
-                'filename': `${wordData['word']}.mp3`,
-                'fields': [
-                    'Sound',
-                ]
-            }],
-        }
-    };
-    await invoke('addNote', params);
+    await invoke('addNote', { 'note': getNote(deckName, noteName, wordData, settings, context) });
 }
 
-/** @returns true if note has all the fields that are used by AWA */
-async function hasAllRequiredFields(noteName) {
-    const fields = new Set(await getNoteFields(noteName));
-    if (fields.size < noteFields.length) {
-        return false;
+/** Creates a card for every word in one request
+ * @returns {Promise<Array<boolean>>} whether the card of each word has been added (false for duplicates)
+ */
+export async function createCards(deckName, noteName, wordDataList, settings) {
+    const notes = wordDataList.map(wordData => getNote(deckName, noteName, wordData, settings, ''));
+    // Older AnkiConnect versions return null for the notes that can't be added,
+    // newer ones fail the whole action, then 'canAddNotes' (checked right before adding) tells which were added
+    const [canAdd, added] = await invoke('multi', {
+        'actions': [
+            { 'action': 'canAddNotes', 'version': ankiConnectVersion, 'params': { notes } },
+            { 'action': 'addNotes', 'version': ankiConnectVersion, 'params': { notes } },
+        ]
+    });
+    if (added.error === null) {
+        return added.result.map(noteId => noteId !== null);
     }
+    return getResult(canAdd);
+}
 
-    for (const field of noteFields) {
-        if (!fields.has(field)) {
-            return false;
+function getNote(deckName, noteName, wordData, settings, context) {
+    // Collins may have been unavailable when the word was fetched
+    const collinsData = wordData['collins'] || {};
+    // Audio is served from our origin, so its URL is relative
+    const audioUrl = collinsData['audio_url'];
+    return {
+        'deckName': deckName,
+        'modelName': noteName,
+        'fields': {
+            'Word': wordData['word'],
+            'Transcription': collinsData['transcription'] || '',
+            'Context': context,
+            'TranslateTo': settings['translate_to'],
+            'TranslationString': getTranslationString(wordData, settings),
+            'TranslationTable': getTranslationTable(wordData, settings),
+            'DefinitionTable': getDefinitionTable(wordData, settings),
+        },
+        'options': {
+            'allowDuplicate': false,
+        },
+        'audio': audioUrl ? [{
+            'url': new URL(audioUrl, window.location.origin).href,
+            'filename': `${wordData['word']}.mp3`,
+            'fields': [
+                'Sound',
+            ]
+        }] : [],
+    };
+}
+
+/** Ids of the notes that have all the fields that are used by AWA.
+ * Fields of all the notes are requested at once, and the result is remembered for the same set of notes,
+ * so it costs no requests after a page reload
+ * @param {Object<string, number>} noteNamesAndIds dictionary with note names as keys and ids as values
+ * @returns {Promise<Set<number>>}
+ */
+function getSuitableNoteIds(noteNamesAndIds) {
+    const key = getNotesKey(Object.values(noteNamesAndIds));
+    if (suitableNotes === null || suitableNotes['key'] !== key) {
+        const remembered = readStorage(suitableNotesStorageKey);
+        if (remembered && remembered['key'] === key) {
+            suitableNotes = { 'key': key, 'ids': Promise.resolve(new Set(remembered['ids'])) };
+        }
+        else {
+            suitableNotes = { 'key': key, 'ids': findSuitableNoteIds(noteNamesAndIds, key) };
         }
     }
-    return true;
+    return suitableNotes['ids'];
 }
 
-/**Get all field names that a given note has
- * @param {string} noteName 
- * @returns {Promise<Array<string>>} an array of field names
- */
-async function getNoteFields(noteName) {
-    const params = {
-        'modelName': noteName,
-    };
-    return await invoke('modelFieldNames', params);
+async function findSuitableNoteIds(noteNamesAndIds, key) {
+    const notes = Object.entries(noteNamesAndIds);
+    const fieldLists = await invokeMulti(notes.map(([noteName]) => ['modelFieldNames', { 'modelName': noteName }]));
+    const ids = notes
+        .filter((nameAndId, index) => hasAllRequiredFields(fieldLists[index]))
+        .map(nameAndId => nameAndId[1]);
+    writeStorage(suitableNotesStorageKey, { 'key': key, 'ids': ids });
+    return new Set(ids);
+}
+
+/** A note created by AWA has all the fields, so it doesn't need to be checked after a page reload */
+function rememberSuitableNote(noteId) {
+    const remembered = readStorage(suitableNotesStorageKey);
+    if (!remembered) {
+        return;
+    }
+    // The key of no notes is an empty string, and Number('') would be a note with id 0
+    const ids = remembered['key'].split(',').filter(id => id !== '').map(Number);
+    writeStorage(suitableNotesStorageKey, {
+        'key': getNotesKey([...ids, noteId]),
+        'ids': [...remembered['ids'], noteId],
+    });
+    suitableNotes = null;
+}
+
+function getNotesKey(noteIds) {
+    return [...noteIds].sort((a, b) => a - b).join(',');
+}
+
+/** @returns true if note has all the fields that are used by AWA */
+function hasAllRequiredFields(noteFieldNames) {
+    const fields = new Set(noteFieldNames);
+    return noteFields.every(field => fields.has(field));
+}
+
+/** localStorage may be disabled, then nothing is remembered */
+function readStorage(key) {
+    try {
+        return JSON.parse(localStorage.getItem(key));
+    }
+    catch (err) {
+        return null;
+    }
+}
+
+function writeStorage(key, value) {
+    try {
+        localStorage.setItem(key, JSON.stringify(value));
+    }
+    catch (err) {
+        // Not remembered
+    }
 }
 
 /**@returns filtered translations joined by comma*/
@@ -172,7 +246,7 @@ function getDefinitionTable(wordData, settings) {
         });
     }
 
-    if (settings['add_collins_definitions']) {
+    if (settings['add_collins_definitions'] && wordData['collins']) {
         const collinsData = wordData['collins'];
         collinsData['definitions'].forEach(def => {
             const row = Helpers.createCollinsDefinitionRow(def, number, false);
@@ -218,14 +292,26 @@ async function invoke(action, params = {}) {
             AnkiConnect add-on is installed and reload the page. Read the <a href='/guide'>Guide</a> if you haven't yet.`);
             throw err;
         })
-        .then(result => {
-            if (result.error !== null) {
-                const message = result.error.charAt(0).toUpperCase() + result.error.substr(1);
-                InterfaceManager.showError(message);
-                throw new Error(result.error);
-            }
-            else {
-                return result.result;
-            }
-        });
-}
\ No newline at end of file
+        .then(getResult);
+}
+
+/**
+ * Performs several actions in one request to AnkiConnect, every request to Anki is a round trip
+ * @param {Array<Array>} actions pairs of action and its parameters (optional)
+ * @returns {Promise<Array<any>>} results of the actions in the same order
+ */
+async function invokeMulti(actions) {
+    const results = await invoke('multi', {
+        'actions': actions.map(([action, params = {}]) => ({ action, version: ankiConnectVersion, params })),
+    });
+    return results.map(getResult);
+}
+
+function getResult(result) {
+    if (result.error !== null) {
+        const message = result.error.charAt(0).toUpperCase() + result.error.substr(1);
+        InterfaceManager.showError(message);
+        throw new Error(result.error);
+    }
+    return result.result;
+}
@@ -1,22 +1,25 @@
 import * as AnkiActions from "./main_anki_actions.js";
 import * as InterfaceManager from "./main_interface_manager.js";
 import * as Helpers from "./helpers.js";
+import * as WordCache from "./main_word_cache.js";
 
 let noteName;
 let deckName;
 let settings; // Learner's settings
 let wordData; // Translations, definitions, etc
+let suggestedPrefix; // The last prefix suggestions were asked for, older responses are dropped
 
 /** Set user settings, create new note if necessary and show deck/main controls */
 export async function initialize() {
     settings = JSON.parse(document.getElementById('learner-settings').textContent);
     await AnkiActions.requestAnkiPermission();
 
-    setupNote(settings['note_id']);
-
     InterfaceManager.initialize(settings);
 
-    const deckNamesAndIds = await AnkiActions.getDeckNamesAndIds();
+    // Note types and decks come in one request, and the note is set up while the deck controls are shown
+    const [noteNamesAndIds, deckNamesAndIds] = await AnkiActions.getNoteAndDeckNamesAndIds();
+    setupNote(settings['note_id'], noteNamesAndIds);
+
     for (const [dName, dId] of Object.entries(deckNamesAndIds)) {
         if (dId === settings['deck_id']) {
             deckName = dName;
@@ -68,7 +71,7 @@ export async function toggleCollinsDefinitions() {
 export async function updateWordData(word) {
     InterfaceManager.clearMessages();
     try {
-        wordData = await Helpers.getJson(`word-data/${word}`);
+        wordData = await WordCache.getWordData(word, settings['translate_to']);
     }
     catch (err) {
         InterfaceManager.showError('Unable to get word data from the server');
@@ -85,6 +88,33 @@ export async function updateWordData(word) {
     }
 }
 
+/**Shows known words starting with @param prefix. The data of the one the learner is most likely
+ * to look up (typed in full or the only one left) is downloaded in the background,
+ * so its lookup only revalidates it with the server
+ * @param {string} prefix
+ */
+export async function suggestWords(prefix) {
+    prefix = prefix.toLowerCase();
+    suggestedPrefix = prefix;
+    let words;
+    try {
+        words = (await Helpers.getJson(`suggestions/?prefix=${encodeURIComponent(prefix)}`))['words'];
+    }
+    catch {
+        // Suggestions are optional, the lookup still works
+        return;
+    }
+    if (prefix !== suggestedPrefix) {
+        return;
+    }
+
+    InterfaceManager.showSuggestions(words);
+    const likely = words.includes(prefix) ? prefix : (words.length == 1 ? words[0] : null);
+    if (likely) {
+        WordCache.getWordData(likely, settings['translate_to'], true).catch(() => { });
+    }
+}
+
 /**Creates new card for the word
  * @param {string} context 
  */
@@ -97,9 +127,59 @@ export async function createAnkiCard(context) {
     }
 }
 
+/**Creates a card for every word of the text. The words are fetched in one request to the server,
+ * and the cards are added in one request to Anki
+ * @param {string} text pasted text or list of words
+ */
+export async function createAnkiCards(text) {
+    InterfaceManager.clearMessages();
+    let results;
+    try {
+        const response = await Helpers.postJson('word-data/', { 'text': text });
+        results = (await response.json())['results'];
+    }
+    catch (err) {
+        InterfaceManager.showError('Unable to get word data from the server');
+        throw err;
+    }
+
+    const notAdded = [];
+    const found = [];
+    for (const result of results) {
+        if (result['errors']) {
+            notAdded.push(`${result['word']} (${result['errors'][0]})`);
+        }
+        else if (!result['translations'].some(tr => tr['frequency'] >= settings['translation_filter'])) {
+            notAdded.push(`${result['word']} (no translations)`);
+        }
+        else {
+            found.push(result);
+        }
+    }
+
+    let addedCount = 0;
+    if (found.length > 0) {
+        const added = await AnkiActions.createCards(deckName, noteName, found, settings);
+        added.forEach((isAdded, index) => {
+            if (isAdded) {
+                addedCount += 1;
+            }
+            else {
+                notAdded.push(`${found[index]['word']} (already in the collection)`);
+            }
+        });
+    }
+
+    InterfaceManager.clearBulkText();
+    if (addedCount > 0) {
+        InterfaceManager.showInfo(`Created ${addedCount} card${addedCount == 1 ? '' : 's'}`);
+    }
+    if (notAdded.length > 0) {
+        InterfaceManager.showError(`Not added: ${notAdded.join(', ')}`);
+    }
+}
 
-async function setupNote(currentNoteId) {
-    const noteNamesAndIds = await AnkiActions.getNoteNamesAndIds();
+async function setupNote(currentNoteId, noteNamesAndIds) {
     // First, try to find existing note by exact id match with the current id
     noteName = await AnkiActions.getExistingNoteNameById(currentNoteId, noteNamesAndIds);
     if (noteName) {
@@ -8,6 +8,7 @@ const deckSelectionControls = document.getElementById('deck-selection-controls')
 const cardAddingControls = document.getElementById('card-adding-controls');
 
 const wordField = document.getElementById('word-field');
+const wordSuggestions = document.getElementById('word-suggestions');
 const contextField = document.getElementById('context');
 
 const translationTableBody = document.getElementById('translation-table-body');
@@ -20,11 +21,16 @@ const collinsCheckbox = document.getElementById('show-collins-definitions');
 const getInfoButton = document.getElementById('get-info-button');
 const createCardButton = document.getElementById('create-card-button');
 
+const bulkTextField = document.getElementById('bulk-text');
+const createCardsButton = document.getElementById('create-cards-button');
+
 const googleLink = document.getElementById('google-link');
 const collinsLink = document.getElementById('collins-link');
 const cambridgeLink = document.getElementById('cambridge-link');
 const oxfordLink = document.getElementById('oxford-link');
 
+const suggestionDelay = 150; // ms
+
 
 /**Initialize values and setup events */
 export function initialize(settings) {
@@ -50,20 +56,47 @@ export function initialize(settings) {
     // When card is created, all data is cleared, so button must be disabled
     Helpers.addEventHandlerProgress(createCardButton, 'click', () => DataManager.createAnkiCard(contextField.value.trim()), true);
 
+    Helpers.enableControlWhenTextIsNotBlank(createCardsButton, bulkTextField);
+    // The text is cleared when the cards are created
+    Helpers.addEventHandlerProgress(createCardsButton, 'click', () => DataManager.createAnkiCards(bulkTextField.value), true);
+
     const language = settings['translate_to'];
     enableOrDisableWordRelatedControls(language);
     wordField.addEventListener('input', () => enableOrDisableWordRelatedControls(language));
+
+    // Suggestions are asked for when the learner stops typing, not on every key
+    let suggestionTimer;
+    wordField.addEventListener('input', () => {
+        clearTimeout(suggestionTimer);
+        suggestionTimer = setTimeout(() => DataManager.suggestWords(wordField.value.trim()), suggestionDelay);
+    });
 }
 
 export function reset() {
     messageContainer.innerHTML = '';
     wordField.value = '';
+    wordSuggestions.innerHTML = '';
     contextField.value = '';
     translationTableBody.innerHTML = '';
     definitionTableBody.innerHTML = '';
     disableWordRelatedControls();
 }
 
+/** Replaces the options of the word field
+ * @param {string[]} words
+ */
+export function showSuggestions(words) {
+    wordSuggestions.replaceChildren(...words.map(word => {
+        const opt = document.createElement('option');
+        opt.value = word;
+        return opt;
+    }));
+}
+
+export function clearBulkText() {
+    bulkTextField.value = '';
+}
+
 export function clearMessages() {
     messageContainer.innerHTML = '';
 }
@@ -165,7 +198,8 @@ function updateDefinitions(wordData, settings) {
         });
     }
 
-    if (settings['add_collins_definitions']) {
+    // No Collins data when its quota is spent, the word is refilled later
+    if (settings['add_collins_definitions'] && wordData['collins']) {
         const collinsData = wordData['collins'];
         collinsData['definitions'].forEach(def => {
             const row = createCollinsDefinitionRow(def, number);
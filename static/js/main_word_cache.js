@@ -0,0 +1,133 @@
+/* Word data kept in the browser (IndexedDB), so repeat lookups don't download it again.
+ * An entry younger than freshTime is used as is, an older one is revalidated with its ETag:
+ * the server answers an unchanged word with an empty 304. The oldest used entries are
+ * evicted above maxEntries. Without IndexedDB (private mode, old browsers) every lookup
+ * goes to the server like before */
+
+const dbName = 'awa';
+const storeName = 'word-data';
+const maxEntries = 500;
+const freshTime = 60 * 60 * 1000; // ms
+
+let database;
+
+/** Word data from the cache or the server, the same as the 'word-data' view returns
+ * @param {string} word
+ * @param {string} langCode language the word is translated to, the data differs between languages
+ * @param {boolean} prefetch the learner hasn't looked the word up yet (see suggestWords). The server
+ * doesn't record it and only sends stored words. The first lookup of a prefetched entry is revalidated,
+ * so the server still records the lookup (and answers it with an empty 304)
+ */
+export async function getWordData(word, langCode, prefetch = false) {
+    const key = `${langCode}:${word}`;
+    const entry = await readEntry(key);
+    if (entry && Date.now() - entry['storedAt'] < freshTime && (prefetch || !entry['prefetched'])) {
+        touchEntry(entry);
+        return entry['data'];
+    }
+
+    const headers = entry ? { 'If-None-Match': entry['etag'] } : {};
+    if (prefetch) {
+        headers['Purpose'] = 'prefetch';
+    }
+    // The browser's HTTP cache would answer the 304 with its own copy, this cache is used instead
+    const result = await fetch(`word-data/${word}`, { headers: headers, cache: 'no-store' });
+    if (entry && result.status === 304) {
+        entry['storedAt'] = Date.now();
+        entry['prefetched'] = prefetch && entry['prefetched'];
+        touchEntry(entry);
+        return entry['data'];
+    }
+    if (!result.ok) {
+        throw new Error(`${result.statusText} (${result.status})`);
+    }
+
+    const data = await result.json();
+    const etag = result.headers.get('ETag');
+    // Errors (unknown word, unavailable provider) aren't validated, they're asked for again
+    if (etag && !data['errors']) {
+        const now = Date.now();
+        writeEntry({ 'key': key, 'etag': etag, 'data': data, 'storedAt': now, 'usedAt': now, 'prefetched': prefetch });
+    }
+    return data;
+}
+
+/** Opens the database once, null if it can't be used */
+function openDatabase() {
+    if (database === undefined) {
+        database = new Promise(resolve => {
+            try {
+                const request = indexedDB.open(dbName, 1);
+                request.onupgradeneeded = () => {
+                    const store = request.result.createObjectStore(storeName, { keyPath: 'key' });
+                    store.createIndex('usedAt', 'usedAt');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => resolve(null);
+                request.onblocked = () => resolve(null);
+            }
+            catch {
+                resolve(null);
+            }
+        });
+    }
+    return database;
+}
+
+/** Runs @param action on the store in a new transaction, resolves with the result of its request.
+ * Failures resolve with undefined, the cache is only an optimization */
+async function withStore(mode, action) {
+    const db = await openDatabase();
+    if (db == null) {
+        return undefined;
+    }
+    return new Promise(resolve => {
+        try {
+            const transaction = db.transaction(storeName, mode);
+            const request = action(transaction.objectStore(storeName));
+            transaction.oncomplete = () => resolve(request ? request.result : undefined);
+            transaction.onerror = () => resolve(undefined);
+            transaction.onabort = () => resolve(undefined);
+        }
+        catch {
+            resolve(undefined);
+        }
+    });
+}
+
+function readEntry(key) {
+    return withStore('readonly', store => store.get(key));
+}
+
+/** The entry becomes the last one to be evicted */
+function touchEntry(entry) {
+    entry['usedAt'] = Date.now();
+    withStore('readwrite', store => store.put(entry));
+}
+
+async function writeEntry(entry) {
+    await withStore('readwrite', store => store.put(entry));
+    await evict();
+}
+
+/** Deletes the least recently used entries above maxEntries */
+function evict() {
+    return withStore('readwrite', store => {
+        const count = store.count();
+        count.onsuccess = () => {
+            let excess = count.result - maxEntries;
+            if (excess <= 0) {
+                return;
+            }
+            store.index('usedAt').openCursor().onsuccess = ev => {
+                const cursor = ev.target.result;
+                if (cursor && excess > 0) {
+                    cursor.delete();
+                    excess--;
+                    cursor.continue();
+                }
+            };
+        };
+        return null;
+    });
+}
@@ -0,0 +1,141 @@
+import tempfile
+import time
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse_lazy
+
+from anki_word_adder.apps.accounts.models import Language, Translation, Word
+from anki_word_adder.audio_cache import audio_cache
+from anki_word_adder.single_flight import SingleFlight
+from anki_word_adder.views import byte_range
+from anki_word_adder.word_cache import word_data_cache
+from tests.test_view import default_setup, existent_credentials, word_data_settings
+
+SOURCE_URL = 'https://api.collinsdictionary.com/media/sounds/sounds/e/en_/en_us/en_us_word.mp3'
+AUDIO = b'ID3 0123456789'
+
+
+def audio_response(content=AUDIO):
+    response = mock.MagicMock()
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [content]
+    return response
+
+
+class TestAudioView(TestCase):
+    def setUp(self):
+        cache.clear()
+        audio_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(audio_dir.cleanup)
+        audio_settings = override_settings(AUDIO_CACHE={**settings.AUDIO_CACHE, 'DIR': audio_dir.name})
+        audio_settings.enable()
+        self.addCleanup(audio_settings.disable)
+        session = mock.patch('anki_word_adder.audio_cache.get_session')
+        self.session = session.start().return_value
+        self.addCleanup(session.stop)
+        self.session.get.return_value = audio_response()
+        self.url = audio_cache.local_url(SOURCE_URL)
+
+    def test_downloaded_once(self):
+        for _ in range(2):
+            response = self.client.get(self.url)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(AUDIO, response.getvalue())
+        self.session.get.assert_called_once()
+        self.assertEqual('audio/mpeg', response['Content-Type'])
+        self.assertEqual('public, max-age=31536000, immutable', response['Cache-Control'])
+
+    def test_url_is_stable(self):
+        """Clients cache the file by its URL, so it's the same every time"""
+        with mock.patch('time.time', return_value=time.time() + 60):
+            self.assertEqual(self.url, audio_cache.local_url(SOURCE_URL))
+
+    def test_same_content_is_stored_once(self):
+        self.client.get(self.url)
+        self.client.get(audio_cache.local_url(SOURCE_URL.replace('word', 'other')))
+        self.assertEqual(audio_cache.digest(SOURCE_URL), audio_cache.digest(SOURCE_URL.replace('word', 'other')))
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response['ETag'])
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4-7')
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(b'0123', response.content)
+        self.assertEqual(f'bytes 4-7/{len(AUDIO)}', response['Content-Range'])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(416, response.status_code)
+        self.assertEqual(f'bytes */{len(AUDIO)}', response['Content-Range'])
+
+    def test_range_of_another_version(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4-7', HTTP_IF_RANGE='"other"')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(AUDIO, response.getvalue())
+
+    def test_foreign_url(self):
+        response = self.client.get(reverse_lazy('audio', kwargs={'token': 'https:--example.com-file.mp3'}))
+        self.assertEqual(404, response.status_code)
+        self.session.get.assert_not_called()
+
+    def test_unavailable_source(self):
+        self.session.get.side_effect = requests.ConnectionError()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, SOURCE_URL, fetch_redirect_response=False)
+        self.assertIsNone(audio_cache.digest(SOURCE_URL))
+
+    @override_settings(AUDIO_CACHE={**settings.AUDIO_CACHE, 'MAX_SIZE': 4})
+    def test_large_file_is_not_stored(self):
+        self.assertIsNone(audio_cache.fetch(SOURCE_URL))
+
+    def test_concurrent_download_is_awaited(self):
+        """Another worker is downloading the file, its result is used"""
+        leader = SingleFlight(f'audio:{SOURCE_URL}')
+        leader.acquire()
+        leader.publish('digest')
+        self.assertEqual('digest', audio_cache.fetch(SOURCE_URL))
+        self.session.get.assert_not_called()
+
+
+@word_data_settings
+class TestWordDataAudio(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+        word = Word.objects.create(name='word', google={}, collins={'audio_url': SOURCE_URL})
+        Translation.objects.create(word=word, language=Language.objects.get(code='ru'),
+                                   translation={'translations': []})
+
+    def setUp(self):
+        word_data_cache.clear()
+        self.client.login(**existent_credentials)
+
+    def test_audio_url_is_local(self):
+        response = self.client.get(reverse_lazy('word_data', kwargs={'word': 'word'}))
+        audio_url = response.json()['collins']['audio_url']
+        self.assertTrue(audio_url.startswith('/audio/'))
+        self.assertEqual(SOURCE_URL, audio_cache.source_url(audio_url.rsplit('/', 1)[1]))
+
+
+class TestByteRange(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual((0, 9), byte_range('bytes=0-', 10))
+        self.assertEqual((5, 9), byte_range('bytes=5-100', 10))
+        self.assertEqual((7, 9), byte_range('bytes=-3', 10))
+        self.assertEqual((0, 9), byte_range('bytes=-30', 10))
+
+    def test_whole_content(self):
+        for header in ('', 'items=0-1', 'bytes=0-1,3-4', 'bytes=a-b', 'bytes=5'):
+            self.assertIsNone(byte_range(header, 10))
+
+    def test_outside(self):
+        for header in ('bytes=10-', 'bytes=5-4', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                byte_range(header, 10)
@@ -0,0 +1,210 @@
+import threading
+import time
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse_lazy
+
+from anki_word_adder.apps.accounts.models import Language, Word
+from anki_word_adder.views import WordDataMixin
+from anki_word_adder.word_cache import word_data_cache, word_not_found_cache
+from apis import hedging
+from apis.circuit_breaker import CircuitBreaker
+from apis.collins import CollinsData
+from apis.google import GoogleData
+from apis.ip_registry import get_language_code_by_ip
+from apis.providers import get_providers
+from tests.test_view import default_setup, existent_credentials, fake_google_data, word_data_settings
+
+
+def open_breaker(host: str) -> CircuitBreaker:
+    breaker = CircuitBreaker(host, failure_threshold=1, check_interval=0)
+    breaker.record(failed=True)
+    return breaker
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        caches['state'].clear()
+        self.breaker = CircuitBreaker('example.com', failure_threshold=2, open_seconds=30, check_interval=0)
+
+    def test_opens_after_failures(self):
+        self.breaker.record(failed=True)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(failed=False, seconds=10)
+        self.assertFalse(self.breaker.allow())
+
+    def test_is_shared(self):
+        self.breaker.record(failed=True)
+        self.breaker.record(failed=True)
+        other_worker = CircuitBreaker('example.com', check_interval=0)
+        self.assertFalse(other_worker.allow())
+        self.assertTrue(CircuitBreaker('example.org', check_interval=0).allow())
+
+    def test_survives_culling_of_the_default_cache(self):
+        self.breaker.record(failed=True)
+        self.breaker.record(failed=True)
+        cache.clear()
+        self.assertFalse(CircuitBreaker('example.com', check_interval=0).allow())
+
+    def test_half_open(self):
+        self.breaker.record(failed=True)
+        self.breaker.record(failed=True)
+        with mock.patch('apis.circuit_breaker.time.time', return_value=time.time() + 31):
+            # A single trial call
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())
+            self.breaker.record(failed=True)
+            self.assertFalse(self.breaker.allow())
+        with mock.patch('apis.circuit_breaker.time.time', return_value=time.time() + 62):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(failed=False)
+            self.assertTrue(self.breaker.allow())
+            self.assertTrue(self.breaker.allow())
+
+    def test_release_lets_another_trial_through(self):
+        self.breaker.record(failed=True)
+        self.breaker.record(failed=True)
+        with mock.patch('apis.circuit_breaker.time.time', return_value=time.time() + 31):
+            self.assertTrue(self.breaker.allow())
+            # The trial call was cancelled, it says nothing about the host
+            self.breaker.release()
+            self.assertTrue(self.breaker.allow())
+
+
+@word_data_settings
+class TestOpenCircuit(TestCase):
+    """Providers behind an open circuit aren't called"""
+    url = reverse_lazy('word_data', kwargs={'word': 'fetched'})
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+
+    def setUp(self):
+        cache.clear()
+        caches['state'].clear()
+        word_data_cache.clear()
+        word_not_found_cache.clear()
+        self.client.login(**existent_credentials)
+        self.google, self.collins = get_providers()
+
+    def test_optional_provider_is_left_out(self):
+        with mock.patch.object(self.collins, 'breaker', open_breaker(self.collins.host)), \
+                mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'get') as collins:
+            response = self.client.get(self.url)
+        collins.assert_not_called()
+        self.assertEqual('слово', response.json()['translations'][0]['translation'])
+        self.assertTrue(Word.objects.get(name='fetched').collins_pending)
+
+    def test_required_provider_fails_the_word(self):
+        with mock.patch.object(self.google, 'breaker', open_breaker(self.google.host)), \
+                mock.patch.object(GoogleData, 'get') as google, \
+                mock.patch.object(CollinsData, 'get') as collins:
+            response = self.client.get(self.url)
+        google.assert_not_called()
+        collins.assert_not_called()
+        self.assertEqual([WordDataMixin.provider_error], response.json()['errors'])
+
+    def test_optional_provider_that_isnt_awaited_is_released(self):
+        """The word doesn't exist, so Collins isn't waited for, but its breaker learns about it"""
+        stalled = threading.Event()
+        self.addCleanup(stalled.set)
+        with mock.patch.object(GoogleData, 'get', return_value=None), \
+                mock.patch.object(CollinsData, 'get', side_effect=lambda word: stalled.wait(5)), \
+                mock.patch.object(self.collins, 'release') as release, \
+                mock.patch.object(self.collins, 'record') as record:
+            self.client.get(self.url)
+        release.assert_called_once()
+        record.assert_not_called()
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker(self.google.host, failure_threshold=1, slow_call=0, check_interval=0)
+        with mock.patch.object(self.google, 'breaker', breaker), \
+                mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'get', return_value=None):
+            self.client.get(self.url)
+        self.assertFalse(breaker.allow())
+
+
+class TestIpRegistry(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['state'].clear()
+
+    def test_error_gives_default_language(self):
+        with mock.patch('apis.ip_registry.get_json_data', side_effect=requests.HTTPError()):
+            self.assertEqual(Language.default_code, get_language_code_by_ip('127.0.0.1'))
+
+    def test_open_circuit_gives_default_language(self):
+        with mock.patch('apis.ip_registry.get_breaker', return_value=open_breaker('api.ipregistry.co')), \
+                mock.patch('apis.ip_registry.get_json_data') as get_json_data:
+            self.assertEqual(Language.default_code, get_language_code_by_ip('127.0.0.1'))
+        get_json_data.assert_not_called()
+
+
+class TestCollinsErrors(SimpleTestCase):
+    def test_not_found(self):
+        error = requests.HTTPError(response=mock.Mock(status_code=404))
+        with mock.patch.object(CollinsData, '_download_american_learner', side_effect=error):
+            self.assertIsNone(CollinsData.get('word'))
+
+    def test_server_error(self):
+        error = requests.HTTPError(response=mock.Mock(status_code=503))
+        with mock.patch.object(CollinsData, '_download_american_learner', side_effect=error), \
+                self.assertRaises(requests.HTTPError):
+            CollinsData.get('word')
+
+
+@override_settings(HEDGING={**settings.HEDGING, 'HOSTS': {'example.com'}})
+class TestHedging(SimpleTestCase):
+    def setUp(self):
+        hedging._latencies.clear()
+        latencies = hedging._get_latencies('example.com')
+        for _ in range(hedging.MIN_SAMPLES):
+            latencies.add(0.01)
+
+    def test_slow_call_is_hedged(self):
+        stalled = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(None)
+            if len(calls) == 1:
+                stalled.wait(5)
+                return 'first'
+            return 'hedge'
+
+        try:
+            self.assertEqual('hedge', hedging.call_hedged('example.com', call))
+        finally:
+            stalled.set()
+        self.assertEqual(2, len(calls))
+
+    def test_fast_call_is_not_hedged(self):
+        call = mock.Mock(return_value='first')
+        self.assertEqual('first', hedging.call_hedged('example.com', call))
+        call.assert_called_once()
+
+    def test_error_waits_for_the_other_call(self):
+        calls = []
+
+        def call():
+            calls.append(None)
+            if len(calls) == 1:
+                time.sleep(0.1)
+                raise requests.ConnectionError()
+            time.sleep(0.2)
+            return 'hedge'
+
+        self.assertEqual('hedge', hedging.call_hedged('example.com', call))
+
+    def test_unlisted_host_is_not_hedged(self):
+        with override_settings(HEDGING={**settings.HEDGING, 'HOSTS': set()}):
+            call = mock.Mock(side_effect=lambda: time.sleep(0.1) or 'first')
+            self.assertEqual('first', hedging.call_hedged('example.com', call))
+        call.assert_called_once()
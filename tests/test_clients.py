@@ -0,0 +1,20 @@
+import os
+from unittest import TestCase, mock
+
+from apis import clients
+
+
+class TestClients(TestCase):
+    def test_clients_are_reused(self):
+        self.assertIs(clients.get_session(), clients.get_session())
+        self.assertIs(clients.get_translator(), clients.get_translator())
+
+    def test_forked_process_gets_new_clients(self):
+        session = clients.get_session()
+        with mock.patch.object(clients.os, 'getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(session, clients.get_session())
+
+    def test_translator_uses_configured_timeouts(self):
+        timeout = clients.get_translator().client.timeout
+        self.assertEqual(clients.CONNECT_TIMEOUT, timeout.connect_timeout)
+        self.assertEqual(clients.READ_TIMEOUT, timeout.read_timeout)
@@ -1,5 +1,8 @@
-from unittest import TestCase
-from apis.collins import CollinsDataCached
+from unittest import TestCase, mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apis.collins import CollinsData, CollinsDataCached
 
 
 class TestCollins(TestCase):
@@ -26,3 +29,37 @@ class TestCollins(TestCase):
             collins_data.audio_url)
         self.assertEqual(1, collins_data.frequency)
         self.assertEqual('ækwɪzɪʃən', collins_data.transcription)
+
+
+class TestCollinsParsers(TestCase):
+    """The stream parser must return exactly what the bs4 parser returns"""
+
+    def assertSameData(self, html_markup):
+        self.assertEqual(vars(CollinsData._parse_bs4(html_markup)), vars(CollinsData._parse_stream(html_markup)))
+
+    def test_cached(self):
+        for word, html_markup in CollinsDataCached.data.items():
+            with self.subTest(word=word):
+                self.assertSameData(html_markup)
+
+    def test_incomplete(self):
+        # No frequency and audio source, homonyms without sense or gramGrp, labels with one or commented children
+        self.assertSameData(
+            '<div><div><span><span class="pron">ab<audio>x</audio>c</span></span>'
+            '<div class="hom"><span class="gramGrp">n</span><div class="sense"><span class="lbl"><span>[</span>'
+            '<!--c-->US<br/>x</span><span class="def">d</span><span class="quote">q</span></div></div>'
+            '<div class="hom"><span class="gramGrp">v</span><div class="sense"><span class="lbl">only</span>'
+            '<span class="def">d</span></div></div>'
+            '<div class="hom"><span class="gramGrp">v</span></div>'
+            '<div class="hom"><div class="sense"><span class="lbl"><span>[</span>x &amp; y<span>]</span></span>'
+            '<span class="def">e</span></div><span class="gramGrp">late</span></div></div></div>')
+
+
+class TestCollinsParserSetting(SimpleTestCase):
+    def test_engine(self):
+        html_markup = CollinsDataCached.data['leaf']
+        for engine, method in (('stream', '_parse_stream'), ('bs4', '_parse_bs4')):
+            with self.subTest(engine=engine), override_settings(COLLINS_PARSER=engine), \
+                    mock.patch.object(CollinsData, method, wraps=getattr(CollinsData, method)) as parse:
+                CollinsData._parse(html_markup)
+                parse.assert_called_once_with(html_markup)
@@ -0,0 +1,81 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from anki_word_adder.apps.accounts.management.commands import refill_collins
+from anki_word_adder.apps.accounts.models import CollinsUsage, Language, Translation, Word
+from anki_word_adder.views import WordDataMixin
+from apis.collins import CollinsData, CollinsQuota
+from tests.test_view import fake_collins_data
+
+
+class TestCollinsQuota(TestCase):
+    def test_daily_quota(self):
+        quota = CollinsQuota(daily=2)
+        self.assertTrue(quota.acquire())
+        self.assertTrue(quota.acquire())
+        self.assertFalse(quota.acquire())
+        self.assertEqual({'daily_quota': 2, 'used_today': 2, 'remaining_today': 0, 'skipped_today': 1},
+                         quota.stats())
+
+    def test_per_minute_limit(self):
+        quota = CollinsQuota(daily=10, per_minute=1)
+        self.assertTrue(quota.acquire())
+        self.assertFalse(quota.acquire())
+        # A call that is over the minute limit doesn't spend the daily budget
+        self.assertEqual(9, quota.stats()['remaining_today'])
+
+    def test_calls_over_the_quota_are_not_counted(self):
+        quota = CollinsQuota(daily=1)
+        for _ in range(3):
+            quota.acquire()
+        self.assertEqual(1, CollinsUsage.objects.get(key__startswith='day:').calls)
+
+    def test_previous_days_are_deleted(self):
+        CollinsUsage.objects.create(key='day:20000101', day=datetime.date(2000, 1, 1), calls=5)
+        CollinsQuota(daily=1).acquire()
+        self.assertFalse(CollinsUsage.objects.filter(day__lt=datetime.date.today() - datetime.timedelta(days=1))
+                         .exists())
+
+    def test_no_limit(self):
+        quota = CollinsQuota(daily=0, per_minute=0)
+        for _ in range(5):
+            self.assertTrue(quota.acquire())
+        self.assertIsNone(quota.stats()['remaining_today'])
+
+
+class TestRefillCollins(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_refill_stops_when_quota_is_spent(self):
+        Word.objects.create(name='first', collins_pending=True)
+        Word.objects.create(name='second', collins_pending=True)
+        Word.objects.create(name='saved')
+
+        with mock.patch(f'{refill_collins.__name__}.collins_quota', CollinsQuota(daily=1)), \
+                mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()) as get:
+            call_command('refill_collins', stdout=StringIO())
+
+        get.assert_called_once_with('first')
+        first = Word.objects.get(name='first')
+        self.assertFalse(first.collins_pending)
+        self.assertEqual('wərd', first.collins['transcription'])
+        self.assertTrue(Word.objects.get(name='second').collins_pending)
+
+    def test_refill_changes_validators(self):
+        """Learners who have the word data without Collins get the refilled one instead of 304"""
+        word = Word.objects.create(name='first', collins_pending=True)
+        translation = Translation.objects.create(word=word, language=Language.objects.create(code='ru', name='Russian'),
+                                                 translation={'translations': []})
+        etag, _ = WordDataMixin.validators(translation)
+
+        with mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()):
+            call_command('refill_collins', stdout=StringIO())
+
+        translation = Translation.objects.select_related('word').get(id=translation.id)
+        self.assertNotEqual(etag, WordDataMixin.validators(translation)[0])
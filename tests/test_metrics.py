@@ -0,0 +1,142 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse_lazy
+
+from anki_word_adder import metrics
+from anki_word_adder.apps.accounts.models import Language, Learner, Translation, Word
+from anki_word_adder.word_cache import word_data_cache
+from apis.google import GoogleData
+from tests.test_view import default_setup, existent_credentials, word_data_settings
+
+
+class TestRegistry(SimpleTestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.histogram = self.registry.histogram('test_seconds', 'Test durations', buckets=(0.1, 1))
+
+    def test_histogram(self):
+        for seconds in (0.05, 0.5, 5):
+            self.histogram.observe(seconds, view='main')
+        output = self.registry.export()
+        self.assertIn('# TYPE test_seconds histogram', output)
+        self.assertIn('test_seconds_bucket{view="main",le="0.1"} 1', output)
+        self.assertIn('test_seconds_bucket{view="main",le="1"} 2', output)
+        self.assertIn('test_seconds_bucket{view="main",le="+Inf"} 3', output)
+        self.assertIn('test_seconds_count{view="main"} 3', output)
+        self.assertIn('test_seconds_sum{view="main"} 5.55', output)
+
+    def test_stats(self):
+        self.registry.add_stats('test_cache', 'Test cache', lambda: {'hits': 3, 'size': 2, 'limit': None},
+                                counters=('hits',))
+        output = self.registry.export()
+        self.assertIn('# TYPE test_cache_hits_total counter', output)
+        self.assertIn('test_cache_hits_total 3', output)
+        self.assertIn('# TYPE test_cache_size gauge', output)
+        self.assertNotIn('test_cache_limit', output)
+
+    def test_label_escaping(self):
+        self.histogram.observe(1, view='say "hi"\n')
+        self.assertIn(r'test_seconds_count{view="say \"hi\"\n"} 1', self.registry.export())
+
+    def test_workers_are_added_up(self):
+        self.histogram.observe(0.05)
+        self.registry.add_stats('test_cache', 'Test cache', lambda: {'hits': 3, 'size': 2}, counters=('hits',))
+        other_worker = self.registry.snapshot()
+        exited_worker = {**other_worker, 'time': time.time() - 3600}
+
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            for pid, snapshot in (('1', other_worker), ('2', exited_worker)):
+                with open(os.path.join(metrics_dir, f'{pid}.json'), 'w') as snapshot_file:
+                    json.dump(snapshot, snapshot_file)
+            with override_settings(METRICS={**settings.METRICS, 'DIR': metrics_dir}):
+                output = self.registry.export()
+
+        self.assertIn('test_seconds_count 3', output)
+        self.assertIn('test_cache_hits_total 9', output)
+        # Gauges of exited workers don't count
+        self.assertIn('test_cache_size 4', output)
+
+    def test_flush(self):
+        self.histogram.observe(0.05)
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(METRICS={**settings.METRICS, 'DIR': metrics_dir}):
+                self.registry.flush()
+            with open(os.path.join(metrics_dir, f'{os.getpid()}.json')) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        self.assertEqual([['test_seconds', {}, [1, 0, 0, 0.05, 1]]], snapshot['histograms'])
+
+    def test_exit_without_settings(self):
+        """Scripts (e.g. the benchmarks) import the providers without Django settings"""
+        env = {key: value for key, value in os.environ.items() if key != 'DJANGO_SETTINGS_MODULE'}
+        result = subprocess.run([sys.executable, '-c', 'import apis.utils'], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True)
+        self.assertEqual('', result.stderr)
+
+
+class TestTimer(SimpleTestCase):
+    def test_provider_error(self):
+        @metrics.timed_provider('test')
+        def fail():
+            raise ValueError
+
+        timings = metrics.start_request()
+        with mock.patch.object(metrics.provider_calls, 'observe') as observe, self.assertRaises(ValueError):
+            fail()
+        self.assertEqual({'provider': 'test', 'result': 'error'}, observe.call_args.kwargs)
+        self.assertEqual(1, timings.counts['test'])
+
+
+@word_data_settings
+@override_settings(METRICS={**settings.METRICS, 'SERVER_TIMING': True, 'TOKEN': None})
+class TestMetricsMiddleware(TestCase):
+    url = reverse_lazy('word_data', kwargs={'word': 'word'})
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+        word = Word.objects.create(name='word', google={}, collins={})
+        Translation.objects.create(word=word, language=Language.objects.get(code='ru'),
+                                   translation={'translations': []})
+
+    def setUp(self):
+        word_data_cache.clear()
+        self.client.login(**existent_credentials)
+
+    def test_server_timing(self):
+        response = self.client.get(self.url)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ calls", total;dur=[\d.]+$')
+
+    def test_provider_timing(self):
+        google_data = GoogleData('', 'new', [], [], [])
+        with mock.patch('apis.google.get_translator'), \
+                mock.patch.object(GoogleData, '_parse', return_value=google_data), \
+                mock.patch('apis.collins.CollinsData._download_american_learner', return_value={}):
+            response = self.client.get(reverse_lazy('word_data', kwargs={'word': 'new'}))
+        # Provider calls are made in the provider pool, but counted in the request
+        self.assertIn('google;dur=', response['Server-Timing'])
+        self.assertIn('collins;dur=', response['Server-Timing'])
+
+    def test_metrics_are_for_staff(self):
+        self.assertEqual(403, self.client.get(reverse_lazy('metrics')).status_code)
+        Learner.objects.filter(username=existent_credentials['username']).update(is_staff=True)
+        self.client.get(self.url)
+        response = self.client.get(reverse_lazy('metrics'))
+        self.assertEqual(200, response.status_code)
+        self.assertIn('awa_http_request_duration_seconds_count{status="200",view="word_data"}',
+                      response.content.decode())
+        self.assertIn('awa_word_data_cache_misses_total', response.content.decode())
+
+    @override_settings(METRICS={**settings.METRICS, 'TOKEN': 'secret'})
+    def test_metrics_token(self):
+        self.client.logout()
+        self.assertEqual(403, self.client.get(reverse_lazy('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code)
+        response = self.client.get(reverse_lazy('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(200, response.status_code)
@@ -1,6 +1,7 @@
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
 
-from anki_word_adder.apps.accounts.models import Language, Word
+from anki_word_adder.apps.accounts.models import Language, Translation, Word, language_registry
 
 
 class LanguageModelTests(TestCase):
@@ -10,6 +11,36 @@ class LanguageModelTests(TestCase):
         lang = Language.get_by_code(code)
         self.assertEqual(lang.name, name)
 
+    def test_unknown_code_returns_default(self):
+        Language(name='Russian', code='ru').save()
+        Language(name='German', code='de').save()
+        self.assertEqual('ru', Language.get_by_code('xx').code)
+
+    def test_empty_table_is_filled(self):
+        language_registry.clear()
+        self.assertEqual('German', Language.get_by_code('DE').name)
+
+
+class LanguageRegistryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Language(name='Russian', code='ru').save()
+
+    def setUp(self):
+        # Rolled back changes of other tests don't send signals
+        language_registry.clear()
+
+    def test_loaded_once(self):
+        language_registry.get('ru')
+        with self.assertNumQueries(0):
+            self.assertEqual('Russian', language_registry.get('ru').name)
+            self.assertEqual(['ru'], [language.code for language in language_registry.all()])
+
+    def test_cleared_when_table_changes(self):
+        language_registry.get('ru')
+        Language(name='German', code='de').save()
+        self.assertEqual('German', language_registry.get('de').name)
+
 
 class WordModelTests(TestCase):
     def test_get_by_name(self):
@@ -17,3 +48,44 @@ class WordModelTests(TestCase):
         Word(name=word_name).save()
         word = Word.get_by_name(word_name)
         self.assertEqual(word.name, word_name)
+
+
+class TranslationModelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(name='Russian', code='ru')
+        cls.word = Word.objects.create(name='new')
+        Translation.objects.create(word=cls.word, language=cls.language, translation={})
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are scanned anyway, the plan has to be the one of a big table
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesUniqueIndex(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # SQLite names the index of a unique constraint itself
+            self.assertIn('SEARCH accounts_translation USING INDEX', plan)
+            self.assertIn('(word_id=? AND language_id=?)', plan)
+            self.assertNotIn('SCAN', plan)
+        else:
+            self.assertIn('translation_word_language_unique', plan)
+            self.assertNotIn('Seq Scan', plan)
+
+    def test_one_translation_per_language(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Translation.objects.create(word=self.word, language=self.language, translation={})
+        Translation.objects.create(word=self.word, language=Language.objects.create(name='German', code='de'),
+                                   translation={})
+
+    def test_word_lookup_uses_index(self):
+        # The query of GetWordDataView and refreshes
+        self.assertUsesUniqueIndex(Translation.objects.select_related('word')
+                                   .filter(word__name='new', language=self.language))
+
+    def test_batch_lookup_uses_index(self):
+        # The query of GetWordsDataView and the single-flight leaders
+        self.assertUsesUniqueIndex(Translation.objects.select_related('word')
+                                   .filter(word__name__in=['new', 'old'], language=self.language))
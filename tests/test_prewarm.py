@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from anki_word_adder.apps.accounts.models import Language, Translation, Word, language_registry
+from anki_word_adder.word_cache import word_not_found_cache
+from apis.collins import CollinsData
+from apis.google import GoogleData
+from tests.test_view import fake_collins_data, fake_google_data
+
+
+class TestPrewarmWords(TransactionTestCase):
+    """Words are fetched in another thread, so it must see committed data"""
+
+    def setUp(self):
+        Language.objects.create(code='ru', name='Russian')
+        Language.objects.create(code='de', name='German')
+        language_registry.clear()
+        word_not_found_cache.clear()
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.word_list = os.path.join(directory.name, 'words.txt')
+        self.state_file = f'{self.word_list}.prewarm.json'
+        with open(self.word_list, 'w', encoding='utf-8') as word_list:
+            word_list.write('# most frequent first\nWord\nqqqqq\nword\n\nother\n')
+
+    def prewarm(self, *args):
+        # SQLite test database locks its tables for concurrent writers
+        call_command('prewarm_words', self.word_list, '--languages', 'ru', 'de', '--rate', '0',
+                     '--concurrency', '1', *args, stdout=StringIO())
+
+    def google(self, word, lang_code):
+        return None if word == 'qqqqq' else fake_google_data()
+
+    def test_prewarm(self):
+        with mock.patch.object(GoogleData, 'get', side_effect=self.google) as google, \
+                mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()):
+            self.prewarm()
+
+        self.assertEqual({('word', 'ru'), ('word', 'de'), ('other', 'ru'), ('other', 'de')},
+                         set(Translation.objects.values_list('word__name', 'language__code')))
+        # Collins is only needed for the first language of a word, words that don't exist are not fetched again
+        self.assertEqual(5, google.call_count)
+        self.assertEqual(2, Word.objects.filter(collins__isnull=False).count())
+        with open(self.state_file) as state_file:
+            self.assertEqual({'ru': 3, 'de': 3}, json.load(state_file))
+
+    def test_saved_words_are_skipped(self):
+        with mock.patch.object(GoogleData, 'get', side_effect=self.google), \
+                mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()):
+            self.prewarm()
+        with mock.patch.object(GoogleData, 'get', return_value=None) as google, \
+                mock.patch.object(CollinsData, 'get', return_value=None):
+            self.prewarm('--restart')
+        google.assert_called_once_with('qqqqq', 'ru')
+
+    def test_resume_stops_at_failed_word(self):
+        def google(word, lang_code):
+            if word == 'qqqqq':
+                raise ConnectionError()
+            return fake_google_data()
+
+        with mock.patch.object(GoogleData, 'get', side_effect=google), \
+                mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()):
+            self.prewarm()
+        with open(self.state_file) as state_file:
+            self.assertEqual({'ru': 1, 'de': 1}, json.load(state_file))
+        self.assertTrue(Translation.objects.filter(word__name='other').exists())
+
+        with mock.patch.object(GoogleData, 'get', side_effect=self.google) as google, \
+                mock.patch.object(CollinsData, 'get', return_value=None):
+            self.prewarm()
+        google.assert_called_once_with('qqqqq', 'ru')
@@ -0,0 +1,34 @@
+from django.test import TestCase, override_settings
+
+from anki_word_adder.apps.accounts.models import Learner, Request, Word
+from anki_word_adder.request_log import RequestRecorder
+
+
+@override_settings(REQUEST_LOG={'MAX_SIZE': 3, 'FLUSH_SIZE': 2, 'FLUSH_INTERVAL': 60 * 60})
+class TestRequestRecorder(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.learner = Learner.objects.create(username='learner')
+        cls.words = [Word.objects.create(name=name) for name in ('one', 'two', 'three', 'four')]
+
+    def setUp(self):
+        self.recorder = RequestRecorder()
+
+    def test_saved_when_flush_size_is_reached(self):
+        self.recorder.record(self.learner.id, [self.words[0].id])
+        self.assertEqual(0, Request.objects.count())
+        self.recorder.record(self.learner.id, [self.words[1].id])
+        self.assertEqual(2, Request.objects.count())
+
+    def test_date_is_request_time(self):
+        self.recorder.record(self.learner.id, [self.words[0].id])
+        recorded_at = self.recorder._buffer[0].date
+        self.recorder.flush()
+        self.assertEqual(recorded_at, Request.objects.get().date)
+
+    def test_requests_above_max_size_are_dropped(self):
+        with override_settings(REQUEST_LOG={'MAX_SIZE': 3, 'FLUSH_SIZE': 10, 'FLUSH_INTERVAL': 60 * 60}):
+            self.recorder.record(self.learner.id, [word.id for word in self.words])
+        self.assertEqual(1, self.recorder.dropped)
+        self.recorder.flush()
+        self.assertEqual(3, Request.objects.count())
@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from anki_word_adder.single_flight import MISSING, SingleFlight
+
+
+class TestSingleFlight(TestCase):
+    key = 'translation:ru:word'
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_only_one_leader(self):
+        leader = SingleFlight(self.key)
+        follower = SingleFlight(self.key)
+        self.assertTrue(leader.acquire())
+        self.assertFalse(follower.acquire())
+
+    def test_follower_gets_published_result(self):
+        leader = SingleFlight(self.key)
+        follower = SingleFlight(self.key)
+        leader.acquire()
+        follower.acquire()
+        leader.publish('result')
+        self.assertEqual('result', follower.wait(timeout=5))
+
+    def test_result_published_before_release(self):
+        """The lease can already be released when the follower starts waiting"""
+        leader = SingleFlight(self.key)
+        follower = SingleFlight(self.key)
+        leader.acquire()
+        follower.acquire()
+        leader.publish(None)
+        leader.release()
+        self.assertIsNone(follower.wait(timeout=5))
+
+    def test_released_without_result(self):
+        """If the leader fails, there's nothing to wait for"""
+        leader = SingleFlight(self.key)
+        follower = SingleFlight(self.key)
+        leader.acquire()
+        follower.acquire()
+        leader.release()
+        self.assertIs(MISSING, follower.wait(timeout=5))
+        self.assertTrue(follower.acquire())
+
+    def test_dead_leader_is_taken_over(self):
+        """The lease of a leader that never releases it expires"""
+        leader = SingleFlight(self.key, lease_timeout=1)
+        follower = SingleFlight(self.key)
+        leader.acquire()
+        follower.acquire()
+        self.assertIs(MISSING, follower.wait(timeout=5))
+        self.assertTrue(follower.acquire())
+
+    def test_stale_result_is_ignored(self):
+        """Result of the previous flight must not be returned to the followers of the current one"""
+        previous = SingleFlight(self.key)
+        previous.acquire()
+        previous.publish('stale')
+        previous.release()
+
+        leader = SingleFlight(self.key)
+        follower = SingleFlight(self.key)
+        leader.acquire()
+        follower.acquire()
+        leader.release()
+        self.assertIs(MISSING, follower.wait(timeout=5))
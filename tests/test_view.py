@@ -1,7 +1,23 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import threading
+from unittest import mock
+
+import brotli
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse_lazy
 
-from anki_word_adder.apps.accounts.models import Learner, Settings, Language, Word, Feedback, Request
+from anki_word_adder.views import WordDataMixin, accepted_encodings
+from anki_word_adder.single_flight import SingleFlight
+from anki_word_adder.apps.accounts.models import Learner, Settings, Language, Word, Translation, Feedback, Request
+from anki_word_adder.word_cache import word_data_cache, word_not_found_cache
+from apis.collins import CollinsData, CollinsQuota
+from apis.google import GoogleData
+from apis.providers import Provider, get_providers
 
 existent_username = 'existent_username'
 existent_password = 'existent_password'
@@ -11,6 +27,11 @@ new_username = 'new_username'
 new_password = 'new_password'
 new_credentials = {'username': new_username, 'password': new_password}
 
+# Save requests immediately, so they can be counted (and don't leak into other tests).
+# Don't refresh words in the background, the providers aren't available there
+word_data_settings = override_settings(REQUEST_LOG={**settings.REQUEST_LOG, 'FLUSH_SIZE': 1},
+                                           WORD_REFRESH={**settings.WORD_REFRESH, 'MAX_CONCURRENT': 0})
+
 
 def default_setup():
     language = Language(code='ru', name='Russian')
@@ -156,6 +177,7 @@ class TestGuide(TestCase):
         self.assertEqual(200, response.status_code)
 
 
+@word_data_settings
 class TestWordData(TestCase):
     existent_word = 'word'
     existent_word_url = reverse_lazy('word_data', kwargs={'word': existent_word})
@@ -166,6 +188,10 @@ class TestWordData(TestCase):
         default_setup()
         Word(name=cls.existent_word).save()
 
+    def setUp(self):
+        word_data_cache.clear()
+        word_not_found_cache.clear()
+
     def test_get_unauthenticated(self):
         """Must redirect unauthenticated user to login page"""
         response = self.client.get(self.existent_word_url, follow=True)
@@ -194,6 +220,425 @@ class TestWordData(TestCase):
         self.assertIn('errors'.encode('utf-8'), response.content)
 
 
+def fake_google_data(translation='слово') -> GoogleData:
+    translations = [{'part_of_speech': 'noun', 'translation': translation, 'reverse_translations': [], 'frequency': 3}]
+    return GoogleData('wərd', translation, [], [], translations)
+
+
+def fake_collins_data() -> CollinsData:
+    return CollinsData(3, 'https://example.com/word.mp3', 'wərd', [])
+
+
+@word_data_settings
+class TestWordDataFetch(TestCase):
+    """Cache-miss path with the providers replaced by stubs"""
+    new_word = 'fetched'
+    url = reverse_lazy('word_data', kwargs={'word': new_word})
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+
+    def setUp(self):
+        word_data_cache.clear()
+        word_not_found_cache.clear()
+        self.client.login(username=existent_username, password=existent_password)
+
+    def test_providers_are_requested_concurrently(self):
+        """Each stub waits for the other one, so sequential calls would break the barrier"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def google(word, lang_code):
+            barrier.wait()
+            return fake_google_data()
+
+        def collins(word):
+            barrier.wait()
+            return fake_collins_data()
+
+        with mock.patch.object(GoogleData, 'get', side_effect=google), \
+                mock.patch.object(CollinsData, 'get', side_effect=collins):
+            response = self.client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual('слово', data['translations'][0]['translation'])
+        self.assertEqual('wərd', data['collins']['transcription'])
+        self.assertEqual(1, Translation.objects.filter(word__name=self.new_word).count())
+
+    def test_existing_word_skips_collins(self):
+        """Only Google is needed when the Word exists but the Translation doesn't"""
+        Word(name=self.new_word).save()
+        with mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'get') as collins:
+            response = self.client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        collins.assert_not_called()
+        self.assertEqual(1, Word.objects.filter(name=self.new_word).count())
+
+    def test_collins_quota_spent(self):
+        """The word is saved without Collins data and marked for a refill"""
+        quota = CollinsQuota(daily=1)
+        quota.acquire()
+        with mock.patch('apis.providers.collins_quota', quota), \
+                mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'get') as collins:
+            response = self.client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        self.assertIsNone(response.json()['collins'])
+        collins.assert_not_called()
+        self.assertTrue(Word.objects.get(name=self.new_word).collins_pending)
+
+    def test_word_not_found(self):
+        with mock.patch.object(GoogleData, 'get', return_value=None), \
+                mock.patch.object(CollinsData, 'get', return_value=None):
+            response = self.client.get(self.url)
+
+        self.assertIn('errors', response.json())
+        self.assertFalse(Word.objects.filter(name=self.new_word).exists())
+
+    def test_prefetch(self):
+        """Prefetches don't call the providers and aren't recorded"""
+        with mock.patch.object(GoogleData, 'get') as google:
+            response = self.client.get(self.url, HTTP_PURPOSE='prefetch')
+        self.assertEqual(404, response.status_code)
+        google.assert_not_called()
+
+        with mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()):
+            etag = self.client.get(self.url)['ETag']
+        word_data_cache.clear()
+        self.assertEqual(200, self.client.get(self.url, HTTP_PURPOSE='prefetch').status_code)
+        self.assertEqual(304, self.client.get(self.url, HTTP_PURPOSE='prefetch', HTTP_IF_NONE_MATCH=etag).status_code)
+        self.assertEqual(1, Request.objects.filter(word__name=self.new_word).count())
+
+    def test_not_found_word_is_remembered(self):
+        with mock.patch.object(GoogleData, 'get', return_value=None), \
+                mock.patch.object(CollinsData, 'get', return_value=None):
+            self.client.get(self.url)
+        with mock.patch.object(GoogleData, 'get') as google:
+            response = self.client.get(self.url)
+
+        self.assertEqual([WordDataMixin.word_not_found_error], response.json()['errors'])
+        google.assert_not_called()
+
+    def test_failed_word_is_not_remembered(self):
+        with mock.patch.object(GoogleData, 'get', side_effect=ConnectionError()), \
+                mock.patch.object(CollinsData, 'get', return_value=None):
+            self.client.get(self.url)
+        self.assertFalse(word_not_found_cache.contains(self.new_word, 'ru'))
+
+    def test_slow_optional_provider_is_left_out(self):
+        """Collins that runs out of its time budget doesn't hold up the response, the word is refilled later"""
+        released = threading.Event()
+
+        def collins(word):
+            released.wait(5)
+            return fake_collins_data()
+
+        providers = {**settings.WORD_PROVIDERS, 'collins': {**settings.WORD_PROVIDERS['collins'], 'TIMEOUT': 0.05}}
+        with override_settings(WORD_PROVIDERS=providers), \
+                mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'get', side_effect=collins):
+            response = self.client.get(self.url)
+            released.set()
+
+        self.assertEqual('слово', response.json()['translations'][0]['translation'])
+        self.assertIsNone(response.json()['collins'])
+        self.assertTrue(Word.objects.get(name=self.new_word).collins_pending)
+
+    def test_failed_optional_provider_is_left_out(self):
+        with mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'get', side_effect=ConnectionError()):
+            response = self.client.get(self.url)
+        self.assertNotIn('errors', response.json())
+        self.assertTrue(Word.objects.get(name=self.new_word).collins_pending)
+
+    @override_settings(WORD_PROVIDERS={'google': settings.WORD_PROVIDERS['google']})
+    def test_disabled_provider_is_not_called(self):
+        with mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'get') as collins:
+            response = self.client.get(self.url)
+        self.assertEqual('слово', response.json()['translations'][0]['translation'])
+        collins.assert_not_called()
+        self.assertFalse(Word.objects.get(name=self.new_word).collins_pending)
+
+
+class IncompleteProvider(Provider):
+    """Doesn't implement 'get'"""
+
+
+class TestProviders(SimpleTestCase):
+    def test_incomplete_provider_is_refused(self):
+        providers = {'incomplete': {'CLASS': f'{__name__}.IncompleteProvider', 'TIMEOUT': 1}}
+        with override_settings(WORD_PROVIDERS=providers), self.assertRaises(TypeError):
+            get_providers()
+
+
+@word_data_settings
+class TestWordDataEncoding(TestCase):
+    """Cached bodies are sent compressed if the client accepts it"""
+    url = reverse_lazy('word_data', kwargs={'word': 'word'})
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+        word = Word.objects.create(name='word', google={}, collins={})
+        Translation.objects.create(word=word, language=Language.objects.get(code='ru'),
+                                   translation={'translations': [{'translation': 'слово'}]})
+
+    def setUp(self):
+        word_data_cache.clear()
+        self.client.login(username=existent_username, password=existent_password)
+
+    def test_gzip(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='deflate, gzip;q=0.8')
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual('слово', data['translations'][0]['translation'])
+
+    def test_brotli(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual('br', response['Content-Encoding'])
+        data = json.loads(brotli.decompress(response.content))
+        self.assertEqual('слово', data['translations'][0]['translation'])
+
+    def test_identity(self):
+        self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        # The second response is made from the cached entry
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual('слово', response.json()['translations'][0]['translation'])
+
+    def test_accepted_encodings(self):
+        self.assertEqual({'gzip', 'br'}, accepted_encodings('GZIP, br;q=1.0, deflate;q=0'))
+        self.assertEqual(set(), accepted_encodings(''))
+
+
+@word_data_settings
+class TestWordDataValidators(TestCase):
+    """Repeat lookups of an unchanged word are answered with an empty 304"""
+    url = reverse_lazy('word_data', kwargs={'word': 'word'})
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+        cls.word = Word.objects.create(name='word', google={}, collins={})
+        Translation.objects.create(word=cls.word, language=Language.objects.get(code='ru'),
+                                   translation={'translations': [{'translation': 'слово'}]})
+
+    def setUp(self):
+        word_data_cache.clear()
+        self.client.login(username=existent_username, password=existent_password)
+
+    def test_validators(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual('private, no-cache', response['Cache-Control'])
+
+    def test_cached_entry_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.content)
+        self.assertEqual(etag, response['ETag'])
+
+    def test_stored_word_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        word_data_cache.clear()
+        with mock.patch.object(WordDataMixin, 'word_data') as word_data:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        word_data.assert_not_called()
+        # The lookup is still counted
+        self.assertEqual(2, Request.objects.filter(word=self.word).count())
+
+    def test_changed_word(self):
+        etag = self.client.get(self.url)['ETag']
+        self.word.save()
+        word_data_cache.clear()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
+
+@word_data_settings
+class TestWordsData(TestCase):
+    url = reverse_lazy('words_data')
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+        word = Word(name='cached', google={'definitions': []})
+        word.save()
+        Translation(word=word, language=Language.objects.get(code='ru'),
+                    translation={'main_translation': 'кэш', 'translations': []}).save()
+
+    def setUp(self):
+        word_data_cache.clear()
+        word_not_found_cache.clear()
+        self.client.login(username=existent_username, password=existent_password)
+
+    def post(self, words):
+        return self.client.post(self.url, {'words': words}, content_type='application/json')
+
+    def test_cached_fetched_and_missing_words(self):
+        """Results keep the order of unique words and contain per-word errors"""
+        def google(word, lang_code):
+            return None if word == 'qqqqq' else fake_google_data(word)
+
+        request_count = Request.objects.all().count()
+        with mock.patch.object(GoogleData, 'get', side_effect=google) as google_get, \
+                mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()):
+            response = self.post(['Cached', 'new', 'qqqqq', 'cached', ' '])
+
+        self.assertEqual(200, response.status_code)
+        results = response.json()['results']
+        self.assertEqual(['cached', 'new', 'qqqqq'], [r['word'] for r in results])
+        self.assertNotIn('errors', results[0])
+        self.assertEqual('new', results[1]['translations'][0]['translation'])
+        self.assertIn('errors', results[2])
+        self.assertEqual(2, google_get.call_count)
+        self.assertEqual(request_count + 2, Request.objects.all().count())
+
+    def test_provider_failure_is_reported_per_word(self):
+        with mock.patch.object(GoogleData, 'get', side_effect=ConnectionError), \
+                mock.patch.object(CollinsData, 'get', return_value=None):
+            response = self.post(['cached', 'new'])
+
+        results = response.json()['results']
+        self.assertNotIn('errors', results[0])
+        self.assertIn('errors', results[1])
+
+    def test_text(self):
+        """Pasted text is split into unique words on the server"""
+        text = "Cached words aren't fetched:\n- cached\n- well-known, 2 times"
+        with mock.patch.object(GoogleData, 'get', side_effect=lambda word, lang_code: fake_google_data(word)), \
+                mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()):
+            response = self.client.post(self.url, {'text': text}, content_type='application/json')
+
+        self.assertEqual(['cached', 'words', "aren't", 'fetched', 'well-known', 'times'],
+                         [r['word'] for r in response.json()['results']])
+
+    def test_too_many_words(self):
+        response = self.post([f'word{i}' for i in range(101)])
+        self.assertEqual(400, response.status_code)
+
+    def test_invalid_body(self):
+        response = self.client.post(self.url, 'not json', content_type='application/json')
+        self.assertEqual(400, response.status_code)
+
+    def test_words_not_a_list(self):
+        for words in (5, None, 'abc', {'word': 1}):
+            with mock.patch.object(GoogleData, 'get') as google:
+                response = self.client.post(self.url, {'words': words}, content_type='application/json')
+            self.assertEqual(400, response.status_code)
+            google.assert_not_called()
+
+
+@word_data_settings
+class TestAsyncWordData(TestCase):
+    url = reverse_lazy('async_word_data', kwargs={'word': 'fetched'})
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+
+    def setUp(self):
+        word_data_cache.clear()
+        word_not_found_cache.clear()
+
+    def test_get_unauthenticated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(302, response.status_code)
+        self.assertTrue(response.url.startswith(str(TestLogin.url)))
+
+    def test_fetch_and_cache(self):
+        self.client.login(username=existent_username, password=existent_password)
+        with mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'aget', new_callable=mock.AsyncMock,
+                                  return_value=fake_collins_data()):
+            response = self.client.get(self.url)
+        self.assertEqual('wərd', response.json()['collins']['transcription'])
+
+        # The second response comes from the cache
+        with mock.patch.object(GoogleData, 'get') as google:
+            response = self.client.get(self.url)
+        google.assert_not_called()
+        self.assertEqual('слово', response.json()['translations'][0]['translation'])
+        self.assertEqual(2, Request.objects.filter(word__name='fetched').count())
+
+    def test_prefetch(self):
+        self.client.login(username=existent_username, password=existent_password)
+        with mock.patch.object(GoogleData, 'get') as google:
+            self.assertEqual(404, self.client.get(self.url, HTTP_PURPOSE='prefetch').status_code)
+        google.assert_not_called()
+
+        with mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'aget', new_callable=mock.AsyncMock,
+                                  return_value=fake_collins_data()):
+            self.client.get(self.url)
+        self.assertEqual(200, self.client.get(self.url, HTTP_PURPOSE='prefetch').status_code)
+        self.assertEqual(1, Request.objects.filter(word__name='fetched').count())
+
+    def test_word_not_found(self):
+        self.client.login(username=existent_username, password=existent_password)
+        with mock.patch.object(GoogleData, 'get', return_value=None), \
+                mock.patch.object(CollinsData, 'aget', new_callable=mock.AsyncMock, return_value=None):
+            response = self.client.get(self.url)
+        self.assertIn('errors', response.json())
+
+    def test_slow_optional_provider_is_left_out(self):
+        async def collins(word):
+            await asyncio.sleep(5)
+
+        self.client.login(username=existent_username, password=existent_password)
+        providers = {**settings.WORD_PROVIDERS, 'collins': {**settings.WORD_PROVIDERS['collins'], 'TIMEOUT': 0.05}}
+        with override_settings(WORD_PROVIDERS=providers), \
+                mock.patch.object(GoogleData, 'get', return_value=fake_google_data()), \
+                mock.patch.object(CollinsData, 'aget', side_effect=collins):
+            response = self.client.get(self.url)
+        self.assertIsNone(response.json()['collins'])
+        self.assertTrue(Word.objects.get(name='fetched').collins_pending)
+
+
+class TestAsyncFlightWait(TestCase):
+    """A request waiting for another worker's download doesn't hold the sync thread the others need"""
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+
+    def setUp(self):
+        cache.clear()
+        word_data_cache.clear()
+        word_not_found_cache.clear()
+        word_not_found_cache.add_many(['unknown'], 'ru')
+        self.async_client.login(username=existent_username, password=existent_password)
+
+    async def test_other_request_completes(self):
+        leader = SingleFlight('translation:ru:fetched')
+        await sync_to_async(leader.acquire)()
+        waiting = asyncio.ensure_future(
+            self.async_client.get(reverse_lazy('async_word_data', kwargs={'word': 'fetched'})))
+        await asyncio.sleep(0.2)
+
+        response = await asyncio.wait_for(
+            self.async_client.get(reverse_lazy('async_word_data', kwargs={'word': 'unknown'})), 5)
+        self.assertEqual([WordDataMixin.word_not_found_error], response.json()['errors'])
+        self.assertFalse(waiting.done())
+
+        # The leader found nothing
+        await sync_to_async(leader.publish)(None)
+        await sync_to_async(leader.release)()
+        response = await asyncio.wait_for(waiting, 5)
+        self.assertEqual([WordDataMixin.word_not_found_error], response.json()['errors'])
+
+
 class TestFeedback(TestCase):
     url = reverse_lazy('feedback')
 
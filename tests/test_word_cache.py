@@ -0,0 +1,120 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from anki_word_adder.apps.accounts.models import Language, Translation, Word
+from anki_word_adder.word_cache import LocalLRU, NotFoundCache, WordDataCache, word_data_cache, word_not_found_cache
+
+
+class TestLocalLRU(TestCase):
+    def test_least_recently_used_is_evicted(self):
+        lru = LocalLRU(max_size=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(1, lru.get('a'))
+        self.assertEqual(1, lru.evictions)
+
+    def test_expired_entry_is_not_returned(self):
+        lru = LocalLRU(max_size=2, ttl=60)
+        with mock.patch('anki_word_adder.word_cache.time.monotonic', return_value=0):
+            lru.set('a', 1)
+        with mock.patch('anki_word_adder.word_cache.time.monotonic', return_value=61):
+            self.assertIsNone(lru.get('a'))
+        self.assertEqual(0, len(lru))
+
+
+class TestWordDataCache(TestCase):
+    def setUp(self):
+        self.cache = WordDataCache(local_size=10, local_ttl=60, shared_ttl=60)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_tiers_and_counters(self):
+        self.assertIsNone(self.cache.get('word', 'ru'))
+        self.cache.set('word', 'ru', 1, {'word': 'word'})
+        self.assertEqual(1, self.cache.get('word', 'ru')['word_id'])
+
+        # Another process only has the shared tier
+        self.cache.clear()
+        self.assertEqual(1, self.cache.get('word', 'ru')['word_id'])
+        self.assertEqual({'local_hits': 1, 'shared_hits': 1, 'misses': 1, 'evictions': 0, 'local_size': 1},
+                         self.cache.stats())
+
+    def test_invalidate(self):
+        self.cache.set('word', 'ru', 1, {})
+        self.cache.set('word', 'de', 1, {})
+        self.cache.invalidate('word', ['ru'])
+        self.assertIsNone(self.cache.get('word', 'ru'))
+        # Only the local entry of another language is gone
+        self.assertIsNotNone(self.cache.get('word', 'de'))
+        self.assertEqual(1, self.cache.shared_hits)
+
+
+class TestNotFoundCache(TestCase):
+    def setUp(self):
+        self.cache = NotFoundCache(local_size=10, local_ttl=60, shared_ttl=60)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_tiers_and_counters(self):
+        self.cache.add_many(['qqqqq', 'wwwww'], 'ru')
+        self.assertEqual({'qqqqq'}, self.cache.find_many(['qqqqq', 'word'], 'ru'))
+        self.assertFalse(self.cache.contains('qqqqq', 'de'))
+
+        # Another process only has the shared tier
+        self.cache.clear()
+        self.assertTrue(self.cache.contains('wwwww', 'ru'))
+        self.assertEqual({'hits': 2, 'misses': 2, 'local_size': 1}, self.cache.stats())
+
+    def test_purge(self):
+        self.cache.add_many(['qqqqq'], 'ru')
+        other_process = NotFoundCache(local_size=10, local_ttl=60, shared_ttl=60)
+        self.assertTrue(other_process.contains('qqqqq', 'ru'))
+
+        self.cache.purge()
+        self.assertFalse(self.cache.contains('qqqqq', 'ru'))
+        # Other processes notice the new generation when their local entries expire
+        other_process.clear()
+        with mock.patch('anki_word_adder.word_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertFalse(other_process.contains('qqqqq', 'ru'))
+
+    def test_delete(self):
+        self.cache.add_many(['qqqqq'], 'ru')
+        self.cache.add_many(['qqqqq'], 'de')
+        self.cache.delete('qqqqq', ['ru'])
+        self.assertFalse(self.cache.contains('qqqqq', 'ru'))
+        self.assertTrue(self.cache.contains('qqqqq', 'de'))
+
+
+class TestInvalidationSignals(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(code='ru', name='Russian')
+        cls.word = Word.objects.create(name='word')
+        cls.translation = Translation.objects.create(word=cls.word, language=cls.language, translation={})
+
+    def setUp(self):
+        word_data_cache.clear()
+        word_data_cache.set('word', 'ru', self.word.id, {})
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_word_rewritten(self):
+        self.word.collins = {'frequency': 3}
+        self.word.save()
+        self.assertIsNone(word_data_cache.get('word', 'ru'))
+
+    def test_translation_rewritten(self):
+        word_not_found_cache.add_many(['word'], 'ru')
+        self.translation.translation = {'translations': []}
+        self.translation.save()
+        self.assertIsNone(word_data_cache.get('word', 'ru'))
+        self.assertFalse(word_not_found_cache.contains('word', 'ru'))
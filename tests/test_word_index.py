@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse_lazy
+
+from anki_word_adder.apps.accounts.models import Language, Translation, Word
+from anki_word_adder.word_index import WordIndex, word_index
+from tests.test_view import default_setup, existent_credentials
+
+
+def translate(name: str, language: Language) -> Translation:
+    word = Word.objects.create(name=name, google={}, collins={})
+    return Translation.objects.create(word=word, language=language, translation={'translations': []})
+
+
+class TestWordIndex(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(code='ru', name='Russian')
+        cls.other_language = Language.objects.create(code='de', name='German')
+        for name in ('word', 'wording', 'words', 'work', 'world'):
+            translate(name, cls.language)
+        translate('wort', cls.other_language)
+
+    def setUp(self):
+        self.index = WordIndex()
+
+    def test_prefix(self):
+        self.assertEqual(['word', 'wording', 'words'], self.index.suggest(self.language.id, 'word', 10))
+        self.assertEqual(['wort'], self.index.suggest(self.other_language.id, 'wor', 10))
+        self.assertEqual([], self.index.suggest(self.language.id, 'xyz', 10))
+
+    def test_limit(self):
+        self.assertEqual(['word', 'wording'], self.index.suggest(self.language.id, 'wor', 2))
+
+    def test_new_words_of_other_workers(self):
+        self.index.suggest(self.language.id, 'wo', 10)
+        # Created by another process, no signal reaches this index
+        with mock.patch.object(word_index, 'add'):
+            translate('worm', self.language)
+        self.assertNotIn('worm', self.index.suggest(self.language.id, 'wor', 10))
+        with self.settings(WORD_INDEX={'REFRESH_INTERVAL': 0}):
+            self.assertIn('worm', self.index.suggest(self.language.id, 'wor', 10))
+
+    def test_late_commits_of_other_workers(self):
+        """A row with a lower id that becomes visible after the index has seen a higher one"""
+        with mock.patch.object(word_index, 'add'), mock.patch.object(word_index, 'remove'):
+            late = translate('worm', self.language)
+            late_id = late.id
+            late.delete()  # Only its id is taken yet
+            translate('worst', self.language)
+            self.index.suggest(self.language.id, 'wo', 10)
+            Translation.objects.create(id=late_id, word=late.word, language=self.language,
+                                       translation={'translations': []})
+        with self.settings(WORD_INDEX={'REFRESH_INTERVAL': 0}):
+            self.assertIn('worm', self.index.suggest(self.language.id, 'wor', 10))
+
+    def test_signals(self):
+        word_index.clear()
+        word_index.suggest(self.language.id, 'wo', 10)
+        translation = translate('worm', self.language)
+        with mock.patch.object(Translation.objects, 'filter') as query:
+            self.assertIn('worm', word_index.suggest(self.language.id, 'wor', 10))
+        query.assert_not_called()
+        translation.delete()
+        self.assertNotIn('worm', word_index.suggest(self.language.id, 'wor', 10))
+
+
+class TestSuggestions(TestCase):
+    url = reverse_lazy('suggestions')
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+        translate('word', Language.objects.get(code='ru'))
+        Word.objects.create(name='wordless', google={}, collins={})
+
+    def setUp(self):
+        word_index.clear()
+        self.client.login(**existent_credentials)
+
+    def test_translated_words(self):
+        response = self.client.get(self.url, {'prefix': 'Wor'})
+        self.assertEqual({'words': ['word']}, response.json())
+
+    def test_short_prefix(self):
+        self.assertEqual({'words': []}, self.client.get(self.url, {'prefix': 'w'}).json())
+
+    def test_get_unauthenticated(self):
+        self.client.logout()
+        self.assertEqual(302, self.client.get(self.url, {'prefix': 'wor'}).status_code)
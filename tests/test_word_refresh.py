@@ -0,0 +1,99 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse_lazy
+from django.utils import timezone
+
+from anki_word_adder.apps.accounts.models import Language, Translation, Word, language_registry
+from anki_word_adder.views import GetWordDataView, WordDataMixin
+from anki_word_adder.word_cache import word_data_cache
+from anki_word_adder.word_refresh import PARSER_VERSION, WordRefresher, refresh_at
+from apis.collins import CollinsData
+from apis.google import GoogleData
+from tests.test_view import (default_setup, existent_credentials, fake_collins_data, fake_google_data,
+                             word_data_settings)
+
+
+class TestRefreshAt(SimpleTestCase):
+    def test_refresh_at(self):
+        fetched_at = timezone.now()
+        fresh = Word(fetched_at=fetched_at, parser_version=PARSER_VERSION)
+        self.assertEqual(fetched_at.timestamp() + settings.WORD_REFRESH['MAX_AGE'], refresh_at(fresh))
+        # Rows saved before the fields were added and rows from an older parser are refreshed right away
+        self.assertEqual(0, refresh_at(fresh, Translation()))
+        self.assertEqual(0, refresh_at(Word(fetched_at=fetched_at, parser_version=PARSER_VERSION - 1)))
+
+
+@override_settings(WORD_REFRESH={**settings.WORD_REFRESH, 'MAX_CONCURRENT': 1})
+class TestWordRefresher(SimpleTestCase):
+    def test_refreshes_are_bounded(self):
+        refresher = WordRefresher()
+        started = threading.Event()
+        release = threading.Event()
+        done = threading.Event()
+
+        def refresh(word, lang_code):
+            started.set()
+            release.wait(5)
+            done.set()
+
+        with mock.patch('anki_word_adder.word_refresh.cache') as cache:
+            cache.add.return_value = True
+            self.assertTrue(refresher.schedule('one', 'ru', refresh))
+            started.wait(5)
+            # The only slot is busy, the refresh is dropped instead of waiting
+            self.assertFalse(refresher.schedule('two', 'ru', refresh))
+            self.assertFalse(refresher.schedule('one', 'ru', refresh))
+            release.set()
+            done.wait(5)
+
+        self.assertEqual(1, refresher.scheduled)
+        self.assertEqual(1, refresher.dropped)
+
+
+@word_data_settings
+class TestRefreshWord(TestCase):
+    url = reverse_lazy('word_data', kwargs={'word': 'word'})
+
+    @classmethod
+    def setUpTestData(cls):
+        default_setup()
+        cls.word = Word.objects.create(name='word', google={}, collins=None)
+        cls.translation = Translation.objects.create(word=cls.word, language=Language.objects.get(code='ru'),
+                                                     translation={'translations': []})
+
+    def setUp(self):
+        language_registry.clear()
+        word_data_cache.clear()
+
+    def test_refresh_word(self):
+        with mock.patch.object(GoogleData, 'get', return_value=fake_google_data('новое')), \
+                mock.patch.object(CollinsData, 'get', return_value=fake_collins_data()):
+            WordDataMixin.refresh_word('word', 'ru')
+
+        word = Word.objects.get(id=self.word.id)
+        translation = Translation.objects.get(id=self.translation.id)
+        self.assertEqual('новое', translation.translation['main_translation'])
+        self.assertEqual('wərd', word.collins['transcription'])
+        self.assertEqual(PARSER_VERSION, word.parser_version)
+        self.assertIsNotNone(translation.fetched_at)
+
+    def test_stale_word_is_served_and_refreshed(self):
+        self.client.login(**existent_credentials)
+        with mock.patch('anki_word_adder.views.word_refresher') as refresher:
+            response = self.client.get(self.url)
+        self.assertEqual(200, response.status_code)
+        refresher.schedule.assert_called_once_with('word', 'ru', GetWordDataView.refresh_word)
+
+    def test_fresh_word_is_not_refreshed(self):
+        fetched_at = timezone.now() - timedelta(days=1)
+        Word.objects.filter(id=self.word.id).update(fetched_at=fetched_at, parser_version=PARSER_VERSION)
+        Translation.objects.filter(id=self.translation.id).update(fetched_at=fetched_at,
+                                                                  parser_version=PARSER_VERSION)
+        self.client.login(**existent_credentials)
+        with mock.patch('anki_word_adder.views.word_refresher') as refresher:
+            self.client.get(self.url)
+        refresher.schedule.assert_not_called()